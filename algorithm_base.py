@@ -2,34 +2,142 @@
 # ABOUTME: Provides common structure and methods for algorithm implementations
 
 from abc import ABC, abstractmethod
+from contextlib import contextmanager
 import click
 
+from cost_model import DEFAULT_TILE_SIZE
+from encoders import ImageEncoder
+from engines import REFERENCE, FAST, check_engine
+from profiling import measure_stage
+
 
 class AlgorithmBase(ABC):
     """Base class for all art generation algorithms"""
-    
-    def __init__(self, size, output):
+
+    # Callables notified as listener(algorithm, timing) after every stage
+    _stage_listeners = []
+
+    # Unit of the values run_kernel returns, used in engine verification reports
+    KERNEL_UNIT = "pixels"
+
+    # Engines the algorithm implements
+    SUPPORTED_ENGINES = [REFERENCE, FAST]
+
+    def __init__(self, size, output=None, engine=REFERENCE):
         self.size = size
         self.output = output
-    
+        self.engine = check_engine(engine, self.SUPPORTED_ENGINES)
+
     @abstractmethod
     def generate(self):
         """Generate the algorithm's data structure"""
         pass
+
+    @abstractmethod
+    def render_image(self, data):
+        """Rasterize the generated data into a PIL image"""
+        pass
+
+    @abstractmethod
+    def render_image_streaming(self):
+        """Rasterize while generating, without holding the generated data"""
+        pass
+
+    @abstractmethod
+    def estimate_cost(self, tile_size=DEFAULT_TILE_SIZE, workers=1):
+        """Predict the unit count, peak memory per strategy and runtime of a render"""
+        pass
+
+    @abstractmethod
+    def sample_kernel_inputs(self, count):
+        """Pick about count representative inputs for the engine kernel"""
+        pass
+
+    @abstractmethod
+    def run_kernel(self, engine, inputs):
+        """Run one engine's kernel on sampled inputs and return a flat list of numbers"""
+        pass
+
+    @abstractmethod
+    def as_array(self, data):
+        """Flatten the generated data into an (array.array, shape) pair"""
+        pass
     
     @abstractmethod
     def save_image(self, data):
         """Save the generated data as an image"""
         pass
-    
+
     @classmethod
     @abstractmethod
     def add_cli_options(cls, command):
         """Add algorithm-specific CLI options to a click command"""
         pass
-    
+
     @classmethod
     @abstractmethod
     def create_from_args(cls, **kwargs):
         """Create algorithm instance from parsed CLI arguments"""
-        pass
\ No newline at end of file
+        pass
+
+    @classmethod
+    def add_stage_listener(cls, listener):
+        """Subscribe to stage timings of every render of every algorithm
+
+        Peak memory is only reported while tracemalloc is tracing.
+        """
+        AlgorithmBase._stage_listeners.append(listener)
+
+    @classmethod
+    def remove_stage_listener(cls, listener):
+        """Unsubscribe a previously added stage listener"""
+        AlgorithmBase._stage_listeners.remove(listener)
+
+    @contextmanager
+    def stage(self, name, profiler=None):
+        """Time a pipeline stage and report it to the profiler and listeners"""
+        if profiler is None and not AlgorithmBase._stage_listeners:
+            yield
+            return
+
+        trace_memory = profiler is not None and profiler.trace_memory
+        with measure_stage(name, trace_memory=trace_memory) as timing:
+            yield
+        timing["algorithm"] = type(self).__name__
+
+        if profiler is not None:
+            profiler.record(timing)
+        for listener in list(AlgorithmBase._stage_listeners):
+            listener(self, timing)
+
+    def render(self, output=None, profiler=None, encoder=None):
+        """Generate, rasterize and save the image as separately timed stages"""
+        output = output or self.output
+        encoder = encoder or ImageEncoder()
+
+        with self.stage("generate", profiler):
+            data = self.generate()
+
+        # Raw data outputs skip rasterization entirely
+        if encoder.wants_data(output):
+            with self.stage("encode", profiler):
+                encoder.save_data(self.as_array(data), output)
+            return data
+
+        with self.stage("rasterize", profiler):
+            image = self.render_image(data)
+        with self.stage("encode", profiler):
+            encoder.save(image, output)
+
+        return data
+
+    def render_streaming(self, output=None, profiler=None, encoder=None):
+        """Render without holding the generated data in memory"""
+        output = output or self.output
+        encoder = encoder or ImageEncoder()
+
+        # Generation is interleaved with drawing, so both count as rasterization
+        with self.stage("rasterize", profiler):
+            image = self.render_image_streaming()
+        with self.stage("encode", profiler):
+            encoder.save(image, output)
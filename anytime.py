@@ -0,0 +1,189 @@
+# ABOUTME: Deadline-bounded anytime rendering that deepens a render for as long as its time budget allows
+# ABOUTME: Raises line fractal depth level by level or doubles the Mandelbrot iteration limit, keeping the best result
+
+import time
+
+from coloring import SMOOTH, Histogram
+from encoders import ImageEncoder
+
+
+# Iteration limit of the first Mandelbrot pass; each later pass doubles it
+ANYTIME_START_ITERATIONS = 16
+
+# The final save is reserved this many times as long as saving the first result took
+FINISH_MARGIN = 2
+
+
+def check_deadline(deadline):
+    """Validate a deadline in seconds"""
+    if deadline <= 0:
+        raise ValueError(f"Deadline must be a positive number of seconds, not {deadline}")
+    return deadline
+
+
+def anytime_parameter(algorithm):
+    """Name of the attribute an anytime render deepens"""
+    return "recursion_depth" if hasattr(algorithm, "iter_levels") else "max_iterations"
+
+
+def reserve_finish(finish, result, clock):
+    """Run finish on the first result and return the seconds to reserve for finishing the last"""
+    if finish is None:
+        return 0
+    started = clock()
+    finish(result)
+    return FINISH_MARGIN * (clock() - started)
+
+
+def deepen_levels(algorithm, finish_by, profiler=None, clock=time.perf_counter, finish=None):
+    """Rasterize depth 0, 1, ... up to the recursion depth while the next level is predicted to finish in time
+
+    Each level is built from the one before it, and its cost is predicted from
+    the last level's time scaled by how much the level count grew. finish, if
+    given, saves depth 0's image, and time to save the last image is reserved
+    from finish_by in proportion. Returns the image of the deepest level
+    rendered and sets recursion_depth to it.
+    """
+    max_depth = algorithm.recursion_depth
+    levels = algorithm.iter_levels(max_depth)
+    image = None
+    seconds = 0.0
+    counts = []
+
+    for depth in range(max_depth + 1):
+        if image is not None:
+            # Levels grow by a steady factor, so the next costs about that much more than the last
+            growth = counts[-1] / counts[-2] if len(counts) > 1 and counts[-2] else 1
+            if clock() + seconds * growth > finish_by:
+                break
+        started = clock()
+        with algorithm.stage(f"depth {depth}", profiler):
+            data = next(levels)
+            image = algorithm.render_image(data)
+        seconds = clock() - started
+        counts.append(len(data))
+        algorithm.recursion_depth = depth
+        if depth == 0:
+            finish_by -= reserve_finish(finish, image, clock)
+    return image
+
+
+def deepen_iterations(algorithm, finish_by, profiler=None, clock=time.perf_counter,
+                      start_iterations=ANYTIME_START_ITERATIONS, finish=None):
+    """Compute passes with doubling iteration limits up to max_iterations while they finish in time
+
+    Only pixels that had not escaped by the previous limit are computed again;
+    escaped pixels keep their counts, which no longer depend on the limit. A
+    pass that would run past finish_by is abandoned row by row, so the result
+    is always a complete pass. finish, if given, colours and saves the first
+    pass, and time to finish the last pass is reserved from finish_by in
+    proportion. Returns the rows of the deepest pass and sets max_iterations
+    to its limit.
+    """
+    max_iterations = algorithm.max_iterations
+    limit = min(start_iterations, max_iterations)
+    algorithm.max_iterations = limit
+    started = clock()
+    with algorithm.stage(f"iterations {limit}", profiler):
+        rows = [algorithm.compute_row(y) for y in range(algorithm.size)]
+    seconds_per_iteration = (clock() - started) / max(pass_iterations(rows, limit), 1)
+    finish_by -= reserve_finish(finish, rows, clock)
+
+    while limit < max_iterations:
+        next_limit = min(limit * 2, max_iterations)
+        unresolved = sum(1 for row in rows for value in row if value >= limit)
+        if not unresolved:
+            # Every pixel escaped, so higher limits cannot change the counts
+            break
+        # At worst every unresolved pixel runs to the next limit
+        if clock() + seconds_per_iteration * unresolved * next_limit > finish_by:
+            break
+
+        started = clock()
+        algorithm.max_iterations = next_limit
+        deepened = []
+        with algorithm.stage(f"iterations {next_limit}", profiler):
+            for y, row in enumerate(rows):
+                deepened.append(deepen_row(algorithm, y, row, limit))
+                if clock() > finish_by:
+                    break
+        if len(deepened) < len(rows):
+            algorithm.max_iterations = limit
+            break
+        seconds_per_iteration = (clock() - started) / max(pass_iterations(deepened, next_limit, limit), 1)
+        rows, limit = deepened, next_limit
+
+    equalize(algorithm, rows)
+    return rows
+
+
+def equalize(algorithm, rows):
+    """Set smooth colouring's equalization from the rows of a pass"""
+    if algorithm.coloring == SMOOTH:
+        histogram = Histogram(algorithm.max_iterations)
+        for row in rows:
+            histogram.add_row(row)
+        algorithm.set_equalization(histogram.cdf())
+
+
+def pass_iterations(rows, limit, previous_limit=0):
+    """Approximate iterations a pass ran, counting the pixels at or beyond the previous limit"""
+    return sum(min(value + 1, limit) for row in rows for value in row if value >= previous_limit)
+
+
+def deepen_row(algorithm, y, row, previous_limit):
+    """Recompute the runs of a row that had not escaped by the previous limit"""
+    row = list(row)
+    x = 0
+    while x < len(row):
+        if row[x] < previous_limit:
+            x += 1
+            continue
+        end = x
+        while end < len(row) and row[end] >= previous_limit:
+            end += 1
+        row[x:end] = algorithm.compute_row(y, x, end)
+        x = end
+    return row
+
+
+def render_anytime(algorithm, deadline, output=None, profiler=None, encoder=None, clock=time.perf_counter,
+                   start=None):
+    """Render the deepest result predicted to fit in deadline seconds, save it and return (image, reached)
+
+    The recursion depth or iteration limit of the algorithm is the most that
+    is attempted; the one reached is returned and stored in the image's
+    metadata where the format allows. The first level or pass is saved as
+    soon as it is ready, which also times how long the last will take to save.
+    start is the clock reading the deadline counts from, so work done before
+    the call is charged to the budget; it defaults to now.
+    """
+    check_deadline(deadline)
+    output = output or algorithm.output
+    encoder = encoder or ImageEncoder()
+    start = clock() if start is None else start
+    finish_by = start + deadline
+    parameter = anytime_parameter(algorithm)
+
+    def save(image, stage):
+        with algorithm.stage(stage, profiler):
+            encoder.save(image, output, text={parameter: getattr(algorithm, parameter), "deadline": deadline})
+
+    def rasterize(rows, stage):
+        with algorithm.stage(stage, profiler):
+            return algorithm.render_image(rows)
+
+    def finish_pass(rows):
+        # deepen_iterations only equalizes the pass it returns
+        equalize(algorithm, rows)
+        save(rasterize(rows, "first colour"), "first encode")
+
+    if parameter == "recursion_depth":
+        image = deepen_levels(algorithm, finish_by, profiler, clock,
+                              finish=lambda first: save(first, "first encode"))
+    else:
+        rows = deepen_iterations(algorithm, finish_by, profiler, clock, finish=finish_pass)
+        image = rasterize(rows, "rasterize")
+
+    save(image, "encode")
+    return image, getattr(algorithm, parameter)
@@ -0,0 +1,270 @@
+# ABOUTME: Performance benchmark harness for all art generation algorithms
+# ABOUTME: Records timing and memory baselines to JSON and flags regressions against them
+
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from queue import Empty
+
+import click
+
+from koch_snowflake import KochSnowflake
+from sierpinski_gasket import SierpinskiGasket
+from sierpinski_arrowhead import SierpinskiArrowhead
+from mandelbrot_set import MandelbrotSet
+
+
+# Sizes and detail levels (recursion depth or iteration count) per algorithm
+DEFAULT_MATRIX = {
+    "koch-snowflake": {"sizes": [400, 1600], "levels": [3, 5, 7]},
+    "sierpinski-gasket": {"sizes": [400, 1600], "levels": [3, 5, 7]},
+    "sierpinski-arrowhead": {"sizes": [400, 1600], "levels": [3, 5, 7]},
+    "mandelbrot-set": {"sizes": [100, 300], "levels": [50, 200]},
+}
+
+# Small matrix for smoke runs and tests
+QUICK_MATRIX = {
+    "koch-snowflake": {"sizes": [100], "levels": [2]},
+    "sierpinski-gasket": {"sizes": [100], "levels": [2]},
+    "sierpinski-arrowhead": {"sizes": [100], "levels": [2]},
+    "mandelbrot-set": {"sizes": [30], "levels": [20]},
+}
+
+# Metrics compared between runs; lower is better for all of them
+COMPARED_METRICS = ["generate_seconds", "save_seconds", "peak_rss_kb"]
+
+# Absolute differences below these floors are treated as noise
+NOISE_FLOORS = {
+    "generate_seconds": 0.005,
+    "save_seconds": 0.005,
+    "peak_rss_kb": 1024,
+}
+
+# How often a waiting harness checks that a benchmark child is still alive
+CHILD_POLL_SECONDS = 1.0
+
+
+def build_case(algorithm, size, level):
+    """Return (generate, save, unit) callables for one benchmark case"""
+    if algorithm == "koch-snowflake":
+        koch = KochSnowflake(size=size)
+        return (lambda: koch.generate_snowflake(depth=level)), koch.save_image, "points"
+    if algorithm == "sierpinski-gasket":
+        gasket = SierpinskiGasket(size=size)
+        return (lambda: gasket.generate_gasket(depth=level)), gasket.save_image, "triangles"
+    if algorithm == "sierpinski-arrowhead":
+        arrowhead = SierpinskiArrowhead(size=size)
+        return (lambda: arrowhead.generate_arrowhead(depth=level)), arrowhead.save_image, "points"
+    if algorithm == "mandelbrot-set":
+        mandelbrot = MandelbrotSet(size=size, max_iterations=level)
+        return mandelbrot.generate_mandelbrot_set, mandelbrot.save_image, "pixels"
+    raise ValueError(f"Unknown algorithm: {algorithm}")
+
+
+def count_units(data, unit):
+    """Count the points, triangles or pixels in generated data"""
+    if unit == "pixels":
+        return sum(len(row) for row in data)
+    return len(data)
+
+
+def case_key(algorithm, size, level):
+    """Build the stable key used to match cases between runs"""
+    return f"{algorithm}/size={size}/level={level}"
+
+
+def measure_case(algorithm, size, level, repeat=1):
+    """Time generation and saving of one case in the current process"""
+    generate, save, unit = build_case(algorithm, size, level)
+    generate_times = []
+    save_times = []
+    units = 0
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filename = os.path.join(tmpdir, "benchmark.png")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            data = generate()
+            generate_times.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            save(data, filename)
+            save_times.append(time.perf_counter() - start)
+
+            units = count_units(data, unit)
+            del data
+
+    # Minimum over repeats is the least noisy estimate of the true cost
+    generate_seconds = min(generate_times)
+    save_seconds = min(save_times)
+    return {
+        "algorithm": algorithm,
+        "size": size,
+        "level": level,
+        "unit": unit,
+        "units": units,
+        "generate_seconds": generate_seconds,
+        "save_seconds": save_seconds,
+        "units_per_second": units / generate_seconds if generate_seconds > 0 else None,
+        "pixels_per_second": size * size / save_seconds if save_seconds > 0 else None,
+        # ru_maxrss is reported in kilobytes on Linux
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def _measure_in_child(queue, algorithm, size, level, repeat):
+    """Child process entry point that reports its measurement on a queue"""
+    try:
+        queue.put(("ok", measure_case(algorithm, size, level, repeat)))
+    except Exception as error:
+        queue.put(("error", repr(error)))
+
+
+def wait_for_child(process, queue, poll_seconds=CHILD_POLL_SECONDS):
+    """Wait for a child's (status, payload) report, failing if it dies without one"""
+    while True:
+        try:
+            return queue.get(timeout=poll_seconds)
+        except Empty:
+            if process.is_alive():
+                continue
+        # The report may still be in flight from a child that exited normally
+        try:
+            return queue.get(timeout=poll_seconds)
+        except Empty:
+            # Killed by a signal (negative exit code), e.g. out of memory, or crashed in C code
+            return "error", f"process exited with code {process.exitcode} without reporting"
+
+
+def run_case_isolated(algorithm, size, level, repeat=1):
+    """Measure one case in a fresh process so peak RSS is per case"""
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=_measure_in_child, args=(queue, algorithm, size, level, repeat))
+    process.start()
+    status, payload = wait_for_child(process, queue)
+    process.join()
+
+    if status != "ok":
+        raise RuntimeError(f"Benchmark case {case_key(algorithm, size, level)} failed: {payload}")
+    return payload
+
+
+def run_benchmarks(matrix, repeat=1, algorithms=None, echo=None):
+    """Run every case in the matrix and return a baseline document"""
+    results = {}
+    for algorithm, axes in matrix.items():
+        if algorithms and algorithm not in algorithms:
+            continue
+        for size in axes["sizes"]:
+            for level in axes["levels"]:
+                key = case_key(algorithm, size, level)
+                results[key] = run_case_isolated(algorithm, size, level, repeat)
+                if echo:
+                    echo(format_result(key, results[key]))
+
+    return {
+        "environment": {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+        },
+        "matrix": matrix,
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def format_result(key, result):
+    """Format one benchmark result as a single human-readable line"""
+    return (f"{key}: generate {result['generate_seconds']:.4f}s, "
+            f"save {result['save_seconds']:.4f}s, "
+            f"{result['units']} {result['unit']}, "
+            f"peak RSS {result['peak_rss_kb']} KB")
+
+
+def compare_results(baseline, current, threshold):
+    """Compare two baseline documents and return a list of regressions"""
+    regressions = []
+    for key, base in baseline["results"].items():
+        if key not in current["results"]:
+            continue
+        now = current["results"][key]
+        for metric in COMPARED_METRICS:
+            before = base.get(metric)
+            after = now.get(metric)
+            if before is None or after is None:
+                continue
+            if after - before <= NOISE_FLOORS[metric]:
+                continue
+            if after > before * (1 + threshold):
+                regressions.append({
+                    "case": key,
+                    "metric": metric,
+                    "baseline": before,
+                    "current": after,
+                    "ratio": after / before if before else float("inf"),
+                })
+    return regressions
+
+
+@click.group()
+def cli():
+    """Benchmark the art generation algorithms."""
+
+
+@cli.command("run")
+@click.option('--output', default='benchmark_baseline.json', show_default=True, help='JSON file to write results to')
+@click.option('--quick', is_flag=True, help='Use a small matrix for smoke testing')
+@click.option('--repeat', type=int, default=3, show_default=True, help='Repetitions per case; the fastest is kept')
+@click.option('--algorithm', 'algorithms', multiple=True, help='Restrict to these algorithms')
+def run_command(output, quick, repeat, algorithms):
+    """Run the benchmark matrix and record a baseline."""
+    matrix = QUICK_MATRIX if quick else DEFAULT_MATRIX
+    document = run_benchmarks(matrix, repeat=repeat, algorithms=algorithms, echo=click.echo)
+    with open(output, "w") as handle:
+        json.dump(document, handle, indent=2)
+    click.echo(f"Wrote {len(document['results'])} results to {output}")
+
+
+@cli.command("compare")
+@click.argument('baseline', type=click.Path(exists=True, dir_okay=False))
+@click.option('--current', type=click.Path(exists=True, dir_okay=False), help='Previously recorded results; runs the baseline matrix when omitted')
+@click.option('--threshold', type=float, default=0.2, show_default=True, help='Allowed fractional slowdown before flagging')
+@click.option('--repeat', type=int, default=None, help='Repetitions per case (defaults to the baseline setting)')
+def compare_command(baseline, current, threshold, repeat):
+    """Compare against a baseline and exit non-zero on regressions."""
+    with open(baseline) as handle:
+        baseline_document = json.load(handle)
+
+    if current:
+        with open(current) as handle:
+            current_document = json.load(handle)
+    else:
+        current_document = run_benchmarks(
+            baseline_document["matrix"],
+            repeat=repeat or baseline_document.get("repeat", 1),
+            echo=click.echo,
+        )
+
+    regressions = compare_results(baseline_document, current_document, threshold)
+    for regression in regressions:
+        click.echo(f"REGRESSION {regression['case']} {regression['metric']}: "
+                   f"{regression['baseline']:.4g} -> {regression['current']:.4g} "
+                   f"({regression['ratio']:.2f}x)")
+
+    if regressions:
+        click.echo(f"{len(regressions)} regression(s) beyond {threshold:.0%}")
+        sys.exit(1)
+    click.echo("No regressions")
+
+
+if __name__ == "__main__":
+    cli()
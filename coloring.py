@@ -0,0 +1,85 @@
+# ABOUTME: Smooth (normalized iteration count) colouring with histogram equalization for escape-time fractals
+# ABOUTME: Histograms are filled row by row so colouring never needs a stored iteration matrix
+
+import math
+
+
+# Iteration counts mapped straight onto the gradient
+LINEAR = "linear"
+# Normalized iteration counts spread over the gradient by histogram equalization
+SMOOTH = "smooth"
+COLORINGS = [LINEAR, SMOOTH]
+
+# Gradient entries precomputed for equalized colouring
+PALETTE_STEPS = 1024
+
+# Pixels sampled to estimate the histogram when rows are coloured before the render ends
+HISTOGRAM_SAMPLE_PIXELS = 256 * 256
+
+
+def check_coloring(coloring):
+    """Validate a colouring name"""
+    if coloring not in COLORINGS:
+        raise ValueError(f"Unknown coloring {coloring!r}; expected one of {', '.join(COLORINGS)}")
+    return coloring
+
+
+def smooth_iteration(iteration, magnitude_squared):
+    """Normalized iteration count of a point that escaped at an iteration with |z|^2 = magnitude_squared"""
+    # n + 1 - log2(log2 |z|), clamped so escaped points stay below the interior value
+    return max(iteration + 1 - math.log2(0.5 * math.log2(magnitude_squared)), 0.0)
+
+
+class Histogram:
+    """Counts of escaped points per whole iteration, filled one row at a time"""
+
+    def __init__(self, max_iterations):
+        self.max_iterations = max_iterations
+        self.bins = [0] * max_iterations
+
+    def add_row(self, row):
+        """Count the escaped values of a row; interior points are ignored"""
+        bins = self.bins
+        max_iterations = self.max_iterations
+        for value in row:
+            if value < max_iterations:
+                bins[int(value)] += 1
+
+    def cdf(self):
+        """Fraction of escaped points below each whole iteration, from 0 at 0 to 1 at max_iterations"""
+        total = sum(self.bins)
+        cdf = [0.0]
+        running = 0
+        for count in self.bins:
+            running += count
+            cdf.append(running / total if total else len(cdf) / self.max_iterations)
+        return cdf
+
+
+class EqualizedPalette:
+    """Colours normalized iteration counts by their position in a cumulative histogram"""
+
+    def __init__(self, cdf, gradient, steps=PALETTE_STEPS):
+        self.cdf = cdf
+        self.max_iterations = len(cdf) - 1
+        self.steps = steps
+        self.colors = [bytes(gradient(step / (steps - 1))) for step in range(steps)]
+
+    def color_row(self, row):
+        """Colour one row of normalized iteration counts as packed RGB bytes"""
+        cdf = self.cdf
+        colors = self.colors
+        scale = self.steps - 1
+        max_iterations = self.max_iterations
+        black = b"\x00\x00\x00"
+        pixels = bytearray()
+        for value in row:
+            if value >= max_iterations:
+                # Points in the set are black
+                pixels += black
+                continue
+            # Interpolate between bins so colours stay continuous
+            whole = int(value)
+            low = cdf[whole]
+            pixels += colors[int((low + (value - whole) * (cdf[whole + 1] - low)) * scale + 0.5)]
+        return bytes(pixels)
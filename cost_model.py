@@ -0,0 +1,108 @@
+# ABOUTME: Cost model primitives for predicting render size, memory and runtime up front
+# ABOUTME: Parses memory budgets and picks the cheapest execution strategy that fits
+
+import re
+
+
+# Execution strategies, fastest first
+IN_MEMORY = "in-memory"
+STREAMING = "streaming"
+TILED = "tiled"
+STRATEGIES = [IN_MEMORY, STREAMING, TILED]
+
+DEFAULT_TILE_SIZE = 1024
+
+# PIL stores RGB images with four bytes per pixel
+CANVAS_BYTES_PER_PIXEL = 4
+
+# Approximate seconds to PNG encode one pixel with default settings
+ENCODE_SECONDS_PER_PIXEL = 3e-7
+
+# Packed x1, y1, x2, y2 integers per indexed segment, with slack for segments
+# that straddle tile boundaries and the per-cell containers
+INDEXED_SEGMENT_BYTES = 20
+
+# Resident size of the interpreter with main.py and its libraries imported,
+# measured as ru_maxrss on CPython 3.11
+BASE_OVERHEAD_BYTES = 40 * 1024 * 1024
+
+# Integer (x, y) tuple and its list slot in the copy render_image draws from;
+# per-unit byte constants carry about 10% headroom over measured resident memory
+INT_POINT_BYTES = 160
+
+SIZE_SUFFIXES = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+
+
+class MemoryBudgetError(ValueError):
+    """Raised when no execution strategy fits within the memory budget"""
+
+
+def parse_memory_size(text):
+    """Parse a size such as 512M, 2G or 1048576 into bytes"""
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([KMGT]?)i?B?\s*", str(text), re.IGNORECASE)
+    if not match:
+        raise ValueError(f"Invalid memory size: {text}")
+    return int(float(match.group(1)) * SIZE_SUFFIXES[match.group(2).upper()])
+
+
+def format_bytes(count):
+    """Format a byte count with a binary unit suffix"""
+    value = float(count)
+    for suffix in ["B", "KiB", "MiB", "GiB"]:
+        if value < 1024:
+            return f"{value:.1f} {suffix}"
+        value /= 1024
+    return f"{value:.1f} TiB"
+
+
+def canvas_bytes(width, height):
+    """Memory held by a full RGB canvas"""
+    return width * height * CANVAS_BYTES_PER_PIXEL
+
+
+def coverage_canvas_bytes(size, supersample):
+    """Memory held by a supersampled 8-bit coverage canvas and its downscaled copy"""
+    return (size * supersample) ** 2 + size * size
+
+
+def tile_band_bytes(size, tile_size, workers):
+    """Memory held while one band of tiles is rendered and stitched"""
+    band = size * tile_size * CANVAS_BYTES_PER_PIXEL
+    # Each worker draws on a 1-bit canvas as wide as the image, plus its tile
+    per_worker = size * tile_size // 8 + tile_size * tile_size * CANVAS_BYTES_PER_PIXEL
+    # The stitched band, its packed bytes and the returned tiles
+    return 3 * band + workers * per_worker
+
+
+def make_estimate(units, unit, memory, seconds):
+    """Build a cost estimate with overhead added to every strategy's memory"""
+    return {
+        "units": units,
+        "unit": unit,
+        "memory_bytes": {strategy: int(value + BASE_OVERHEAD_BYTES) for strategy, value in memory.items()},
+        "seconds": seconds,
+    }
+
+
+def choose_strategy(estimate, budget=None, allowed=None):
+    """Return the fastest allowed strategy whose predicted memory fits the budget"""
+    candidates = [strategy for strategy in STRATEGIES
+                  if strategy in estimate["memory_bytes"] and (allowed is None or strategy in allowed)]
+    if budget is None:
+        return candidates[0]
+
+    for strategy in candidates:
+        if estimate["memory_bytes"][strategy] <= budget:
+            return strategy
+
+    raise MemoryBudgetError(
+        f"No execution strategy fits in {format_bytes(budget)}: " + format_estimate(estimate, candidates)
+    )
+
+
+def format_estimate(estimate, strategies=None):
+    """Format an estimate as a single human-readable line"""
+    strategies = strategies or [strategy for strategy in STRATEGIES if strategy in estimate["memory_bytes"]]
+    memory = ", ".join(f"{strategy} {format_bytes(estimate['memory_bytes'][strategy])}" for strategy in strategies)
+    return (f"{estimate['units']:,} {estimate['unit']}, ~{estimate['seconds']:.1f}s, "
+            f"peak memory {memory}")
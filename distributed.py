@@ -0,0 +1,407 @@
+# ABOUTME: Distributed tile rendering with a coordinator and workers over TCP or Unix sockets
+# ABOUTME: Leases tiles to workers, reassigns tiles of dead or stalled workers and streams finished bands
+
+import heapq
+import json
+import os
+import socket
+import socketserver
+import struct
+import sys
+import threading
+import time
+import zlib
+from array import array
+
+from coloring import SMOOTH
+from cost_model import DEFAULT_TILE_SIZE
+from encoders import open_row_writer
+from mandelbrot_set import MandelbrotSet
+from tiled import TILED_EXTENSIONS, build_segment_grid, render_tile, stitch_band
+
+
+# Messages are a 4-byte big-endian header length, a JSON header and then
+# header["length"] bytes of binary payload
+HEADER_LENGTH = struct.Struct("!I")
+
+# Largest header and payload a peer may announce, so a corrupt or hostile
+# peer cannot make the other side allocate arbitrary memory
+MAX_HEADER_BYTES = 1 << 20
+MAX_PAYLOAD_BYTES = 1 << 30
+
+# zlib level for tile payloads; tiles are mostly flat colour so level 1 is plenty
+PAYLOAD_COMPRESS_LEVEL = 1
+
+MANDELBROT_PARAMS = ("size", "center_real", "center_imag", "zoom", "max_iterations", "engine", "coloring", "precision")
+
+
+class ProtocolError(ConnectionError):
+    """Raised when a peer sends a malformed or truncated message"""
+
+
+class DistributedRenderError(RuntimeError):
+    """Raised when a tile keeps failing after being retried on several workers"""
+
+
+def parse_address(address):
+    """Parse host:port or unix:/path into a (socket family, address) pair"""
+    if address.startswith("unix:"):
+        return socket.AF_UNIX, address[len("unix:"):]
+    host, separator, port = address.rpartition(":")
+    if not separator or not port.isdigit():
+        raise ValueError(f"Invalid address {address!r}; expected host:port or unix:/path")
+    return socket.AF_INET, (host or "localhost", int(port))
+
+
+def write_message(stream, header, payload=b""):
+    """Send one message with an optional binary payload"""
+    encoded = json.dumps(dict(header, length=len(payload))).encode()
+    stream.write(HEADER_LENGTH.pack(len(encoded)) + encoded + payload)
+    stream.flush()
+
+
+def read_message(stream):
+    """Receive one (header, payload) message, or None when the peer has closed"""
+    prefix = stream.read(HEADER_LENGTH.size)
+    if not prefix:
+        return None
+    if len(prefix) < HEADER_LENGTH.size:
+        raise ProtocolError("Connection closed inside a message header")
+
+    header_length = HEADER_LENGTH.unpack(prefix)[0]
+    if header_length > MAX_HEADER_BYTES:
+        raise ProtocolError(f"Message header of {header_length} bytes exceeds {MAX_HEADER_BYTES}")
+    encoded = stream.read(header_length)
+    try:
+        header = json.loads(encoded)
+    except ValueError:
+        raise ProtocolError("Malformed message header")
+    if not isinstance(header, dict):
+        raise ProtocolError("Message header is not an object")
+
+    length = header.get("length", 0)
+    if not isinstance(length, int) or not 0 <= length <= MAX_PAYLOAD_BYTES:
+        raise ProtocolError(f"Invalid message payload length {length!r}")
+    payload = stream.read(length)
+    if len(payload) < length:
+        raise ProtocolError("Connection closed inside a message payload")
+    return header, payload
+
+
+def inflate(data, max_length=MAX_PAYLOAD_BYTES):
+    """Decompress a zlib payload, refusing to produce more than max_length bytes"""
+    decompressor = zlib.decompressobj()
+    inflated = decompressor.decompress(data, max_length)
+    if decompressor.unconsumed_tail:
+        raise ProtocolError(f"Payload inflates past {max_length} bytes")
+    if not decompressor.eof:
+        raise ProtocolError("Truncated payload")
+    return inflated
+
+
+def pack_segments(segments):
+    """Pack integer segment coordinates as little-endian bytes for the wire"""
+    packed = array('i', segments)
+    if sys.byteorder == "big":
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def unpack_segments(data):
+    """Unpack little-endian segment coordinates received from the wire"""
+    segments = array('i', data)
+    if sys.byteorder == "big":
+        segments.byteswap()
+    return segments
+
+
+def plan_tiles(algorithm, tile_size=DEFAULT_TILE_SIZE):
+    """Split a render into a worker job description and rows of (box, payload) tiles"""
+    if hasattr(algorithm, "iter_paths"):
+        # Workers only rasterize, so each tile carries the segments overlapping it
+        grid = build_segment_grid(algorithm, tile_size)
+        job = {"kind": "segments", "line_width": algorithm.line_width, "padding": grid.margin}
+        rows = [[(grid.tile_box(column, row), pack_segments(grid.segments(column, row)))
+                 for column in range(grid.columns)] for row in range(grid.rows)]
+        return job, rows
+
+    if type(algorithm) is MandelbrotSet:
+        # Workers rebuild the view from its parameters and compute their own pixels
+        job = {"kind": "mandelbrot", "params": {name: getattr(algorithm, name) for name in MANDELBROT_PARAMS}}
+        if algorithm.coloring == SMOOTH:
+            # Every worker colours with the coordinator's histogram
+            job["cdf"] = algorithm.equalization_cdf()
+        size = algorithm.size
+        rows = [[((left, top, min(left + tile_size, size), min(top + tile_size, size)), b"")
+                 for left in range(0, size, tile_size)] for top in range(0, size, tile_size)]
+        return job, rows
+
+    raise ValueError(f"{type(algorithm).__name__} cannot be rendered in distributed tiles")
+
+
+def make_tile_renderer(job):
+    """Return a function rendering one (box, payload) tile of a job to RGB bytes"""
+    if job["kind"] == "segments":
+        return lambda box, payload: render_tile(box, unpack_segments(payload), job["line_width"], job["padding"])
+    if job["kind"] == "mandelbrot":
+        mandelbrot = MandelbrotSet(**job["params"])
+        if "cdf" in job:
+            mandelbrot.set_equalization(job["cdf"])
+        return lambda box, payload: mandelbrot.color_tile(box)
+    raise ValueError(f"Unknown job kind: {job['kind']}")
+
+
+class TileCoordinator:
+    """Leases tiles to workers, collects their results and writes finished bands in order"""
+
+    def __init__(self, job, rows, lease_timeout=300, max_attempts=3, pending_bands=4):
+        self.job = job
+        self.rows = rows
+        self.lease_timeout = lease_timeout
+        self.max_attempts = max_attempts
+        # Tiles are only leased this many bands ahead of the writer, bounding held results
+        self.pending_bands = pending_bands
+
+        # Tile ids are (row, column) pairs so the heap hands out tiles in write order
+        self.pending = [(row, column) for row in range(len(rows)) for column in range(len(rows[row]))]
+        self.leases = {}  # tile id -> (connection, deadline)
+        self.attempts = {}
+        self.results = {}
+        self.written_rows = 0
+        self.error = None
+        self.condition = threading.Condition()
+
+    @property
+    def finished(self):
+        """Whether every band has been written"""
+        return self.written_rows == len(self.rows)
+
+    def tile(self, tile_id):
+        """Return the (box, payload) of a tile"""
+        row, column = tile_id
+        return self.rows[row][column]
+
+    def claim(self, connection, poll_seconds=0.5):
+        """Lease the next tile to a connection, or return None once the render is over"""
+        with self.condition:
+            while True:
+                if self.error is not None or self.finished:
+                    return None
+                self._expire_leases()
+
+                while self.pending and self.pending[0] in self.results:
+                    heapq.heappop(self.pending)
+                if self.pending and self.pending[0][0] < self.written_rows + self.pending_bands:
+                    tile_id = heapq.heappop(self.pending)
+                    self.attempts[tile_id] = self.attempts.get(tile_id, 0) + 1
+                    self.leases[tile_id] = (connection, time.monotonic() + self.lease_timeout)
+                    return tile_id
+
+                self.condition.wait(poll_seconds)
+
+    def complete(self, tile_id, pixels):
+        """Store a finished tile; duplicates from reassigned leases are ignored"""
+        with self.condition:
+            self.leases.pop(tile_id, None)
+            if tile_id[0] >= self.written_rows and tile_id not in self.results:
+                self.results[tile_id] = pixels
+            self.condition.notify_all()
+
+    def fail(self, tile_id, reason):
+        """Return a tile whose render failed to the queue, giving up after max_attempts"""
+        with self.condition:
+            self._requeue(tile_id, reason)
+            self.condition.notify_all()
+
+    def release(self, connection):
+        """Requeue every tile still leased to a connection that has gone away"""
+        with self.condition:
+            for tile_id in [tile_id for tile_id, lease in self.leases.items() if lease[0] is connection]:
+                self._requeue(tile_id, "worker disconnected")
+            self.condition.notify_all()
+
+    def _expire_leases(self):
+        """Requeue tiles whose workers have held them past the lease timeout"""
+        now = time.monotonic()
+        for tile_id in [tile_id for tile_id, lease in self.leases.items() if lease[1] < now]:
+            self._requeue(tile_id, "lease expired")
+
+    def _requeue(self, tile_id, reason):
+        self.leases.pop(tile_id, None)
+        if tile_id in self.results or tile_id[0] < self.written_rows:
+            return
+        if self.attempts.get(tile_id, 0) >= self.max_attempts:
+            self.error = DistributedRenderError(
+                f"Tile {tile_id} failed {self.attempts[tile_id]} times; last error: {reason}")
+        elif tile_id not in self.pending:
+            heapq.heappush(self.pending, tile_id)
+
+    def write(self, writer, width, poll_seconds=0.5):
+        """Write bands to a row writer as soon as all of their tiles have arrived"""
+        for row, tiles in enumerate(self.rows):
+            tile_ids = [(row, column) for column in range(len(tiles))]
+            with self.condition:
+                while not all(tile_id in self.results for tile_id in tile_ids):
+                    # Expire leases here too, in case every worker has stalled
+                    self._expire_leases()
+                    if self.error is not None:
+                        self.condition.notify_all()
+                        raise self.error
+                    self.condition.wait(poll_seconds)
+                results = [self.results.pop(tile_id) for tile_id in tile_ids]
+
+            writer.write_rows(stitch_band(width, [box for box, _ in tiles], results))
+
+            with self.condition:
+                self.written_rows += 1
+                self.condition.notify_all()
+
+
+class _WorkerHandler(socketserver.StreamRequestHandler):
+    """Serves one worker connection: send the job, then lease tiles until done"""
+
+    def handle(self):
+        coordinator = self.server.coordinator
+        connection = object()
+        try:
+            if read_message(self.rfile) is None:
+                return
+            write_message(self.wfile, {"type": "job", "job": coordinator.job})
+
+            while True:
+                tile_id = coordinator.claim(connection)
+                if tile_id is None:
+                    write_message(self.wfile, {"type": "done"})
+                    return
+
+                box, payload = coordinator.tile(tile_id)
+                write_message(self.wfile, {"type": "tile", "box": box}, zlib.compress(payload, PAYLOAD_COMPRESS_LEVEL))
+                reply = read_message(self.rfile)
+                if reply is None:
+                    return
+
+                header, result = reply
+                if header.get("type") != "result":
+                    coordinator.fail(tile_id, header.get("message", "worker error"))
+                    continue
+                expected = (box[2] - box[0]) * (box[3] - box[1]) * 3
+                try:
+                    pixels = inflate(result, expected)
+                except ProtocolError as error:
+                    coordinator.fail(tile_id, str(error))
+                    continue
+                if len(pixels) != expected:
+                    coordinator.fail(tile_id, "result has the wrong size")
+                    continue
+                coordinator.complete(tile_id, pixels)
+        except (OSError, zlib.error):
+            # A dead or misbehaving worker only loses its leases
+            pass
+        finally:
+            coordinator.release(connection)
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class _UnixServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+def start_server(coordinator, address):
+    """Start serving a coordinator on a background thread and return the server"""
+    family, bind_address = parse_address(address)
+    server_class = _UnixServer if family == socket.AF_UNIX else _TCPServer
+    server = server_class(bind_address, _WorkerHandler)
+    server.coordinator = coordinator
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def format_address(server):
+    """Return the address a started server is listening on, in parse_address syntax"""
+    if server.address_family == socket.AF_UNIX:
+        return f"unix:{server.server_address}"
+    host, port = server.server_address[:2]
+    return f"{host}:{port}"
+
+
+def render_distributed(algorithm, filename, address, tile_size=DEFAULT_TILE_SIZE, compress_level=None,
+                       encode_threads=1, lease_timeout=300, max_attempts=3, on_listen=None):
+    """Coordinate a tiled render across connecting workers, streaming bands to a PNG or PPM file"""
+    extension = os.path.splitext(filename)[1].lower()
+    if extension not in TILED_EXTENSIONS:
+        raise ValueError(f"Distributed rendering writes {', '.join(TILED_EXTENSIONS)} files, not {extension}")
+
+    job, rows = plan_tiles(algorithm, tile_size)
+    coordinator = TileCoordinator(job, rows, lease_timeout=lease_timeout, max_attempts=max_attempts)
+    server = start_server(coordinator, address)
+    try:
+        if on_listen is not None:
+            on_listen(format_address(server))
+        with open(filename, "wb") as stream:
+            writer = open_row_writer(stream, filename, algorithm.size, algorithm.size, compress_level, encode_threads)
+            coordinator.write(writer, algorithm.size)
+            writer.close()
+    finally:
+        # Let connected workers hear that the render is over before closing
+        with coordinator.condition:
+            coordinator.condition.notify_all()
+        server.shutdown()
+        server.server_close()
+        if server.address_family == socket.AF_UNIX:
+            os.unlink(server.server_address)
+
+
+def connect(address, timeout=30):
+    """Connect to a coordinator, retrying until it is listening or the timeout passes"""
+    family, target = parse_address(address)
+    deadline = time.monotonic() + timeout
+    while True:
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        try:
+            sock.connect(target)
+            return sock
+        except OSError:
+            sock.close()
+            if time.monotonic() >= deadline:
+                raise
+            time.sleep(0.1)
+
+
+def run_worker(address, connect_timeout=30):
+    """Render tiles for a coordinator until it says the render is done; returns the tile count"""
+    rendered = 0
+    sock = connect(address, connect_timeout)
+    try:
+        # Closing the files flushes them, which fails too if the coordinator already went away
+        with sock, sock.makefile("rb") as rfile, sock.makefile("wb") as wfile:
+            write_message(wfile, {"type": "hello"})
+            message = read_message(rfile)
+            if message is None:
+                return rendered
+            if message[0].get("type") != "job" or not isinstance(message[0].get("job"), dict):
+                raise ProtocolError(f"Expected a job message, got {message[0].get('type')!r}")
+            render = make_tile_renderer(message[0]["job"])
+
+            while True:
+                message = read_message(rfile)
+                if message is None or message[0].get("type") != "tile":
+                    return rendered
+                header, payload = message
+                try:
+                    pixels = render(tuple(header["box"]), inflate(payload))
+                except Exception as error:
+                    # Report the failure so the coordinator can retry the tile elsewhere
+                    write_message(wfile, {"type": "error", "message": repr(error)})
+                    continue
+                write_message(wfile, {"type": "result"}, zlib.compress(pixels, PAYLOAD_COMPRESS_LEVEL))
+                rendered += 1
+    except ProtocolError:
+        # A malformed message is a broken coordinator, not the end of the render
+        raise
+    except ConnectionError:
+        # The coordinator finished or went away
+        return rendered
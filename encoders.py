@@ -0,0 +1,257 @@
+# ABOUTME: Configurable image encoders, raw output formats and a parallel streaming PNG writer
+# ABOUTME: Lets each render trade file size for encoding throughput
+
+import os
+import struct
+import sys
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL.PngImagePlugin import PngInfo
+
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# PNG colour types for the PIL modes the writer accepts
+PNG_COLOR_TYPES = {"L": (0, 1), "RGB": (2, 3), "RGBA": (6, 4)}
+
+JPEG_SUBSAMPLING = {"4:4:4": 0, "4:2:2": 1, "4:2:0": 2}
+
+# Extensions written from the generated data instead of a rasterized image
+DATA_EXTENSIONS = (".npy",)
+
+STDOUT_OUTPUT = "-"
+
+
+def png_chunk(chunk_type, data):
+    """Build one PNG chunk with its length and CRC"""
+    return (struct.pack(">I", len(data)) + chunk_type + data
+            + struct.pack(">I", zlib.crc32(chunk_type + data) & 0xffffffff))
+
+
+def png_text_chunk(keyword, text):
+    """Build a tEXt chunk holding one Latin-1 keyword and value"""
+    return png_chunk(b"tEXt", keyword.encode("latin1") + b"\x00" + str(text).encode("latin1"))
+
+
+def _deflate_strip(raw, level, last):
+    """Raw-deflate one strip so strips can be concatenated into one stream"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    # A sync flush ends the strip on a byte boundary without ending the stream
+    return compressor.compress(raw) + compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+
+class PNGStreamWriter:
+    """Writes a PNG row band by row band, deflating bands in parallel threads
+
+    Rows are stored unfiltered; memory is bounded by the number of bands in
+    flight rather than the image size.
+    """
+
+    def __init__(self, stream, width, height, mode="RGB", compress_level=6, threads=1, text=None):
+        if mode not in PNG_COLOR_TYPES:
+            raise ValueError(f"Unsupported PNG mode: {mode}")
+        self.stream = stream
+        self.width = width
+        self.height = height
+        self.compress_level = 6 if compress_level is None else compress_level
+        self.color_type, self.channels = PNG_COLOR_TYPES[mode]
+        self.row_bytes = width * self.channels
+        self.rows_written = 0
+        self.adler = 1
+        self.threads = max(threads, 1)
+        self.executor = ThreadPoolExecutor(max_workers=self.threads) if self.threads > 1 else None
+        self.pending = deque()
+
+        self.stream.write(PNG_SIGNATURE)
+        self.stream.write(png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, self.color_type, 0, 0, 0)))
+        for keyword, value in (text or {}).items():
+            self.stream.write(png_text_chunk(keyword, value))
+        # zlib header for a deflate stream with a 32K window
+        self.stream.write(png_chunk(b"IDAT", b"\x78\x9c"))
+
+    def write_rows(self, pixels):
+        """Queue a band of whole rows given as packed pixel bytes"""
+        rows = len(pixels) // self.row_bytes
+        if rows * self.row_bytes != len(pixels):
+            raise ValueError("Pixel data must contain whole rows")
+        if self.rows_written + rows > self.height:
+            raise ValueError("More rows written than the image height")
+
+        # Prefix every row with filter type 0 (None)
+        view = memoryview(pixels)
+        raw = b"".join(b"\x00" + view[i:i + self.row_bytes] for i in range(0, len(pixels), self.row_bytes))
+        self.adler = zlib.adler32(raw, self.adler)
+        self.rows_written += rows
+        last = self.rows_written == self.height
+
+        if self.executor is None:
+            self.stream.write(png_chunk(b"IDAT", _deflate_strip(raw, self.compress_level, last)))
+            return
+
+        self.pending.append(self.executor.submit(_deflate_strip, raw, self.compress_level, last))
+        # Bound the bands held in memory while keeping every thread busy
+        while len(self.pending) > self.threads * 2:
+            self.stream.write(png_chunk(b"IDAT", self.pending.popleft().result()))
+
+    def close(self):
+        """Flush outstanding bands and finish the file"""
+        if self.rows_written != self.height:
+            raise ValueError(f"Expected {self.height} rows, got {self.rows_written}")
+        while self.pending:
+            self.stream.write(png_chunk(b"IDAT", self.pending.popleft().result()))
+        if self.executor is not None:
+            self.executor.shutdown()
+
+        self.stream.write(png_chunk(b"IDAT", struct.pack(">I", self.adler & 0xffffffff)))
+        self.stream.write(png_chunk(b"IEND", b""))
+
+    def abort(self):
+        """Drop outstanding bands and stop the deflate threads without finishing the file"""
+        self.pending.clear()
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+
+
+class PPMStreamWriter:
+    """Writes a binary PPM row band by row band"""
+
+    def __init__(self, stream, width, height):
+        self.stream = stream
+        self.row_bytes = width * 3
+        self.height = height
+        self.rows_written = 0
+        self.stream.write(f"P6\n{width} {height}\n255\n".encode("ascii"))
+
+    def write_rows(self, pixels):
+        """Write a band of whole rows given as packed RGB bytes"""
+        self.rows_written += len(pixels) // self.row_bytes
+        self.stream.write(pixels)
+
+    def close(self):
+        """Check that the whole image was written"""
+        if self.rows_written != self.height:
+            raise ValueError(f"Expected {self.height} rows, got {self.rows_written}")
+
+    def abort(self):
+        """Stop writing; rows are written as they come, so there is nothing to release"""
+
+
+# Extensions that can be written a band of rows at a time
+ROW_STREAM_EXTENSIONS = (".png", ".ppm")
+
+
+def open_row_writer(stream, filename, width, height, compress_level=None, threads=1):
+    """Open a band-by-band RGB writer for a .png or .ppm filename"""
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == ".png":
+        return PNGStreamWriter(stream, width, height, "RGB", compress_level, threads)
+    if extension == ".ppm":
+        return PPMStreamWriter(stream, width, height)
+    raise ValueError(f"Cannot stream rows to {extension} files; use {', '.join(ROW_STREAM_EXTENSIONS)}")
+
+
+def write_png_parallel(image, filename, compress_level=6, threads=2, strip_rows=64, text=None):
+    """Encode a PIL image as PNG with strips deflated in parallel"""
+    if image.mode not in PNG_COLOR_TYPES:
+        image = image.convert("RGB")
+    width, height = image.size
+    with open(filename, "wb") as stream:
+        writer = PNGStreamWriter(stream, width, height, image.mode, compress_level, threads, text)
+        for top in range(0, height, strip_rows):
+            bottom = min(top + strip_rows, height)
+            writer.write_rows(image.crop((0, top, width, bottom)).tobytes())
+        writer.close()
+
+
+def write_npy(filename, values, shape):
+    """Write an array.array as a .npy file readable by numpy.load"""
+    endian = "<" if sys.byteorder == "little" else ">"
+    kind = "f" if values.typecode in "fd" else "i"
+    descr = f"{endian}{kind}{values.itemsize}"
+    header = f"{{'descr': '{descr}', 'fortran_order': False, 'shape': {tuple(shape)!r}, }}"
+
+    # Magic, version, header length and header are padded to 64 bytes
+    preamble_length = 10
+    padding = 64 - (preamble_length + len(header) + 1) % 64
+    header = header + " " * padding + "\n"
+
+    with open(filename, "wb") as stream:
+        stream.write(b"\x93NUMPY\x01\x00" + struct.pack("<H", len(header)) + header.encode("latin1"))
+        values.tofile(stream)
+
+
+class ImageEncoder:
+    """Saves images with configurable compression, quality and raw formats"""
+
+    def __init__(self, png_compress_level=None, jpeg_quality=None, jpeg_subsampling=None, threads=1):
+        self.png_compress_level = png_compress_level
+        self.jpeg_quality = jpeg_quality
+        self.jpeg_subsampling = jpeg_subsampling
+        self.threads = threads
+
+    @staticmethod
+    def wants_data(filename):
+        """Check whether a filename asks for the generated data rather than an image"""
+        return os.path.splitext(filename)[1].lower() in DATA_EXTENSIONS
+
+    def save_data(self, array_and_shape, filename):
+        """Write generated data, as returned by an algorithm's as_array, to disk"""
+        values, shape = array_and_shape
+        write_npy(filename, values, shape)
+
+    def save(self, image, filename, text=None):
+        """Encode an image according to the filename and encoder options
+
+        text is a dict of metadata stored as tEXt chunks in PNG files and as
+        the comment of JPEG files; other formats have nowhere to keep it.
+        """
+        if filename == STDOUT_OUTPUT:
+            # Zero-encode: packed RGB bytes for piping into other tools
+            sys.stdout.buffer.write(image.convert("RGB").tobytes())
+            sys.stdout.buffer.flush()
+            return
+
+        extension = os.path.splitext(filename)[1].lower()
+        if extension in (".raw", ".rgb"):
+            with open(filename, "wb") as stream:
+                stream.write(image.convert("RGB").tobytes())
+        elif extension == ".pgm":
+            image.convert("L").save(filename, format="PPM")
+        elif extension == ".ppm":
+            image.convert("RGB").save(filename, format="PPM")
+        elif extension == ".png":
+            self.save_png(image, filename, text)
+        elif extension in (".jpg", ".jpeg"):
+            self.save_jpeg(image, filename, text)
+        else:
+            image.save(filename)
+
+    def save_png(self, image, filename, text=None):
+        """Save a PNG, in parallel strips when more than one thread is allowed"""
+        if self.threads > 1:
+            level = 6 if self.png_compress_level is None else self.png_compress_level
+            write_png_parallel(image, filename, compress_level=level, threads=self.threads, text=text)
+            return
+
+        options = {}
+        if self.png_compress_level is not None:
+            options["compress_level"] = self.png_compress_level
+        if text:
+            info = PngInfo()
+            for keyword, value in text.items():
+                info.add_text(keyword, str(value))
+            options["pnginfo"] = info
+        image.save(filename, format="PNG", **options)
+
+    def save_jpeg(self, image, filename, text=None):
+        """Save a JPEG with the configured quality and chroma subsampling"""
+        options = {}
+        if text:
+            options["comment"] = "\n".join(f"{keyword}: {value}" for keyword, value in text.items())
+        if self.jpeg_quality is not None:
+            options["quality"] = self.jpeg_quality
+        if self.jpeg_subsampling is not None:
+            options["subsampling"] = JPEG_SUBSAMPLING[self.jpeg_subsampling]
+        image.save(filename, format="JPEG", **options)
@@ -0,0 +1,62 @@
+# ABOUTME: Selectable compute engines and a cross-check of fast engines against the reference code
+# ABOUTME: Runs both engines on sampled pixels or segments and reports divergence and speedup
+
+import time
+
+
+# The original pure-Python implementations
+REFERENCE = "reference"
+# Pure-Python fast paths: inlined loops, lookup tables and shortcuts
+FAST = "fast"
+# Vectorized numpy kernels in a precision chosen for the view (escape-time fractals only)
+NUMPY = "numpy"
+ENGINES = [REFERENCE, FAST, NUMPY]
+
+DEFAULT_VERIFY_SAMPLES = 2000
+
+
+def check_engine(engine, supported=ENGINES):
+    """Validate an engine name against the engines an algorithm supports"""
+    if engine not in supported:
+        raise ValueError(f"Unsupported engine {engine!r}; expected one of {', '.join(supported)}")
+    return engine
+
+
+def max_divergence(expected, actual):
+    """Largest absolute difference between two equally long sequences of numbers"""
+    if len(expected) != len(actual):
+        raise ValueError(f"Engines produced {len(expected)} and {len(actual)} values")
+    return max((abs(a - b) for a, b in zip(expected, actual)), default=0)
+
+
+def _timed(function, *args):
+    """Run a function and return (seconds, result)"""
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+def verify_engine(algorithm, engine=FAST, samples=DEFAULT_VERIFY_SAMPLES):
+    """Run an engine and the reference engine on the same sampled inputs and compare them"""
+    check_engine(engine)
+    inputs = algorithm.sample_kernel_inputs(samples)
+    reference_seconds, expected = _timed(algorithm.run_kernel, REFERENCE, inputs)
+    engine_seconds, actual = _timed(algorithm.run_kernel, engine, inputs)
+
+    return {
+        "engine": engine,
+        "samples": len(inputs),
+        "max_divergence": max_divergence(expected, actual),
+        "unit": algorithm.KERNEL_UNIT,
+        "reference_seconds": reference_seconds,
+        "engine_seconds": engine_seconds,
+        "speedup": reference_seconds / engine_seconds if engine_seconds > 0 else float("inf"),
+    }
+
+
+def format_verification(report):
+    """Format a verification report as a single human-readable line"""
+    return (f"{report['engine']} vs {REFERENCE}: {report['samples']:,} samples, "
+            f"max divergence {report['max_divergence']:.3g} {report['unit']}, "
+            f"speedup {report['speedup']:.2f}x ({report['reference_seconds']:.4f}s -> "
+            f"{report['engine_seconds']:.4f}s)")
@@ -0,0 +1,121 @@
+# ABOUTME: Instanced rendering of self-similar line fractals by stamping rasterized copies of a motif
+# ABOUTME: Rasterizes each distinct sub-pattern once per orientation and pastes it at every copy's position
+
+from PIL import Image, ImageChops, ImageDraw
+
+from encoders import ImageEncoder
+from strategies import draw_paths
+
+
+# Sub-patterns with at most this many leaf primitives are drawn directly
+INSTANCE_DIRECT_LEAVES = 4096
+
+
+def draw_mask(paths, line_width):
+    """Rasterize (points, closed) polylines into an ink mask cropped to them; returns (mask, left, top)"""
+    paths = [(list(points), closed) for points, closed in paths]
+    xs = [int(x) for points, _ in paths for x, _ in points]
+    ys = [int(y) for points, _ in paths for _, y in points]
+    # Wide strokes reach past their end points
+    margin = line_width + 1
+    left = min(xs) - margin
+    top = min(ys) - margin
+
+    image = Image.new('L', (max(xs) + margin + 1 - left, max(ys) + margin + 1 - top), 255)
+    shifted = (([(x - left, y - top) for x, y in points], closed) for points, closed in paths)
+    draw_paths(ImageDraw.Draw(image), shifted, line_width)
+    return ImageChops.invert(image), left, top
+
+
+class InstancedRenderer:
+    """Renders a self-similar line fractal by pasting copies of rasterized sub-patterns
+
+    A primitive (a triangle or an edge) subdivided n times is the same picture
+    wherever it sits at one level, up to translation; the algorithm's
+    instance_key tells orientations apart. Each distinct (key, depth)
+    sub-pattern is rasterized once and pasted at every position it appears,
+    and large sub-patterns are themselves assembled this way, so the cost
+    grows with the number of copies placed rather than with 3 ** depth or
+    4 ** depth. Copies land on whole pixels, so lines may move by up to a
+    pixel compared with drawing every primitive.
+    """
+
+    def __init__(self, algorithm, direct_leaves=INSTANCE_DIRECT_LEAVES):
+        self.algorithm = algorithm
+        self.direct_leaves = direct_leaves
+        # (key, depth) -> (ink mask, left and top relative to the anchor)
+        self.stamps = {}
+
+    def split(self, primitives, levels):
+        """Subdivide primitives the given number of levels"""
+        for _ in range(levels):
+            primitives = [child for primitive in primitives for child in self.algorithm.split_primitive(primitive)]
+        return primitives
+
+    def split_levels(self, depth):
+        """Levels of copies to place for a sub-pattern of the given depth"""
+        # Split the depth evenly between the copies and the sub-pattern they copy,
+        # but never place more copies at once than are drawn directly
+        levels = max(depth // 2, 1)
+        while levels > 1 and self.algorithm.INSTANCE_BRANCHING ** levels > self.direct_leaves:
+            levels -= 1
+        return levels
+
+    def stamp(self, primitive, key, anchor, depth):
+        """Return the mask of a sub-pattern and its offset from the anchor, rasterizing it on first use"""
+        stamp = self.stamps.get((key, depth))
+        if stamp is None:
+            mask, left, top = self.rasterize(primitive, depth)
+            stamp = self.stamps[(key, depth)] = (mask, left - anchor[0], top - anchor[1])
+        return stamp
+
+    def rasterize(self, primitive, depth):
+        """Rasterize one primitive subdivided depth times; returns (mask, left, top)"""
+        if self.algorithm.INSTANCE_BRANCHING ** depth <= self.direct_leaves:
+            return draw_mask(self.algorithm.primitive_paths(primitive, depth), self.algorithm.line_width)
+        levels = self.split_levels(depth)
+        return self.composite(self.split([primitive], levels), depth - levels)
+
+    def composite(self, primitives, depth, bounds=None):
+        """Paste the sub-pattern of every primitive onto one mask; returns (mask, left, top)"""
+        placed = []
+        for primitive in primitives:
+            key, anchor = self.algorithm.instance_key(primitive)
+            mask, dx, dy = self.stamp(primitive, key, anchor, depth)
+            placed.append((mask, round(anchor[0] + dx), round(anchor[1] + dy)))
+
+        if bounds is None:
+            bounds = (min(x for _, x, _ in placed), min(y for _, _, y in placed),
+                      max(x + mask.width for mask, x, _ in placed), max(y + mask.height for mask, _, y in placed))
+        left, top, right, bottom = bounds
+        canvas = Image.new('L', (right - left, bottom - top), 0)
+        for mask, x, y in placed:
+            canvas.paste(255, (x - left, y - top, x - left + mask.width, y - top + mask.height), mask)
+        return canvas, left, top
+
+    def render_image(self):
+        """Render the algorithm at its recursion depth into an RGB image"""
+        algorithm = self.algorithm
+        depth = algorithm.recursion_depth
+        primitives = algorithm.instance_primitives()
+        if len(primitives) * algorithm.INSTANCE_BRANCHING ** depth <= self.direct_leaves:
+            # Small renders gain nothing from instancing
+            return algorithm.render_image_streaming()
+
+        levels = self.split_levels(depth)
+        mask, _, _ = self.composite(self.split(primitives, levels), depth - levels,
+                                    bounds=(0, 0, algorithm.size, algorithm.size))
+        return ImageChops.invert(mask).convert('RGB')
+
+
+def render_instanced(algorithm, output=None, profiler=None, encoder=None, direct_leaves=INSTANCE_DIRECT_LEAVES):
+    """Render a self-similar line fractal by instancing and save it"""
+    output = output or algorithm.output
+    encoder = encoder or ImageEncoder()
+
+    # Generation happens piecewise while sub-patterns are drawn, so both count as rasterization
+    with algorithm.stage("rasterize", profiler):
+        image = InstancedRenderer(algorithm, direct_leaves).render_image()
+    with algorithm.stage("encode", profiler):
+        encoder.save(image, output)
+    return image
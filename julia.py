@@ -0,0 +1,148 @@
+# ABOUTME: Julia sets and batched sweeps over a grid of c values sharing the Mandelbrot escape-time kernel
+# ABOUTME: Renders every c on a worker pool into a streamed contact sheet or one image per c
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image
+
+from coloring import LINEAR
+from encoders import ImageEncoder, ROW_STREAM_EXTENSIONS, open_row_writer
+from engines import REFERENCE
+from mandelbrot_set import MandelbrotSet
+from precision import AUTO
+from tiled import stitch_band
+
+
+# Shows the whole of any connected Julia set, which lies within |z| <= 2
+DEFAULT_JULIA_ZOOM = 0.625
+
+INDEX_PLACEHOLDER = "{index}"
+
+# Cells sent to a worker per batch
+CELLS_PER_BATCH = 4
+
+
+class JuliaSet(MandelbrotSet):
+    """Julia set of z^2 + c for a fixed c, iterated from z at each pixel"""
+
+    def __init__(self, size, c_real=-0.8, c_imag=0.156, center_real=0, center_imag=0, zoom=DEFAULT_JULIA_ZOOM,
+                 max_iterations=100, output=None, engine=REFERENCE, coloring=LINEAR, precision=AUTO):
+        super().__init__(size, center_real=center_real, center_imag=center_imag, zoom=zoom,
+                         max_iterations=max_iterations, output=output, engine=engine, coloring=coloring,
+                         precision=precision)
+        self.set_constant(c_real, c_imag)
+
+    def set_constant(self, c_real, c_imag):
+        """Switch to another c, reusing the rest of the view"""
+        self.julia_constant = (c_real, c_imag)
+        # A new c needs its own colouring histogram
+        self.cdf = None
+        self.palette = None
+
+    def render_pixels(self):
+        """Compute and colour the whole image as packed RGB bytes"""
+        # Smooth colouring histograms the rows while generate computes them
+        rows = self.generate()
+        return b"".join(self.color_row(row) for row in rows)
+
+
+def c_grid(columns, rows, real_range, imag_range):
+    """Return (row, column, c_real, c_imag) at the centre of every cell, top row first"""
+    real_min, real_max = real_range
+    imag_min, imag_max = imag_range
+    return [(row, column,
+             real_min + (column + 0.5) * (real_max - real_min) / columns,
+             imag_max - (row + 0.5) * (imag_max - imag_min) / rows)
+            for row in range(rows) for column in range(columns)]
+
+
+def julia_filename(output, index):
+    """Return the output filename for the image of one c"""
+    if INDEX_PLACEHOLDER in output:
+        return output.replace(INDEX_PLACEHOLDER, str(index))
+    root, extension = os.path.splitext(output)
+    return f"{root}_{index}{extension}"
+
+
+# The view each worker process reuses for every c it renders
+_worker_julia = None
+
+
+def _init_worker(julia):
+    global _worker_julia
+    _worker_julia = julia
+
+
+def render_cells(cells):
+    """Render a batch of (c_real, c_imag) cells with the worker's view; runs in a worker process"""
+    julia = _worker_julia
+    images = []
+    for c_real, c_imag in cells:
+        julia.set_constant(c_real, c_imag)
+        images.append(julia.render_pixels())
+    return images
+
+
+def iter_cell_images(julia, cells, workers=None, batch=CELLS_PER_BATCH):
+    """Yield the RGB bytes of every (c_real, c_imag) cell in order, rendered on a worker pool"""
+    batches = [cells[i:i + batch] for i in range(0, len(cells), batch)]
+    if workers == 1:
+        _init_worker(julia)
+        for cell_batch in batches:
+            yield from render_cells(cell_batch)
+        return
+
+    # Workers receive the view once and then only c values
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(julia,)) as executor:
+        for images in executor.map(render_cells, batches):
+            yield from images
+
+
+def render_julia_sweep(julia, columns, rows, real_range, imag_range, output, encoder=None, workers=None,
+                       separate=False, profiler=None):
+    """Render the Julia set of every c on a grid as one contact sheet or one image per c
+
+    Returns the written filenames. Contact sheets in .png or .ppm are
+    streamed one row of cells at a time, so only one row is held in memory.
+    Rendering and encoding each row of cells are timed as separate stages.
+    """
+    encoder = encoder or ImageEncoder()
+    grid = c_grid(columns, rows, real_range, imag_range)
+    images = iter_cell_images(julia, [(c_real, c_imag) for _, _, c_real, c_imag in grid], workers)
+    cell = julia.size
+
+    def render_row(row):
+        with julia.stage(f"render row {row}", profiler):
+            return [next(images) for _ in range(columns)]
+
+    if separate:
+        filenames = []
+        for row in range(rows):
+            cells = render_row(row)
+            with julia.stage(f"encode row {row}", profiler):
+                for pixels in cells:
+                    filename = julia_filename(output, len(filenames))
+                    encoder.save(Image.frombytes('RGB', (cell, cell), pixels), filename)
+                    filenames.append(filename)
+        return filenames
+
+    width = columns * cell
+    boxes = [(column * cell, 0, (column + 1) * cell, cell) for column in range(columns)]
+    if os.path.splitext(output)[1].lower() in ROW_STREAM_EXTENSIONS:
+        with open(output, "wb") as stream:
+            writer = open_row_writer(stream, output, width, rows * cell, encoder.png_compress_level, encoder.threads)
+            for row in range(rows):
+                cells = render_row(row)
+                with julia.stage(f"encode row {row}", profiler):
+                    writer.write_rows(stitch_band(width, boxes, cells))
+            with julia.stage("encode", profiler):
+                writer.close()
+    else:
+        sheet = Image.new('RGB', (width, rows * cell))
+        for row in range(rows):
+            band = stitch_band(width, boxes, render_row(row))
+            sheet.paste(Image.frombytes('RGB', (width, cell), band), (0, row * cell))
+        with julia.stage("encode", profiler):
+            encoder.save(sheet, output)
+    return [output]
@@ -2,12 +2,42 @@
 # ABOUTME: Generates fractal curves and renders them to image files
 
 import math
+from array import array
+import click
 from PIL import Image, ImageDraw
+from algorithm_base import AlgorithmBase
+from antialias import render_antialiased
+from cost_model import (
+    DEFAULT_TILE_SIZE, IN_MEMORY, STREAMING, TILED, ENCODE_SECONDS_PER_PIXEL, INDEXED_SEGMENT_BYTES,
+    INT_POINT_BYTES, canvas_bytes, coverage_canvas_bytes, make_estimate, tile_band_bytes
+)
+from engines import REFERENCE, FAST
+from strategies import draw_paths
 
 
-class KochSnowflake:
-    def __init__(self, size):
-        self.size = size
+# Height of the Koch peak relative to the edge length
+SQRT3_OVER_6 = math.sqrt(3) / 6
+
+# Kernel samples are drawn from a level this deep, which has 3 * 4 ** 6 edges
+SAMPLE_DEPTH = 6
+
+
+class KochSnowflake(AlgorithmBase):
+    line_width = 2
+    
+    # Third-scale copies each primitive splits into, for instanced rendering
+    INSTANCE_BRANCHING = 4
+    
+    # Cost model constants measured on CPython 3.11
+    POINT_BYTES = 112  # Tuple of two floats plus its list slot
+    GENERATE_SECONDS_PER_POINT = 1.5e-6
+    DRAW_SECONDS_PER_SEGMENT = 3e-6
+    
+    def __init__(self, size, recursion_depth=0, output=None, engine=REFERENCE, antialias=0):
+        super().__init__(size, output, engine)
+        self.recursion_depth = recursion_depth
+        # Supersampling factor per axis for anti-aliased lines; 0 or 1 draws aliased lines
+        self.antialias = antialias
         
     def get_initial_triangle(self):
         """Generate an equilateral triangle as the base for the Koch snowflake"""
@@ -81,28 +111,123 @@ class KochSnowflake:
     
     def generate_snowflake(self, depth):
         """Generate Koch snowflake points with given recursion depth"""
+        for points in self.iter_levels(depth):
+            pass
+        return points
+    
+    def iter_levels(self, depth):
+        """Yield the snowflake points of every depth from 0 to depth, each built from the last"""
         # Start with initial triangle
         points = self.get_initial_triangle()
+        yield points
         
         # Apply Koch transformation for each depth level
+        next_level = self.next_level_fast if self.engine == FAST else self.next_level
         for _ in range(depth):
-            new_points = []
-            for i in range(len(points)):
-                current_point = points[i]
-                next_point = points[(i + 1) % len(points)]
-                
-                # Apply Koch transformation to this edge
-                transformed = self.apply_koch_transformation(current_point, next_point)
-                
-                # Add all but the last point (to avoid duplication when connecting segments)
-                new_points.extend(transformed[:-1])
+            points = next_level(points)
+            yield points
+    
+    def next_level(self, points):
+        """Apply the Koch transformation to every edge of a closed curve"""
+        new_points = []
+        for i in range(len(points)):
+            current_point = points[i]
+            next_point = points[(i + 1) % len(points)]
             
-            points = new_points
+            # Apply Koch transformation to this edge
+            transformed = self.apply_koch_transformation(current_point, next_point)
             
-        return points
+            # Add all but the last point (to avoid duplication when connecting segments)
+            new_points.extend(transformed[:-1])
+        
+        return new_points
     
-    def save_image(self, points, filename):
-        """Save the snowflake points as an image"""
+    def apply_koch_transformation_fast(self, p1, p2):
+        """Apply the Koch transformation, finding the peak by a fixed rotation of the edge"""
+        x1, y1 = p1
+        x2, y2 = p2
+        dx = x2 - x1
+        dy = y2 - y1
+        return [
+            p1,
+            (x1 + dx / 3, y1 + dy / 3),
+            ((x1 + x2) / 2 + dy * SQRT3_OVER_6, (y1 + y2) / 2 - dx * SQRT3_OVER_6),
+            (x1 + 2 * dx / 3, y1 + 2 * dy / 3),
+            p2,
+        ]
+    
+    def next_level_fast(self, points):
+        """Same as next_level with apply_koch_transformation_fast inlined"""
+        new_points = []
+        append = new_points.append
+        previous = points[0]
+        for point in points[1:] + points[:1]:
+            x1, y1 = previous
+            x2, y2 = point
+            dx = x2 - x1
+            dy = y2 - y1
+            append(previous)
+            append((x1 + dx / 3, y1 + dy / 3))
+            append(((x1 + x2) / 2 + dy * SQRT3_OVER_6, (y1 + y2) / 2 - dx * SQRT3_OVER_6))
+            append((x1 + 2 * dx / 3, y1 + 2 * dy / 3))
+            previous = point
+        return new_points
+    
+    def iter_snowflake(self, depth):
+        """Yield the snowflake points of generate_snowflake lazily, edge by edge"""
+        triangle = self.get_initial_triangle()
+        for i in range(len(triangle)):
+            yield from self._iter_koch_edge(triangle[i], triangle[(i + 1) % len(triangle)], depth)
+    
+    def _iter_koch_edge(self, p1, p2, depth):
+        """Yield the points of one Koch curve edge, excluding its end point"""
+        if depth == 0:
+            yield p1
+            return
+        
+        if self.engine == FAST:
+            transformed = self.apply_koch_transformation_fast(p1, p2)
+        else:
+            transformed = self.apply_koch_transformation(p1, p2)
+        for i in range(len(transformed) - 1):
+            yield from self._iter_koch_edge(transformed[i], transformed[i + 1], depth - 1)
+    
+    def iter_paths(self):
+        """Yield (points, closed) polylines for streaming vector output"""
+        yield self.iter_snowflake(self.recursion_depth), True
+    
+    def instance_primitives(self):
+        """Return the top-level primitives instanced rendering subdivides: the triangle's edges"""
+        triangle = self.get_initial_triangle()
+        return [(triangle[i], triangle[(i + 1) % len(triangle)]) for i in range(len(triangle))]
+    
+    def split_primitive(self, edge):
+        """Split an edge one level into the four third-scale edges of its Koch curve"""
+        if self.engine == FAST:
+            transformed = self.apply_koch_transformation_fast(*edge)
+        else:
+            transformed = self.apply_koch_transformation(*edge)
+        return [(transformed[i], transformed[i + 1]) for i in range(len(transformed) - 1)]
+    
+    def instance_key(self, edge):
+        """Return (shape key, anchor) of a primitive; equal keys at one level are translated copies"""
+        (x1, y1), (x2, y2) = edge
+        # Edges only ever point in multiples of 60 degrees
+        return round(math.atan2(y2 - y1, x2 - x1) / (math.pi / 3)) % 6, (x1, y1)
+    
+    def primitive_paths(self, edge, depth):
+        """Yield the (points, closed) polyline of an edge's Koch curve of the given depth"""
+        yield list(self._iter_koch_edge(edge[0], edge[1], depth)) + [edge[1]], False
+    
+    def generate(self):
+        """Generate snowflake points at the configured recursion depth"""
+        return self.generate_snowflake(self.recursion_depth)
+    
+    def render_image(self, points):
+        """Rasterize the snowflake points into an image"""
+        if self.antialias > 1:
+            return render_antialiased([(points, True)], self.size, self.line_width, self.antialias)
+        
         # Create a white image
         image = Image.new('RGB', (self.size, self.size), 'white')
         draw = ImageDraw.Draw(image)
@@ -116,7 +241,64 @@ class KochSnowflake:
             for i in range(len(int_points)):
                 start_point = int_points[i]
                 end_point = int_points[(i + 1) % len(int_points)]
-                draw.line([start_point, end_point], fill='black', width=2)
+                draw.line([start_point, end_point], fill='black', width=self.line_width)
         
-        # Save the image
-        image.save(filename)
\ No newline at end of file
+        return image
+    
+    def render_image_streaming(self):
+        """Draw the snowflake as it is generated, without holding it in memory"""
+        if self.antialias > 1:
+            return render_antialiased(self.iter_paths(), self.size, self.line_width, self.antialias)
+        image = Image.new('RGB', (self.size, self.size), 'white')
+        draw_paths(ImageDraw.Draw(image), self.iter_paths(), self.line_width)
+        return image
+    
+    def estimate_cost(self, tile_size=DEFAULT_TILE_SIZE, workers=1):
+        """Predict point count, peak memory per strategy and runtime"""
+        points = 3 * 4 ** self.recursion_depth
+        canvas = canvas_bytes(self.size, self.size)
+        if self.antialias > 1:
+            canvas += coverage_canvas_bytes(self.size, self.antialias)
+        seconds = (points * (self.GENERATE_SECONDS_PER_POINT + self.DRAW_SECONDS_PER_SEGMENT)
+                   + self.size * self.size * ENCODE_SECONDS_PER_PIXEL)
+        return make_estimate(points, "points", {
+            # The previous level's points are alive while the next is built,
+            # then rasterizing copies every point to integers
+            IN_MEMORY: points * (self.POINT_BYTES * 1.25 + INT_POINT_BYTES) + canvas,
+            STREAMING: canvas,
+            TILED: points * INDEXED_SEGMENT_BYTES + tile_band_bytes(self.size, min(tile_size, self.size), workers),
+        }, seconds)
+    
+    def sample_kernel_inputs(self, count):
+        """Pick about count edges spread over a shallow level of the curve"""
+        points = self.generate_snowflake(min(self.recursion_depth, SAMPLE_DEPTH))
+        edges = list(zip(points, points[1:] + points[:1]))
+        return edges[::max(len(edges) // count, 1)][:count]
+    
+    def run_kernel(self, engine, edges):
+        """Transform sampled edges with one engine and return the flattened coordinates"""
+        transform = self.apply_koch_transformation_fast if engine == FAST else self.apply_koch_transformation
+        return [value for p1, p2 in edges for point in transform(p1, p2) for value in point]
+    
+    def as_array(self, points):
+        """Flatten the points into an (array.array, shape) pair of x, y coordinates"""
+        values = array('d')
+        for x, y in points:
+            values.append(x)
+            values.append(y)
+        return values, (len(points), 2)
+    
+    def save_image(self, points, filename):
+        """Save the snowflake points as an image"""
+        self.render_image(points).save(filename)
+    
+    @classmethod
+    def add_cli_options(cls, command):
+        """Add the recursion depth option to a click command"""
+        return click.option('--recursion-depth', type=int, required=True, help='Recursion depth for fractal generation')(command)
+    
+    @classmethod
+    def create_from_args(cls, **kwargs):
+        """Create a snowflake from parsed CLI arguments"""
+        return cls(size=kwargs['size'], recursion_depth=kwargs['recursion_depth'], output=kwargs.get('output'),
+                   engine=kwargs.get('engine', REFERENCE), antialias=kwargs.get('antialias', 0))
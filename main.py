@@ -1,11 +1,32 @@
 # ABOUTME: Main CLI interface for generative computer art algorithms
 # ABOUTME: Handles command line argument parsing and coordinates art generation
 
+import os
+import time
 import click
 from koch_snowflake import KochSnowflake
 from sierpinski_gasket import SierpinskiGasket
 from sierpinski_arrowhead import SierpinskiArrowhead
 from mandelbrot_set import MandelbrotSet
+from encoders import ImageEncoder, JPEG_SUBSAMPLING, STDOUT_OUTPUT
+from profiling import StageProfiler
+from cost_model import (
+    DEFAULT_TILE_SIZE, IN_MEMORY, STRATEGIES, STREAMING, TILED, MemoryBudgetError, choose_strategy, format_estimate,
+    parse_memory_size
+)
+from strategies import allowed_strategies, render_with_strategy
+from sweep import render_sweep
+from progressive import render_progressive
+from instancing import render_instanced
+from anytime import anytime_parameter, render_anytime
+from julia import DEFAULT_JULIA_ZOOM, JuliaSet, render_julia_sweep
+from coloring import COLORINGS, LINEAR, SMOOTH
+from distributed import ProtocolError, render_distributed, run_worker
+from pipeline import render_pipelined
+from engines import ENGINES, FAST, REFERENCE, format_verification, verify_engine
+from tiled import TILED_EXTENSIONS
+from vector_output import is_vector_output, save_vector
+from precision import AUTO, PRECISIONS
 
 
 @click.group(invoke_without_command=True)
@@ -19,54 +40,339 @@ def main(ctx):
     - sierpinski-arrowhead: Generate Sierpinski arrowhead fractal using --recursion-depth
     - mandelbrot-set: Generate Mandelbrot set fractal using --num-iterations
     
+    Use `serve` to run a resident render server exposing every algorithm as a tool.
+    
     Use --help with any subcommand to see algorithm-specific options.
     """
     if ctx.invoked_subcommand is None:
         click.echo(ctx.get_help())
 
 
+class MemorySize(click.ParamType):
+    """Click parameter type for sizes such as 512M or 2G"""
+    name = "size"
+
+    def convert(self, value, param, ctx):
+        try:
+            return parse_memory_size(value)
+        except ValueError as error:
+            self.fail(str(error), param, ctx)
+
+
+def common_options(command):
+    """Add the options shared by every algorithm subcommand"""
+    command = click.option('--profile', type=click.Choice(['text', 'json']), default=None,
+                           help='Report wall time, CPU time, Python heap peak and peak RSS per pipeline stage')(command)
+    command = click.option('--deadline', type=click.FloatRange(min=0, min_open=True), default=None,
+                           metavar='SECONDS',
+                           help='Deepen the recursion depth or iteration limit level by level, up to the one '
+                                'given, and keep the deepest result that fits in this many seconds')(command)
+    command = click.option('--encode-threads', type=int, default=1,
+                           help='Threads used to deflate PNG output in parallel strips')(command)
+    command = click.option('--jpeg-subsampling', type=click.Choice(list(JPEG_SUBSAMPLING)), default=None,
+                           help='JPEG chroma subsampling')(command)
+    command = click.option('--jpeg-quality', type=click.IntRange(1, 100), default=None,
+                           help='JPEG quality (1-100)')(command)
+    command = click.option('--png-compress-level', type=click.IntRange(0, 9), default=None,
+                           help='PNG zlib compression level (0 = fastest, 9 = smallest)')(command)
+    command = click.option('--pipeline', is_flag=True,
+                           help='Overlap generation, rasterization/colouring and encoding on separate '
+                                'threads and processes')(command)
+    command = click.option('--verify', is_flag=True,
+                           help='Compare the fast engine (or --engine) with the reference engine on sampled '
+                                'pixels or segments, report divergence and speedup, and exit')(command)
+    command = click.option('--engine', type=click.Choice(ENGINES), default=REFERENCE,
+                           help='Compute engine; reference is the original implementation')(command)
+    command = click.option('--distribute', metavar='ADDRESS', default=None,
+                           help='Coordinate a tiled .png/.ppm render across workers connecting to host:port '
+                                'or unix:/path')(command)
+    command = click.option('--tile-size', type=int, default=None,
+                           help='Render .png/.ppm output in tiles of this many pixels to bound memory')(command)
+    command = click.option('--estimate', is_flag=True,
+                           help='Print the predicted size, memory and runtime and exit without rendering')(command)
+    command = click.option('--memory-budget', type=MemorySize(), default=None,
+                           help='Peak memory allowed (e.g. 512M, 2G); picks in-memory, streaming or tiled '
+                                'execution to fit')(command)
+    command = click.option('--output', required=True,
+                           help='Output filename; .ppm/.pgm/.raw write raw pixels, .npy the generated data '
+                                'and - packed RGB to stdout')(command)
+    command = click.option('--size', type=int, required=True, help='Width and height of output image')(command)
+    return command
+
+
+def line_options(command):
+    """Add the options shared by the line fractal subcommands"""
+    command = click.option('--workers', type=int, default=None,
+                           help='Worker processes for tiled rendering (defaults to CPU count)')(command)
+    command = click.option('--antialias', type=click.IntRange(0, 16), default=0, metavar='FACTOR',
+                           help='Anti-alias lines by supersampling FACTOR times per axis (e.g. 4); '
+                                '0 draws aliased lines')(command)
+    command = click.option('--instanced', is_flag=True,
+                           help='Rasterize each repeated sub-pattern once and paste copies of it; much faster at '
+                                'high depths, lines may move by a pixel')(command)
+    command = click.option('--sweep', is_flag=True,
+                           help='Save every depth from 0 to --recursion-depth in one run; {depth} in --output '
+                                'is replaced by the depth')(command)
+    command = click.option('--vector-precision', type=click.IntRange(min=0), default=2,
+                           help='Decimal places kept in .svg/.pdf path coordinates')(command)
+    return command
+
+
+def mandelbrot_options(command):
+    """Add the rendering options of the escape-time subcommands"""
+    command = click.option('--progressive', is_flag=True,
+                           help='Save a coarse preview first and refine it every 8th, 4th, 2nd and then every '
+                                'pixel')(command)
+    return command
+
+
+def run_algorithm(algorithm_class, options):
+    """Create an algorithm from CLI options and render it to the output file"""
+    # A deadline covers setup and strategy selection as well as the render
+    start = time.perf_counter()
+    profile = options.pop('profile')
+    memory_budget = options.pop('memory_budget')
+    estimate_only = options.pop('estimate')
+    verify = options.pop('verify')
+    pipelined = options.pop('pipeline')
+    vector_precision = options.pop('vector_precision', None)
+    tile_size = options.pop('tile_size')
+    distribute = options.pop('distribute')
+    workers = options.pop('workers', None)
+    sweep = options.pop('sweep', False)
+    progressive = options.pop('progressive', False)
+    instanced = options.pop('instanced', False)
+    deadline = options.pop('deadline')
+    encoder = ImageEncoder(
+        png_compress_level=options.pop('png_compress_level'),
+        jpeg_quality=options.pop('jpeg_quality'),
+        jpeg_subsampling=options.pop('jpeg_subsampling'),
+        threads=options.pop('encode_threads'),
+    )
+    try:
+        algorithm = algorithm_class.create_from_args(**options)
+    except ValueError as error:
+        raise click.UsageError(str(error))
+    output = options['output']
+
+    if verify:
+        if options.get('coloring') == SMOOTH:
+            raise click.UsageError("--verify compares engines, but smooth colouring only has the reference engine")
+        engine = algorithm.engine if algorithm.engine != REFERENCE else FAST
+        click.echo(format_verification(verify_engine(algorithm, engine)))
+        return
+
+    if sweep and (output == STDOUT_OUTPUT or tile_size or distribute or is_vector_output(output)):
+        raise click.UsageError("--sweep writes one in-memory raster image file per depth")
+    if options.get('antialias', 0) > 1 and (tile_size or distribute or pipelined):
+        raise click.UsageError("--antialias draws on a single supersampled canvas and cannot be tiled or pipelined")
+    if pipelined and (output == STDOUT_OUTPUT or tile_size or distribute or sweep or is_vector_output(output)
+                      or encoder.wants_data(output)):
+        raise click.UsageError("--pipeline renders a single raster image file")
+    if progressive and (output == STDOUT_OUTPUT or tile_size or distribute or pipelined or is_vector_output(output)
+                        or encoder.wants_data(output)):
+        raise click.UsageError("--progressive refines a single in-memory raster image file")
+
+    if instanced and not hasattr(algorithm, 'instance_primitives'):
+        raise click.UsageError("--instanced is only supported for koch-snowflake and sierpinski-gasket")
+    if instanced and (tile_size or distribute or pipelined or sweep or is_vector_output(output)
+                      or encoder.wants_data(output) or options.get('antialias', 0) > 1):
+        raise click.UsageError("--instanced renders a single aliased raster image")
+
+    if deadline and (output == STDOUT_OUTPUT or tile_size or distribute or pipelined or sweep or progressive
+                     or instanced or is_vector_output(output) or encoder.wants_data(output)):
+        raise click.UsageError("--deadline deepens a single in-memory raster image file")
+
+    profiler = StageProfiler() if profile else None
+    if is_vector_output(output):
+        if not hasattr(algorithm, 'iter_paths'):
+            raise click.UsageError("Vector output is only supported for line fractals")
+        if tile_size or distribute:
+            raise click.UsageError("Vector output streams geometry to a single file and cannot be tiled or distributed")
+        if select_strategy(algorithm, output, memory_budget, None, workers, estimate_only, [STREAMING]) is None:
+            return
+        # Geometry is streamed straight to the file, so generation and encoding are one stage
+        with algorithm.stage("vectorize", profiler):
+            save_vector(algorithm, output, precision=vector_precision)
+    elif distribute:
+        tile_size = tile_size or DEFAULT_TILE_SIZE
+        if select_strategy(algorithm, output, memory_budget, tile_size, 1, estimate_only) is None:
+            return
+        # Tiles are generated and rasterized by the workers while bands are encoded here
+        with algorithm.stage("distribute", profiler):
+            render_distributed(algorithm, output, distribute, tile_size=tile_size,
+                               compress_level=encoder.png_compress_level, encode_threads=encoder.threads,
+                               on_listen=lambda address: click.echo(f"Coordinating on {address}", err=True))
+    elif pipelined:
+        # Memory is bounded like streaming: one canvas, or none for row-encoded Mandelbrot output
+        if select_strategy(algorithm, output, memory_budget, None, workers, estimate_only, [STREAMING]) is None:
+            return
+        render_pipelined(algorithm, output, profiler=profiler, encoder=encoder, workers=workers)
+    elif progressive:
+        if select_strategy(algorithm, output, memory_budget, None, workers, estimate_only, [IN_MEMORY]) is None:
+            return
+        render_progressive(algorithm, output, profiler=profiler, encoder=encoder,
+                           on_pass=lambda step, image, seconds: click.echo(
+                               f"Saved step {step} after {seconds:.2f}s"))
+    elif instanced:
+        # Holds one canvas plus the sub-pattern masks, which are much smaller
+        if select_strategy(algorithm, output, memory_budget, None, workers, estimate_only, [STREAMING]) is None:
+            return
+        render_instanced(algorithm, output, profiler=profiler, encoder=encoder)
+    elif deadline:
+        if select_strategy(algorithm, output, memory_budget, None, workers, estimate_only, [IN_MEMORY]) is None:
+            return
+        parameter = anytime_parameter(algorithm)
+        limit = getattr(algorithm, parameter)
+        _, reached = render_anytime(algorithm, deadline, output, profiler=profiler, encoder=encoder, start=start)
+        click.echo(f"Reached {parameter.replace('_', ' ')} {reached} of {limit} "
+                   f"in {time.perf_counter() - start:.2f}s")
+    elif sweep:
+        if select_strategy(algorithm, output, memory_budget, None, workers, estimate_only, [IN_MEMORY]) is None:
+            return
+        render_sweep(algorithm, output, profiler=profiler, encoder=encoder)
+    else:
+        strategy = select_strategy(algorithm, output, memory_budget, tile_size, workers, estimate_only)
+        if strategy is None:
+            return
+        render_with_strategy(algorithm, strategy, output, profiler=profiler, encoder=encoder,
+                             tile_size=tile_size or DEFAULT_TILE_SIZE, workers=workers)
+
+    if profiler:
+        # Keep stdout clean when the image itself is written there
+        click.echo(profiler.format(profile), err=output == STDOUT_OUTPUT)
+
+
+def select_strategy(algorithm, output, memory_budget, tile_size, workers, estimate_only, allowed=None):
+    """Pick an execution strategy from the cost model, or None when only estimating"""
+    allowed = allowed or allowed_strategies(algorithm, output)
+    if tile_size:
+        if TILED not in allowed:
+            raise click.UsageError(f"Tiled rendering writes {', '.join(TILED_EXTENSIONS)} files")
+        allowed = [TILED]
+
+    if memory_budget is None and not estimate_only:
+        # Without a budget the fastest allowed strategy wins, so skip sampling the cost model
+        return next(strategy for strategy in STRATEGIES if strategy in allowed)
+
+    estimate = algorithm.estimate_cost(tile_size=tile_size or DEFAULT_TILE_SIZE, workers=workers or os.cpu_count())
+    try:
+        strategy = choose_strategy(estimate, memory_budget, allowed)
+    except MemoryBudgetError as error:
+        raise click.ClickException(str(error))
+
+    if estimate_only:
+        click.echo(f"Estimate: {format_estimate(estimate)}")
+        click.echo(f"Strategy: {strategy}")
+        return None
+    return strategy
+
+
 @main.command("koch-snowflake")
-@click.option('--recursion-depth', type=int, required=True, help='Recursion depth for fractal generation')
-@click.option('--size', type=int, required=True, help='Width and height of output image')
-@click.option('--output', required=True, help='Output filename')
-def koch_snowflake(recursion_depth, size, output):
+@KochSnowflake.add_cli_options
+@line_options
+@common_options
+def koch_snowflake(**options):
     """Generate Koch snowflake fractal."""
-    koch = KochSnowflake(size=size)
-    points = koch.generate_snowflake(depth=recursion_depth)
-    koch.save_image(points, output)
+    run_algorithm(KochSnowflake, options)
 
 
 @main.command("sierpinski-gasket")
-@click.option('--recursion-depth', type=int, required=True, help='Recursion depth for fractal generation')
-@click.option('--size', type=int, required=True, help='Width and height of output image')
-@click.option('--output', required=True, help='Output filename')
-def sierpinski_gasket(recursion_depth, size, output):
+@SierpinskiGasket.add_cli_options
+@line_options
+@common_options
+def sierpinski_gasket(**options):
     """Generate Sierpinski gasket fractal."""
-    gasket = SierpinskiGasket(size=size)
-    triangles = gasket.generate_gasket(depth=recursion_depth)
-    gasket.save_image(triangles, output)
+    run_algorithm(SierpinskiGasket, options)
 
 
 @main.command("sierpinski-arrowhead")
-@click.option('--recursion-depth', type=int, required=True, help='Recursion depth for fractal generation')
-@click.option('--size', type=int, required=True, help='Width and height of output image')
-@click.option('--output', required=True, help='Output filename')
-def sierpinski_arrowhead(recursion_depth, size, output):
+@SierpinskiArrowhead.add_cli_options
+@line_options
+@common_options
+def sierpinski_arrowhead(**options):
     """Generate Sierpinski arrowhead fractal."""
-    arrowhead = SierpinskiArrowhead(size=size)
-    points = arrowhead.generate_arrowhead(depth=recursion_depth)
-    arrowhead.save_image(points, output)
+    run_algorithm(SierpinskiArrowhead, options)
 
 
 @main.command("mandelbrot-set")
-@click.option('--num-iterations', type=int, required=True, help='Maximum number of iterations for convergence testing')
-@click.option('--size', type=int, required=True, help='Width and height of output image')
-@click.option('--output', required=True, help='Output filename')
-def mandelbrot_set(num_iterations, size, output):
+@MandelbrotSet.add_cli_options
+@mandelbrot_options
+@common_options
+def mandelbrot_set(**options):
     """Generate Mandelbrot set fractal."""
-    mandelbrot = MandelbrotSet(size=size, max_iterations=num_iterations)
-    mandelbrot_data = mandelbrot.generate_mandelbrot_set()
-    mandelbrot.save_image(mandelbrot_data, output)
+    run_algorithm(MandelbrotSet, options)
+
+
+@main.command("serve")
+@click.option('--transport', type=click.Choice(['stdio', 'sse', 'streamable-http']), default='stdio', help='MCP transport to serve on')
+@click.option('--workers', type=int, default=None, help='Number of render worker processes (defaults to CPU count)')
+@click.option('--cache-size', type=int, default=64, help='Number of recent results kept in memory')
+@click.option('--memory-budget', type=MemorySize(), default='1G', show_default=True,
+              help='Reject renders whose predicted peak memory exceeds this (e.g. 512M, 2G)')
+def serve(transport, workers, cache_size, memory_budget):
+    """Run a resident render server exposing each algorithm as a tool."""
+    # Imported here so the one-shot commands do not pay for loading the server stack
+    from render_server import RenderService, create_server
+
+    service = RenderService(max_workers=workers, cache_size=cache_size, memory_budget=memory_budget)
+    try:
+        create_server(service).run(transport=transport)
+    finally:
+        service.shutdown()
+
+
+@main.command("julia-sweep")
+@click.option('--num-iterations', type=int, required=True, help='Maximum number of iterations for convergence testing')
+@click.option('--size', type=int, required=True, help='Width and height of each Julia set image')
+@click.option('--output', required=True,
+              help='Contact sheet filename, or with --separate a pattern where {index} is replaced by the cell number')
+@click.option('--columns', type=int, default=8, show_default=True, help='c values across the real range')
+@click.option('--rows', type=int, default=8, show_default=True, help='c values across the imaginary range')
+@click.option('--real-range', type=float, nargs=2, default=(-1.5, 0.5), show_default=True, metavar='MIN MAX',
+              help='Real parts of c covered by the grid')
+@click.option('--imag-range', type=float, nargs=2, default=(-1.0, 1.0), show_default=True, metavar='MIN MAX',
+              help='Imaginary parts of c covered by the grid')
+@click.option('--zoom', type=float, default=DEFAULT_JULIA_ZOOM, show_default=True, help='Zoom of every Julia set view')
+@click.option('--coloring', type=click.Choice(COLORINGS), default=LINEAR, show_default=True,
+              help='Colour iteration counts linearly, or smoothly with histogram equalization per image')
+@click.option('--engine', type=click.Choice(ENGINES), default=REFERENCE,
+              help='Compute engine; reference is the original implementation')
+@click.option('--precision', type=click.Choice([AUTO] + PRECISIONS), default=AUTO, show_default=True,
+              help='Arithmetic precision of the numpy engine; auto means float64 for most renders')
+@click.option('--workers', type=int, default=None, help='Worker processes (defaults to CPU count)')
+@click.option('--separate', is_flag=True, help='Write one image per c instead of a contact sheet')
+@click.option('--png-compress-level', type=click.IntRange(0, 9), default=None,
+              help='PNG zlib compression level (0 = fastest, 9 = smallest)')
+@click.option('--profile', type=click.Choice(['text', 'json']), default=None,
+              help='Report wall time, CPU time, Python heap peak and peak RSS per pipeline stage')
+def julia_sweep(num_iterations, size, output, columns, rows, real_range, imag_range, zoom, coloring, engine, precision,
+                workers, separate, png_compress_level, profile):
+    """Render Julia sets for a grid of c values as a contact sheet."""
+    try:
+        julia = JuliaSet(size, zoom=zoom, max_iterations=num_iterations, engine=engine, coloring=coloring,
+                         precision=precision)
+    except ValueError as error:
+        raise click.UsageError(str(error))
+    profiler = StageProfiler() if profile else None
+    filenames = render_julia_sweep(julia, columns, rows, real_range, imag_range, output,
+                                   encoder=ImageEncoder(png_compress_level=png_compress_level), workers=workers,
+                                   separate=separate, profiler=profiler)
+    click.echo(f"Rendered {columns * rows} Julia sets to {len(filenames)} file{'s' if len(filenames) != 1 else ''}")
+    if profiler:
+        click.echo(profiler.format(profile))
+
+
+@main.command("worker")
+@click.argument('address')
+@click.option('--connect-timeout', type=float, default=30.0, help='Seconds to keep retrying the coordinator')
+def worker(address, connect_timeout):
+    """Render tiles for a coordinator started with --distribute."""
+    try:
+        rendered = run_worker(address, connect_timeout=connect_timeout)
+    except ProtocolError as error:
+        raise click.ClickException(str(error))
+    click.echo(f"Rendered {rendered} tiles")
 
 
 if __name__ == "__main__":
@@ -1,17 +1,60 @@
 # ABOUTME: Implementation of the Mandelbrot set fractal algorithm
 # ABOUTME: Generates Mandelbrot set visualizations through complex number iteration
 
+import copy
+import itertools
 import math
+from array import array
+import click
 from PIL import Image, ImageDraw
+from algorithm_base import AlgorithmBase
+from cost_model import (
+    DEFAULT_TILE_SIZE, IN_MEMORY, STREAMING, TILED, ENCODE_SECONDS_PER_PIXEL, canvas_bytes, make_estimate
+)
+from coloring import (
+    LINEAR, SMOOTH, COLORINGS, HISTOGRAM_SAMPLE_PIXELS, EqualizedPalette, Histogram, check_coloring, smooth_iteration
+)
+from encoders import ImageEncoder, open_row_writer
+from engines import REFERENCE, FAST, NUMPY
+from precision import AUTO, FLOAT64, PRECISIONS, check_precision, escape_counts, numpy, numpy_dtype, select_precision
 
 
-class MandelbrotSet:
-    def __init__(self, size, center_real=-0.5, center_imag=0, zoom=1.0, max_iterations=100):
-        self.size = size
+class MandelbrotSet(AlgorithmBase):
+    # Cost model constants measured on CPython 3.11
+    PIXEL_BYTES = 9  # List slot plus share of the row list
+    LARGE_INT_BYTES = 28
+    FLOAT_BYTES = 24
+    SECONDS_PER_ITERATION = 2.5e-7
+    COLOR_SECONDS_PER_PIXEL = 1.5e-6
+    # Samples stop at this many iterations and are assumed to be in the set if they reach it
+    ESTIMATE_ITERATION_CAP = 1000
+    
+    KERNEL_UNIT = "iterations"
+    
+    SUPPORTED_ENGINES = [REFERENCE, FAST, NUMPY]
+    
+    # Fixed c of a Julia set; None iterates from z = 0 with c at the pixel
+    julia_constant = None
+    
+    def __init__(self, size, center_real=-0.5, center_imag=0, zoom=1.0, max_iterations=100, output=None,
+                 engine=REFERENCE, coloring=LINEAR, precision=AUTO):
+        super().__init__(size, output, engine)
+        if engine == NUMPY and numpy is None:
+            raise ValueError("The numpy engine needs numpy installed")
+        # Python floats are doubles, so only the numpy engine can change precision
+        if engine != NUMPY and check_precision(precision) not in (AUTO, FLOAT64):
+            raise ValueError(f"{precision} precision needs the numpy engine")
+        if engine != REFERENCE and coloring == SMOOTH:
+            raise ValueError(f"Smooth colouring only has the {REFERENCE} engine, not {engine}")
+        self.precision = precision
         self.center_real = center_real
         self.center_imag = center_imag
         self.zoom = zoom
         self.max_iterations = max_iterations
+        self.coloring = check_coloring(coloring)
+        # Cumulative histogram and palette used by smooth colouring, set once known
+        self.cdf = None
+        self.palette = None
         
         # Define the complex plane bounds
         self.range = 2.0 / zoom  # Base range is 4 units (-2 to 2), scaled by zoom
@@ -25,9 +68,10 @@ class MandelbrotSet:
     
     def mandelbrot_iteration(self, real, imag):
         """Calculate the number of iterations for a point to diverge"""
-        c_real, c_imag = real, imag
-        z_real, z_imag = 0, 0
-        
+        return self.escape_iteration(0, 0, real, imag)
+    
+    def escape_iteration(self, z_real, z_imag, c_real, c_imag):
+        """Calculate the number of iterations of z^2 + c from a starting z until it diverges"""
         for iteration in range(self.max_iterations):
             # Calculate z^2 + c
             z_real_new = z_real * z_real - z_imag * z_imag + c_real
@@ -41,44 +85,311 @@ class MandelbrotSet:
                 
         return self.max_iterations
     
+    def point_iteration(self, real, imag):
+        """Calculate the escape iteration of the point a pixel maps to"""
+        if self.julia_constant is None:
+            return self.mandelbrot_iteration(real, imag)
+        return self.escape_iteration(real, imag, *self.julia_constant)
+    
+    def compute_row(self, y, left=0, right=None, step=1):
+        """Calculate the iteration counts of one row of pixels, or of every step-th column left to right"""
+        right = self.size if right is None else right
+        if self.coloring == SMOOTH:
+            return self.compute_row_smooth(y, left, right, step)
+        if self.engine == FAST:
+            return self.compute_row_fast(y, left, right, step)
+        if self.engine == NUMPY:
+            return self.compute_row_numpy(y, left, right, step)
+        
+        row = []
+        for x in range(left, right, step):
+            real, imag = self.pixel_to_complex(x, y)
+            iterations = self.point_iteration(real, imag)
+            row.append(iterations)
+        return row
+    
+    def compute_row_fast(self, y, left, right, step=1):
+        """Calculate iteration counts like mandelbrot_iteration with the loop inlined"""
+        max_iterations = self.max_iterations
+        half = self.size / 2
+        plane_range = self.range
+        size = self.size
+        center_real = self.center_real
+        julia = self.julia_constant
+        pixel_imag = self.center_imag - (y - half) * plane_range / size
+        if julia is None:
+            c_imag = pixel_imag
+        else:
+            c_real, c_imag = julia
+        c_imag_squared = c_imag * c_imag
+        
+        row = []
+        for x in range(left, right, step):
+            pixel_real = center_real + (x - half) * plane_range / size
+            
+            if julia is None:
+                c_real = pixel_real
+                # Points in the main cardioid or the period-2 bulb never escape
+                shifted = c_real - 0.25
+                q = shifted * shifted + c_imag_squared
+                if q * (q + shifted) <= 0.25 * c_imag_squared or (c_real + 1) * (c_real + 1) + c_imag_squared <= 0.0625:
+                    row.append(max_iterations)
+                    continue
+                z_real = z_imag = 0.0
+            else:
+                z_real, z_imag = pixel_real, pixel_imag
+            
+            # Same operation order as escape_iteration, reusing the squares
+            z_real_squared = z_real * z_real
+            z_imag_squared = z_imag * z_imag
+            for iteration in range(max_iterations):
+                z_imag = 2 * z_real * z_imag + c_imag
+                z_real = z_real_squared - z_imag_squared + c_real
+                z_real_squared = z_real * z_real
+                z_imag_squared = z_imag * z_imag
+                if z_real_squared + z_imag_squared > 4:
+                    row.append(iteration)
+                    break
+            else:
+                row.append(max_iterations)
+        return row
+    
+    def selected_precision(self):
+        """Return the precision the numpy engine computes in, choosing one for the view when automatic"""
+        if self.precision != AUTO:
+            return self.precision
+        magnitude = max(abs(self.center_real) + self.range, abs(self.center_imag) + self.range, 2.0)
+        return select_precision(self.zoom, self.size, self.max_iterations, magnitude)
+    
+    def compute_row_numpy(self, y, left, right, step=1):
+        """Calculate iteration counts like compute_row with vectorized numpy arithmetic in the selected precision"""
+        dtype = numpy_dtype(self.selected_precision())
+        # Coordinates are mapped in the reference's operation order, in long double when extended
+        mapping = numpy.longdouble if dtype is numpy.longdouble else numpy.float64
+        half = self.size / 2
+        xs = numpy.arange(left, right, step, dtype=mapping)
+        pixel_real = (self.center_real + (xs - half) * mapping(self.range) / self.size).astype(dtype)
+        pixel_imag = numpy.full(len(xs), self.center_imag - (mapping(y) - half) * mapping(self.range) / self.size,
+                                dtype=dtype)
+        
+        if self.julia_constant is None:
+            zeros = numpy.zeros(len(xs), dtype=dtype)
+            return escape_counts(zeros, zeros, pixel_real, pixel_imag, self.max_iterations)
+        c_real, c_imag = self.julia_constant
+        return escape_counts(pixel_real, pixel_imag, numpy.full(len(xs), c_real, dtype=dtype),
+                             numpy.full(len(xs), c_imag, dtype=dtype), self.max_iterations)
+    
+    def compute_row_smooth(self, y, left, right, step=1):
+        """Calculate normalized iteration counts of a row; points in the set get max_iterations"""
+        max_iterations = self.max_iterations
+        half = self.size / 2
+        julia = self.julia_constant
+        pixel_imag = self.center_imag - (y - half) * self.range / self.size
+        
+        row = []
+        for x in range(left, right, step):
+            pixel_real = self.center_real + (x - half) * self.range / self.size
+            if julia is None:
+                z_real = z_imag = 0.0
+                c_real, c_imag = pixel_real, pixel_imag
+            else:
+                z_real, z_imag = pixel_real, pixel_imag
+                c_real, c_imag = julia
+            for iteration in range(max_iterations):
+                z_real, z_imag = z_real * z_real - z_imag * z_imag + c_real, 2 * z_real * z_imag + c_imag
+                magnitude_squared = z_real * z_real + z_imag * z_imag
+                if magnitude_squared > 4:
+                    row.append(smooth_iteration(iteration, magnitude_squared))
+                    break
+            else:
+                row.append(float(max_iterations))
+        return row
+    
     def generate_mandelbrot_set(self):
         """Generate the Mandelbrot set data as a 2D matrix"""
         mandelbrot_data = []
+        # Smooth colouring histograms the rows as they are computed
+        histogram = Histogram(self.max_iterations) if self.coloring == SMOOTH else None
         
         for y in range(self.size):
-            row = []
-            for x in range(self.size):
-                real, imag = self.pixel_to_complex(x, y)
-                iterations = self.mandelbrot_iteration(real, imag)
-                row.append(iterations)
+            row = self.compute_row(y)
+            if histogram is not None:
+                histogram.add_row(row)
             mandelbrot_data.append(row)
-            
+        
+        if histogram is not None:
+            self.set_equalization(histogram.cdf())
         return mandelbrot_data
     
-    def save_image(self, mandelbrot_data, filename):
-        """Save the Mandelbrot set as an image"""
-        # Create a new image
-        image = Image.new('RGB', (self.size, self.size), 'white')
-        draw = ImageDraw.Draw(image)
+    def generate(self):
+        """Generate the iteration count matrix"""
+        return self.generate_mandelbrot_set()
+    
+    def iteration_color(self, iterations):
+        """Map an iteration count to an RGB colour"""
+        if iterations == self.max_iterations:
+            # Points in the set are black
+            return (0, 0, 0)
         
-        # Color the pixels based on iteration count
-        for y in range(self.size):
-            for x in range(self.size):
-                iterations = mandelbrot_data[y][x]
-                
-                if iterations == self.max_iterations:
-                    # Points in the set are black
-                    color = (0, 0, 0)
-                else:
-                    # Points outside the set are colored based on iteration count
-                    # Create a gradient from blue to red
-                    ratio = iterations / self.max_iterations
-                    red = int(255 * ratio)
-                    blue = int(255 * (1 - ratio))
-                    green = int(128 * ratio)
-                    color = (red, green, blue)
-                
-                image.putpixel((x, y), color)
+        # Points outside the set are colored based on iteration count
+        return self.gradient_color(iterations / self.max_iterations)
+    
+    @staticmethod
+    def gradient_color(ratio):
+        """Map a position in [0, 1] to an RGB colour on a gradient from blue to red"""
+        red = int(255 * ratio)
+        blue = int(255 * (1 - ratio))
+        green = int(128 * ratio)
+        return (red, green, blue)
+    
+    def set_equalization(self, cdf):
+        """Use a cumulative iteration histogram for smooth colouring"""
+        self.cdf = cdf
+        self.palette = EqualizedPalette(cdf, self.gradient_color)
+    
+    def sample_histogram(self):
+        """Histogram a strided grid of pixels, for renders that colour rows before the last is computed"""
+        stride = max(round(self.size / HISTOGRAM_SAMPLE_PIXELS ** 0.5), 1)
+        histogram = Histogram(self.max_iterations)
+        for y in range(stride // 2, self.size, stride):
+            histogram.add_row(self.compute_row_smooth(y, stride // 2, self.size, stride))
+        return histogram
+    
+    def equalization_cdf(self):
+        """Return the smooth colouring histogram's CDF, estimating it from samples if no render collected one"""
+        if self.cdf is None:
+            self.set_equalization(self.sample_histogram().cdf())
+        return self.cdf
+    
+    def color_row(self, row):
+        """Colour one row of iteration counts as packed RGB bytes"""
+        if self.coloring == SMOOTH:
+            self.equalization_cdf()
+            return self.palette.color_row(row)
         
-        # Save the image
-        image.save(filename)
\ No newline at end of file
+        # Rows repeat the same counts a lot, so colour each distinct count once
+        palette = {}
+        pixels = bytearray()
+        for iterations in row:
+            color = palette.get(iterations)
+            if color is None:
+                color = palette[iterations] = bytes(self.iteration_color(iterations))
+            pixels += color
+        return bytes(pixels)
+    
+    def render_image(self, mandelbrot_data):
+        """Colour the iteration counts into an image"""
+        pixels = b"".join(self.color_row(row) for row in mandelbrot_data)
+        return Image.frombytes('RGB', (self.size, self.size), pixels)
+    
+    def iter_bands(self, band_rows):
+        """Yield (top, packed RGB bytes) bands of rows as they are computed"""
+        for top in range(0, self.size, band_rows):
+            bottom = min(top + band_rows, self.size)
+            yield top, b"".join(self.color_row(self.compute_row(y)) for y in range(top, bottom))
+    
+    def color_tile(self, box):
+        """Compute and colour the pixels of one (left, top, right, bottom) box as packed RGB bytes"""
+        left, top, right, bottom = box
+        return b"".join(self.color_row(self.compute_row(y, left, right)) for y in range(top, bottom))
+    
+    def render_image_streaming(self, band_rows=64):
+        """Colour rows as they are computed, without holding the iteration matrix"""
+        image = Image.new('RGB', (self.size, self.size), 'white')
+        for top, pixels in self.iter_bands(band_rows):
+            band = Image.frombytes('RGB', (self.size, len(pixels) // (3 * self.size)), pixels)
+            image.paste(band, (0, top))
+        return image
+    
+    def render_banded(self, output, band_rows=DEFAULT_TILE_SIZE, encoder=None):
+        """Stream bands of coloured rows into a .png or .ppm file without a full canvas"""
+        encoder = encoder or ImageEncoder()
+        with open(output, "wb") as stream:
+            writer = open_row_writer(stream, output, self.size, self.size,
+                                     encoder.png_compress_level, encoder.threads)
+            for _, pixels in self.iter_bands(band_rows):
+                writer.write_rows(pixels)
+            writer.close()
+    
+    def estimate_mean_iterations(self, samples=16):
+        """Estimate the mean iteration count from a coarse grid of sample pixels"""
+        step = max(self.size / samples, 1)
+        coordinates = sorted({int(i * step) for i in range(samples)} & set(range(self.size)))
+        # Cap the sampled iterations so estimating stays cheap at high limits
+        view = copy.copy(self)
+        view.max_iterations = min(self.max_iterations, self.ESTIMATE_ITERATION_CAP)
+        counts = [view.point_iteration(*self.pixel_to_complex(x, y)) for y in coordinates for x in coordinates]
+        counts = [self.max_iterations if count >= view.max_iterations else count for count in counts]
+        return sum(counts) / len(counts)
+    
+    def estimate_cost(self, tile_size=DEFAULT_TILE_SIZE, workers=1):
+        """Predict pixel count, peak memory per strategy and runtime"""
+        pixels = self.size * self.size
+        # Counts above 256 are not cached small ints and need their own objects
+        if self.coloring == SMOOTH:
+            value_bytes = self.FLOAT_BYTES
+        else:
+            value_bytes = self.LARGE_INT_BYTES if self.max_iterations > 256 else 0
+        data_bytes = pixels * (self.PIXEL_BYTES + value_bytes)
+        canvas = canvas_bytes(self.size, self.size)
+        band = min(tile_size, self.size)
+        seconds = pixels * (self.estimate_mean_iterations() * self.SECONDS_PER_ITERATION
+                            + self.COLOR_SECONDS_PER_PIXEL + ENCODE_SECONDS_PER_PIXEL)
+        return make_estimate(pixels, "pixels", {
+            IN_MEMORY: data_bytes + pixels * 3 + canvas,
+            STREAMING: canvas + self.size * 64 * 3,
+            TILED: 3 * self.size * band * 3,
+        }, seconds)
+    
+    def sample_kernel_inputs(self, count):
+        """Pick the pixels of evenly spaced whole rows, about count in all"""
+        rows = min(max(count // self.size, 1), self.size)
+        coordinates = sorted({int(i * self.size / rows) for i in range(rows)})
+        return [(x, y) for y in coordinates for x in range(self.size)]
+    
+    def run_kernel(self, engine, inputs):
+        """Compute the iteration counts of sampled pixels with one engine, a row per call as renders do"""
+        if self.coloring == SMOOTH and engine != REFERENCE:
+            raise ValueError(f"Smooth colouring only has the {REFERENCE} engine, not {engine}")
+        view = copy.copy(self)
+        view.engine = engine
+        counts = []
+        # Sampled rows are evenly strided, so each is a single vectorizable call
+        for y, pixels in itertools.groupby(inputs, key=lambda pixel: pixel[1]):
+            xs = [x for x, _ in pixels]
+            step = xs[1] - xs[0] if len(xs) > 1 else 1
+            counts.extend(view.compute_row(y, xs[0], xs[-1] + 1, step))
+        return counts
+    
+    def value_typecode(self):
+        """array.array typecode holding this render's per-pixel values"""
+        return 'd' if self.coloring == SMOOTH else 'i'
+    
+    def as_array(self, mandelbrot_data):
+        """Flatten the iteration counts into an (array.array, shape) pair"""
+        values = array(self.value_typecode())
+        for row in mandelbrot_data:
+            values.extend(row)
+        return values, (len(mandelbrot_data), self.size)
+    
+    def save_image(self, mandelbrot_data, filename):
+        """Save the Mandelbrot set as an image"""
+        self.render_image(mandelbrot_data).save(filename)
+    
+    @classmethod
+    def add_cli_options(cls, command):
+        """Add the iteration limit, colouring and precision options to a click command"""
+        command = click.option('--precision', type=click.Choice([AUTO] + PRECISIONS), default=AUTO, show_default=True,
+                               help='Arithmetic precision of the numpy engine; auto keeps the iteration counts, '
+                                    'so it means float64 for most renders, extended for zooms past about 1e13 '
+                                    'and float32 only below about 16 iterations')(command)
+        command = click.option('--coloring', type=click.Choice(COLORINGS), default=LINEAR, show_default=True,
+                               help='Colour iteration counts linearly, or smoothly with histogram equalization')(command)
+        return click.option('--num-iterations', type=int, required=True, help='Maximum number of iterations for convergence testing')(command)
+    
+    @classmethod
+    def create_from_args(cls, **kwargs):
+        """Create a Mandelbrot set from parsed CLI arguments"""
+        return cls(size=kwargs['size'], max_iterations=kwargs['num_iterations'], output=kwargs.get('output'),
+                   engine=kwargs.get('engine', REFERENCE), coloring=kwargs.get('coloring', LINEAR),
+                   precision=kwargs.get('precision', AUTO))
@@ -0,0 +1,232 @@
+# ABOUTME: Pipelined rendering that overlaps generation, rasterization/colouring and encoding
+# ABOUTME: Connects the stages with bounded queues so memory stays flat while every stage keeps busy
+
+import multiprocessing
+import os
+import queue
+import threading
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image, ImageDraw
+
+from encoders import ImageEncoder, ROW_STREAM_EXTENSIONS, open_row_writer
+
+
+# Bands or chunks allowed to wait between two stages
+DEFAULT_QUEUE_SIZE = 4
+
+# Mandelbrot rows computed per band
+DEFAULT_BAND_ROWS = 64
+
+# Segments per chunk sent from the line fractal generator process
+DEFAULT_CHUNK_SEGMENTS = 16384
+
+# How often a blocked stage checks that the stage feeding it is still alive
+POLL_SECONDS = 1.0
+
+_DONE = "done"
+_ERROR = "error"
+_CHUNK = "chunk"
+
+
+class ThreadedSink:
+    """Feeds items to a consumer on a background thread through a bounded queue"""
+
+    def __init__(self, consume, maxsize=DEFAULT_QUEUE_SIZE, poll_seconds=POLL_SECONDS):
+        self.consume = consume
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.error = None
+        self.poll_seconds = poll_seconds
+        self.abandoned = False
+        # The thread putting items; if it dies without closing, the consumer stops waiting
+        self.producer = threading.current_thread()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                item = self.queue.get(timeout=self.poll_seconds)
+            except queue.Empty:
+                if self.producer.is_alive():
+                    continue
+                self.error = RuntimeError("Producer thread exited without closing the sink")
+                return
+            if item is None:
+                return
+            if self.error is None and not self.abandoned:
+                try:
+                    self.consume(item)
+                except BaseException as error:
+                    # Keep draining so the producer never blocks on a dead consumer
+                    self.error = error
+
+    def put(self, item):
+        """Queue an item, blocking while the consumer is behind"""
+        if self.error is not None:
+            raise self.error
+        self.queue.put(item)
+
+    def close(self):
+        """Wait for every queued item to be consumed and re-raise any consumer error"""
+        self.queue.put(None)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def abandon(self):
+        """Stop the consumer without consuming what is still queued, for when the producer fails"""
+        self.abandoned = True
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+
+
+def bounded_map(executor, function, items, in_flight):
+    """Like executor.map, in order, but never more than in_flight items ahead of the consumer"""
+    pending = deque()
+    for item in items:
+        pending.append(executor.submit(function, *item))
+        if len(pending) >= in_flight:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def compute_band(algorithm, top, bottom):
+    """Compute the iteration counts of a band of rows as a flat array; runs in a worker process"""
+    counts = array(algorithm.value_typecode())
+    for y in range(top, bottom):
+        counts.extend(algorithm.compute_row(y))
+    return top, counts
+
+
+def render_raster_pipelined(algorithm, output, encoder, band_rows=DEFAULT_BAND_ROWS, workers=None,
+                            queue_size=DEFAULT_QUEUE_SIZE):
+    """Compute bands on worker processes, colour them here and encode them on a thread"""
+    size = algorithm.size
+    workers = workers or os.cpu_count()
+    bands = [(algorithm, top, min(top + band_rows, size)) for top in range(0, size, band_rows)]
+    row_stream = os.path.splitext(output)[1].lower() in ROW_STREAM_EXTENSIONS
+
+    stream = writer = image = None
+    if row_stream:
+        stream = open(output, "wb")
+        writer = open_row_writer(stream, output, size, size, encoder.png_compress_level, encoder.threads)
+        sink = ThreadedSink(lambda band: writer.write_rows(band[1]), maxsize=queue_size)
+    else:
+        # Formats without a row encoder are assembled on a canvas and encoded at the end
+        image = Image.new('RGB', (size, size))
+        sink = ThreadedSink(lambda band: image.paste(
+            Image.frombytes('RGB', (size, len(band[1]) // (3 * size)), band[1]), (0, band[0])), maxsize=queue_size)
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # Keep every worker busy plus a queue's worth of finished bands
+            for top, counts in bounded_map(executor, compute_band, bands, workers + queue_size):
+                pixels = b"".join(algorithm.color_row(counts[i:i + size]) for i in range(0, len(counts), size))
+                sink.put((top, pixels))
+        sink.close()
+        if writer is not None:
+            writer.close()
+    except BaseException:
+        # A failed band would otherwise leave the consumer and deflate threads running
+        sink.abandon()
+        if writer is not None:
+            writer.abort()
+        raise
+    finally:
+        if stream is not None:
+            stream.close()
+
+    if image is not None:
+        encoder.save(image, output)
+
+
+def generate_segment_chunks(algorithm, chunks, chunk_segments=DEFAULT_CHUNK_SEGMENTS):
+    """Send an algorithm's segments, truncated to pixels, in packed chunks; runs in a child process"""
+    try:
+        chunk = array('i')
+        for points, closed in algorithm.iter_paths():
+            first = previous = None
+            count = 0
+            for x, y in points:
+                point = (int(x), int(y))
+                if previous is not None:
+                    chunk.extend(previous + point)
+                else:
+                    first = point
+                previous = point
+                count += 1
+                if len(chunk) >= 4 * chunk_segments:
+                    chunks.put((_CHUNK, chunk))
+                    chunk = array('i')
+            # Same closing rule as draw_paths
+            if closed and count >= 2:
+                chunk.extend(previous + first)
+        chunks.put((_CHUNK, chunk))
+        chunks.put((_DONE, None))
+    except BaseException as error:
+        chunks.put((_ERROR, repr(error)))
+
+
+def get_from_process(process, items, poll_seconds=POLL_SECONDS):
+    """Take the next item a child process queued, raising if it exits without sending one"""
+    while True:
+        try:
+            return items.get(timeout=poll_seconds)
+        except queue.Empty:
+            if process.is_alive():
+                continue
+        # An item may still be in flight from a child that has just exited
+        try:
+            return items.get(timeout=poll_seconds)
+        except queue.Empty:
+            raise RuntimeError(f"Generator process exited with code {process.exitcode} before finishing")
+
+
+def render_lines_pipelined(algorithm, output, encoder, queue_size=DEFAULT_QUEUE_SIZE,
+                           chunk_segments=DEFAULT_CHUNK_SEGMENTS):
+    """Generate segments in a child process while drawing them here, then encode the canvas
+
+    Any segment may touch any row until generation ends, so line fractals
+    overlap generation with drawing; encoding starts once the canvas is done.
+    """
+    chunks = multiprocessing.Queue(maxsize=queue_size)
+    generator = multiprocessing.Process(target=generate_segment_chunks, args=(algorithm, chunks, chunk_segments),
+                                        daemon=True)
+    generator.start()
+
+    image = Image.new('RGB', (algorithm.size, algorithm.size), 'white')
+    draw = ImageDraw.Draw(image)
+    try:
+        while True:
+            kind, chunk = get_from_process(generator, chunks)
+            if kind == _DONE:
+                break
+            if kind == _ERROR:
+                raise RuntimeError(f"Segment generation failed: {chunk}")
+            for i in range(0, len(chunk), 4):
+                draw.line([(chunk[i], chunk[i + 1]), (chunk[i + 2], chunk[i + 3])],
+                          fill='black', width=algorithm.line_width)
+    finally:
+        generator.join(timeout=1)
+        if generator.is_alive():
+            generator.terminate()
+
+    encoder.save(image, output)
+
+
+def render_pipelined(algorithm, output=None, profiler=None, encoder=None, workers=None):
+    """Render with generation, rasterization and encoding overlapped"""
+    output = output or algorithm.output
+    encoder = encoder or ImageEncoder()
+
+    # The stages overlap, so the whole pipeline is timed as one stage
+    with algorithm.stage("pipeline", profiler):
+        if hasattr(algorithm, "iter_paths"):
+            render_lines_pipelined(algorithm, output, encoder)
+        else:
+            render_raster_pipelined(algorithm, output, encoder, workers=workers)
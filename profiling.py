@@ -0,0 +1,86 @@
+# ABOUTME: Per-stage timing and memory instrumentation for the rendering pipeline
+# ABOUTME: Measures wall time, CPU time, Python heap peak and peak RSS and formats them as text or JSON
+
+import json
+import resource
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+
+@contextmanager
+def measure_stage(name, trace_memory=False):
+    """Measure a block of work, filling in the yielded timing dict on exit"""
+    timing = {"stage": name}
+
+    # The Python heap peak is only available while tracemalloc is tracing;
+    # starting it here would slow every caller down, so it is opt-in. It does
+    # not see buffers allocated outside Python, such as Pillow's images, so the
+    # process peak RSS is recorded as well
+    started_tracing = False
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        started_tracing = True
+    if tracemalloc.is_tracing():
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    try:
+        yield timing
+    finally:
+        timing["wall_seconds"] = time.perf_counter() - wall_start
+        timing["cpu_seconds"] = time.process_time() - cpu_start
+        if tracemalloc.is_tracing():
+            timing["heap_peak_bytes"] = max(tracemalloc.get_traced_memory()[1] - baseline, 0)
+        else:
+            timing["heap_peak_bytes"] = None
+        # ru_maxrss is reported in kilobytes on Linux and is the high-water
+        # mark of the whole process so far, including earlier stages
+        timing["peak_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if started_tracing:
+            tracemalloc.stop()
+
+
+class StageProfiler:
+    """Collects the timings of each pipeline stage of a render"""
+
+    def __init__(self, trace_memory=True):
+        self.trace_memory = trace_memory
+        self.stages = []
+
+    def record(self, timing):
+        """Record a completed stage timing"""
+        self.stages.append(timing)
+
+    def to_dict(self):
+        """Return the collected timings with totals as a plain dict"""
+        return {
+            "stages": list(self.stages),
+            "total_wall_seconds": sum(stage["wall_seconds"] for stage in self.stages),
+            "total_cpu_seconds": sum(stage["cpu_seconds"] for stage in self.stages),
+        }
+
+    def format_json(self):
+        """Format the report as JSON"""
+        return json.dumps(self.to_dict(), indent=2)
+
+    def format_text(self):
+        """Format the report as an aligned human-readable table"""
+        lines = [f"{'stage':<12}{'wall (s)':>12}{'cpu (s)':>12}{'Python heap peak (KiB)':>24}"
+                 f"{'peak RSS (KiB)':>16}"]
+        for stage in self.stages:
+            peak = stage["heap_peak_bytes"]
+            peak_text = f"{peak / 1024:.1f}" if peak is not None else "-"
+            lines.append(f"{stage['stage']:<12}{stage['wall_seconds']:>12.4f}"
+                         f"{stage['cpu_seconds']:>12.4f}{peak_text:>24}{stage['peak_rss_kb']:>16}")
+        report = self.to_dict()
+        lines.append(f"{'total':<12}{report['total_wall_seconds']:>12.4f}{report['total_cpu_seconds']:>12.4f}")
+        return "\n".join(lines)
+
+    def format(self, style):
+        """Format the report in the given style ('text' or 'json')"""
+        if style == "json":
+            return self.format_json()
+        return self.format_text()
@@ -0,0 +1,100 @@
+# ABOUTME: Progressive coarse-to-fine rendering of the Mandelbrot set for quick previews
+# ABOUTME: Samples every 8th pixel first and refines down to full resolution without recomputing any sample
+
+import os
+import time
+from array import array
+
+from PIL import Image
+
+from coloring import SMOOTH, Histogram
+from encoders import ImageEncoder
+
+
+# Sample spacing of each pass; every step divides the one before it and the last is 1
+PROGRESSIVE_STEPS = (8, 4, 2, 1)
+
+
+def check_steps(steps):
+    """Validate a sequence of pass steps"""
+    steps = tuple(steps)
+    if not steps or steps[-1] != 1 or any(step >= previous or previous % step
+                                          for previous, step in zip(steps, steps[1:])):
+        raise ValueError(f"Progressive steps must shrink to 1, each dividing the one before, not {steps}")
+    return steps
+
+
+def new_columns(y, step, previous):
+    """Return the (start, stride) column ranges of row y first sampled by a pass"""
+    if previous is None or y % previous:
+        return [(0, step)]
+    # The row was already sampled every previous-th column; fill in between
+    return [(offset, previous) for offset in range(step, previous, step)]
+
+
+def preview_image(algorithm, rows, step):
+    """Colour the samples of a pass, each filling the step x step block below and right of it"""
+    size = algorithm.size
+    if step == 1:
+        return Image.frombytes('RGB', (size, size), b"".join(algorithm.color_row(row) for row in rows))
+
+    coarse_size = len(range(0, size, step))
+    pixels = b"".join(algorithm.color_row(rows[y][::step]) for y in range(0, size, step))
+    coarse = Image.frombytes('RGB', (coarse_size, coarse_size), pixels)
+    return coarse.resize((coarse_size * step, coarse_size * step), Image.NEAREST).crop((0, 0, size, size))
+
+
+def iter_progressive(algorithm, steps=PROGRESSIVE_STEPS):
+    """Yield (step, image) after each pass; the last image is identical to a normal render"""
+    steps = check_steps(steps)
+    size = algorithm.size
+    typecode = algorithm.value_typecode()
+    rows = [array(typecode, [0]) * size for _ in range(size)]
+    histogram = Histogram(algorithm.max_iterations) if algorithm.coloring == SMOOTH else None
+
+    previous = None
+    for step in steps:
+        for y in range(0, size, step):
+            row = rows[y]
+            for start, stride in new_columns(y, step, previous):
+                values = algorithm.compute_row(y, start, size, stride)
+                row[start::stride] = array(typecode, values)
+                if histogram is not None:
+                    histogram.add_row(values)
+
+        if histogram is not None:
+            # The histogram of every sample so far; after the last pass it is the full image's
+            algorithm.set_equalization(histogram.cdf())
+        yield step, preview_image(algorithm, rows, step)
+        previous = step
+
+
+def save_replacing(encoder, image, output):
+    """Encode an image next to the output and move it into place, so readers never see a partial file"""
+    root, extension = os.path.splitext(output)
+    partial = f"{root}.partial{extension}"
+    encoder.save(image, partial)
+    os.replace(partial, output)
+
+
+def render_progressive(algorithm, output=None, profiler=None, encoder=None, steps=PROGRESSIVE_STEPS,
+                       on_pass=None):
+    """Save a refined image to the output after every pass and return the final image
+
+    on_pass(step, image, seconds) is called once each pass is saved, with the
+    seconds elapsed since the render started.
+    """
+    output = output or algorithm.output
+    encoder = encoder or ImageEncoder()
+    steps = check_steps(steps)
+    start = time.perf_counter()
+
+    passes = iter_progressive(algorithm, steps)
+    for step in steps:
+        with algorithm.stage(f"pass {step}", profiler):
+            _, image = next(passes)
+        with algorithm.stage(f"encode {step}", profiler):
+            save_replacing(encoder, image, output)
+        if on_pass is not None:
+            on_pass(step, image, time.perf_counter() - start)
+    return image
@@ -0,0 +1,149 @@
+# ABOUTME: Long-lived render service exposing each algorithm as an MCP tool
+# ABOUTME: Offloads rendering to a process pool with in-flight deduplication and an LRU result cache
+
+import asyncio
+import io
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from fastmcp import FastMCP
+from fastmcp.utilities.types import Image
+
+from cost_model import IN_MEMORY, choose_strategy
+from koch_snowflake import KochSnowflake
+from sierpinski_gasket import SierpinskiGasket
+from sierpinski_arrowhead import SierpinskiArrowhead
+from mandelbrot_set import MandelbrotSet
+
+
+ALGORITHMS = {
+    "koch-snowflake": KochSnowflake,
+    "sierpinski-gasket": SierpinskiGasket,
+    "sierpinski-arrowhead": SierpinskiArrowhead,
+    "mandelbrot-set": MandelbrotSet,
+}
+
+IMAGE_FORMATS = {"png": "PNG", "jpeg": "JPEG", "jpg": "JPEG"}
+
+# Predicted peak memory allowed for one render in a worker process
+DEFAULT_MEMORY_BUDGET = 1 << 30
+
+
+def render_to_bytes(algorithm_name, params, image_format="png"):
+    """Render an algorithm to encoded image bytes; runs in a worker process"""
+    algorithm = ALGORITHMS[algorithm_name].create_from_args(**params)
+    image = algorithm.render_image(algorithm.generate())
+
+    buffer = io.BytesIO()
+    image.save(buffer, format=IMAGE_FORMATS[image_format])
+    return buffer.getvalue()
+
+
+class RenderService:
+    """Runs renders on a process pool, sharing identical work and caching results"""
+
+    def __init__(self, max_workers=None, cache_size=64, executor=None, memory_budget=DEFAULT_MEMORY_BUDGET):
+        self.executor = executor or ProcessPoolExecutor(max_workers=max_workers)
+        self.cache_size = cache_size
+        self.memory_budget = memory_budget
+        self.cache = OrderedDict()
+        self.in_flight = {}
+        self.stats = {"renders": 0, "cache_hits": 0, "deduplicated": 0, "rejected": 0}
+
+    async def render(self, algorithm_name, params, image_format="png"):
+        """Return encoded image bytes for the given algorithm parameters"""
+        if algorithm_name not in ALGORITHMS:
+            raise ValueError(f"Unknown algorithm: {algorithm_name}")
+        if image_format not in IMAGE_FORMATS:
+            raise ValueError(f"Unsupported image format: {image_format}")
+
+        key = (algorithm_name, tuple(sorted(params.items())), image_format)
+
+        # Recently rendered results are served straight from the cache
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            self.stats["cache_hits"] += 1
+            return self.cache[key]
+
+        # Identical requests already being rendered wait on the same future
+        if key in self.in_flight:
+            self.stats["deduplicated"] += 1
+            return await asyncio.shield(self.in_flight[key])
+
+        self.check_budget(algorithm_name, params)
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.executor, render_to_bytes, algorithm_name, params, image_format)
+        self.in_flight[key] = future
+        self.stats["renders"] += 1
+        future.add_done_callback(lambda done: self._finish(key, done))
+
+        # Shield so one cancelled caller does not cancel the shared render
+        return await asyncio.shield(future)
+
+    def check_budget(self, algorithm_name, params):
+        """Reject a render whose predicted peak memory exceeds the budget, before it reaches a worker"""
+        if self.memory_budget is None:
+            return
+        algorithm = ALGORITHMS[algorithm_name].create_from_args(**params)
+        try:
+            # Workers generate and rasterize in memory, so that is the only strategy that counts
+            choose_strategy(algorithm.estimate_cost(), self.memory_budget, [IN_MEMORY])
+        except ValueError:
+            self.stats["rejected"] += 1
+            raise
+
+    def _finish(self, key, future):
+        """Retire a completed render and cache its result"""
+        self.in_flight.pop(key, None)
+        if future.cancelled() or future.exception() is not None:
+            return
+
+        self.cache[key] = future.result()
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    def shutdown(self):
+        """Stop the worker processes"""
+        self.executor.shutdown(wait=True)
+
+
+def as_image(data, image_format):
+    """Wrap encoded bytes as an MCP image result"""
+    return Image(data=data, format=IMAGE_FORMATS[image_format].lower())
+
+
+def create_server(service=None):
+    """Create an MCP server with one rendering tool per algorithm"""
+    service = service or RenderService()
+    server = FastMCP("algorithmic-art")
+
+    @server.tool()
+    async def koch_snowflake(recursion_depth: int, size: int, image_format: str = "png") -> Image:
+        """Render a Koch snowflake fractal"""
+        params = {"size": size, "recursion_depth": recursion_depth}
+        return as_image(await service.render("koch-snowflake", params, image_format), image_format)
+
+    @server.tool()
+    async def sierpinski_gasket(recursion_depth: int, size: int, image_format: str = "png") -> Image:
+        """Render a Sierpinski gasket fractal"""
+        params = {"size": size, "recursion_depth": recursion_depth}
+        return as_image(await service.render("sierpinski-gasket", params, image_format), image_format)
+
+    @server.tool()
+    async def sierpinski_arrowhead(recursion_depth: int, size: int, image_format: str = "png") -> Image:
+        """Render a Sierpinski arrowhead fractal"""
+        params = {"size": size, "recursion_depth": recursion_depth}
+        return as_image(await service.render("sierpinski-arrowhead", params, image_format), image_format)
+
+    @server.tool()
+    async def mandelbrot_set(num_iterations: int, size: int, image_format: str = "png") -> Image:
+        """Render a Mandelbrot set fractal"""
+        params = {"size": size, "num_iterations": num_iterations}
+        return as_image(await service.render("mandelbrot-set", params, image_format), image_format)
+
+    @server.tool()
+    def render_stats() -> dict:
+        """Report render, cache hit and deduplication counts"""
+        return dict(service.stats, cached=len(service.cache), in_flight=len(service.in_flight))
+
+    return server
@@ -2,20 +2,60 @@
 # ABOUTME: Generates arrowhead curve fractals via string rewriting and turtle graphics
 
 import math
+from array import array
+import click
 from PIL import Image, ImageDraw
+from algorithm_base import AlgorithmBase
+from antialias import render_antialiased
+from cost_model import (
+    DEFAULT_TILE_SIZE, IN_MEMORY, STREAMING, TILED, ENCODE_SECONDS_PER_PIXEL, INDEXED_SEGMENT_BYTES,
+    canvas_bytes, coverage_canvas_bytes, make_estimate, tile_band_bytes
+)
+from engines import REFERENCE, FAST
+from strategies import draw_paths
 
 
-class SierpinskiArrowhead:
-    def __init__(self, size, step_length=None):
-        self.size = size
+class SierpinskiArrowhead(AlgorithmBase):
+    line_width = 2
+    
+    # Cost model constants measured as resident memory on CPython 3.11; the
+    # L-system string, the unscaled and the scaled point lists are alive at
+    # the same time, and the integer copy rasterizing makes reuses their memory
+    POINT_BYTES = 330
+    GENERATE_SECONDS_PER_POINT = 2e-6
+    DRAW_SECONDS_PER_SEGMENT = 3e-6
+    
+    # Rewriting rules: A -> B-A-B, B -> A+B+A
+    RULES = {"A": "B-A-B", "B": "A+B+A"}
+    REWRITE_TABLE = str.maketrans(RULES)
+    
+    def __init__(self, size, step_length=None, recursion_depth=0, output=None, engine=REFERENCE, antialias=0):
+        super().__init__(size, output, engine)
+        self.recursion_depth = recursion_depth
+        # Supersampling factor per axis for anti-aliased lines; 0 or 1 draws aliased lines
+        self.antialias = antialias
         self.step_length = step_length or 10  # Fixed step length for initial generation
         self.angle = 60  # degrees
         
     def generate_lsystem_string(self, depth):
         """Generate L-system string using Sierpinski arrowhead rules"""
+        for current in self.iter_lsystem_strings(depth):
+            pass
+        return current
+    
+    def iter_lsystem_strings(self, depth):
+        """Yield the L-system string of every depth from 0 to depth, each rewritten from the last"""
         # Axiom: A
         # Rules: A -> B-A-B, B -> A+B+A
         current = "A"
+        yield current
+        
+        if self.engine == FAST:
+            # str.translate rewrites every symbol in one pass in C
+            for _ in range(depth):
+                current = current.translate(self.REWRITE_TABLE)
+                yield current
+            return
         
         for _ in range(depth):
             next_string = ""
@@ -27,8 +67,7 @@ class SierpinskiArrowhead:
                 else:
                     next_string += char
             current = next_string
-            
-        return current
+            yield current
     
     def interpret_turtle_commands(self, lsystem_string, start_pos=None, start_angle=0):
         """Interpret L-system string as turtle graphics commands"""
@@ -62,13 +101,52 @@ class SierpinskiArrowhead:
         lsystem_string = self.generate_lsystem_string(depth)
         
         # Convert to points using turtle graphics with temporary step length
-        temp_points = self.interpret_turtle_commands(lsystem_string)
+        if self.engine == FAST:
+            temp_points = self.interpret_turtle_commands_fast(lsystem_string)
+        else:
+            temp_points = self.interpret_turtle_commands(lsystem_string)
         
         # Scale and center the curve to fit the image
         scaled_points = self.scale_to_fit(temp_points)
         
         return scaled_points
     
+    def interpret_turtle_commands_fast(self, lsystem_string, start_pos=None, start_angle=0):
+        """Interpret turtle commands like interpret_turtle_commands with a table of step vectors"""
+        if 360 % self.angle:
+            return self.interpret_turtle_commands(lsystem_string, start_pos, start_angle)
+        if start_pos is None:
+            start_pos = (self.size * 0.2, self.size * 0.8)
+        
+        # Headings are multiples of the turn angle, so there are only a few step vectors
+        headings = 360 // self.angle
+        steps = [(self.step_length * math.cos(math.radians(start_angle + i * self.angle)),
+                  self.step_length * math.sin(math.radians(start_angle + i * self.angle)))
+                 for i in range(headings)]
+        
+        x, y = start_pos
+        points = [(x, y)]
+        append = points.append
+        heading = 0
+        for char in lsystem_string:
+            if char == "A" or char == "B":
+                step_x, step_y = steps[heading]
+                x += step_x
+                y += step_y
+                append((x, y))
+            elif char == "+":
+                heading = (heading + 1) % headings
+            elif char == "-":
+                heading = (heading - 1) % headings
+        return points
+    
+    def iter_levels(self, depth):
+        """Yield the arrowhead points of every depth from 0 to depth, reusing each rewritten string"""
+        interpret = self.interpret_turtle_commands_fast if self.engine == FAST else self.interpret_turtle_commands
+        for lsystem_string in self.iter_lsystem_strings(depth):
+            # Each level is rescaled on its own, so only the string carries over
+            yield self.scale_to_fit(interpret(lsystem_string))
+    
     def scale_to_fit(self, points):
         """Scale and center the curve to fit within the image bounds"""
         if len(points) < 2:
@@ -118,8 +196,77 @@ class SierpinskiArrowhead:
             
         return scaled_points
     
-    def save_image(self, points, filename):
-        """Save the arrowhead curve as an image"""
+    def iter_lsystem_symbols(self, depth, symbol="A"):
+        """Yield the L-system string of generate_lsystem_string one symbol at a time"""
+        if depth == 0 or symbol not in self.RULES:
+            yield symbol
+            return
+        
+        for char in self.RULES[symbol]:
+            yield from self.iter_lsystem_symbols(depth - 1, char)
+    
+    def iter_turtle_points(self, symbols, start_pos=None, start_angle=0):
+        """Yield the points of interpret_turtle_commands as the symbols arrive"""
+        if start_pos is None:
+            start_pos = (self.size * 0.2, self.size * 0.8)
+        
+        x, y = start_pos
+        angle = start_angle  # degrees
+        yield (x, y)
+        
+        for char in symbols:
+            if char in ["A", "B"]:  # Both A and B mean "move forward"
+                rad = math.radians(angle)
+                x = x + self.step_length * math.cos(rad)
+                y = y + self.step_length * math.sin(rad)
+                yield (x, y)
+            elif char == "+":  # Turn left
+                angle += self.angle
+            elif char == "-":  # Turn right
+                angle -= self.angle
+    
+    def iter_arrowhead(self, depth):
+        """Yield the points of generate_arrowhead without holding the curve in memory
+        
+        The curve is traced twice: once to find its bounding box and once to
+        emit the scaled points.
+        """
+        min_x = min_y = math.inf
+        max_x = max_y = -math.inf
+        count = 0
+        for x, y in self.iter_turtle_points(self.iter_lsystem_symbols(depth)):
+            min_x, max_x = min(min_x, x), max(max_x, x)
+            min_y, max_y = min(min_y, y), max(max_y, y)
+            count += 1
+        
+        points = self.iter_turtle_points(self.iter_lsystem_symbols(depth))
+        current_width = max_x - min_x
+        current_height = max_y - min_y
+        if count < 2 or current_width == 0 or current_height == 0:
+            yield from points
+            return
+        
+        # Same transform as scale_to_fit
+        margin = self.size * 0.1
+        scale = min((self.size - 2 * margin) / current_width, (self.size - 2 * margin) / current_height)
+        offset_x = (self.size - current_width * scale) / 2
+        offset_y = (self.size - current_height * scale) / 2
+        for x, y in points:
+            yield ((x - min_x) * scale + offset_x, (y - min_y) * scale + offset_y)
+    
+    def iter_paths(self):
+        """Yield (points, closed) polylines for streaming vector output"""
+        yield self.iter_arrowhead(self.recursion_depth), False
+    
+    def generate(self):
+        """Generate arrowhead points at the configured recursion depth"""
+        return self.generate_arrowhead(self.recursion_depth)
+    
+    def render_image(self, points):
+        """Rasterize the arrowhead curve into an image"""
+        if self.antialias > 1:
+            return render_antialiased([(points, False)], self.size, self.line_width, self.antialias)
+        
         # Create a white image
         image = Image.new('RGB', (self.size, self.size), 'white')
         draw = ImageDraw.Draw(image)
@@ -133,7 +280,61 @@ class SierpinskiArrowhead:
             for i in range(len(int_points) - 1):
                 start_point = int_points[i]
                 end_point = int_points[i + 1]
-                draw.line([start_point, end_point], fill='black', width=2)
+                draw.line([start_point, end_point], fill='black', width=self.line_width)
         
-        # Save the image
-        image.save(filename)
\ No newline at end of file
+        return image
+    
+    def render_image_streaming(self):
+        """Draw the curve as it is generated, without holding it in memory"""
+        if self.antialias > 1:
+            return render_antialiased(self.iter_paths(), self.size, self.line_width, self.antialias)
+        image = Image.new('RGB', (self.size, self.size), 'white')
+        draw_paths(ImageDraw.Draw(image), self.iter_paths(), self.line_width)
+        return image
+    
+    def estimate_cost(self, tile_size=DEFAULT_TILE_SIZE, workers=1):
+        """Predict point count, peak memory per strategy and runtime"""
+        points = 3 ** self.recursion_depth + 1
+        canvas = canvas_bytes(self.size, self.size)
+        if self.antialias > 1:
+            canvas += coverage_canvas_bytes(self.size, self.antialias)
+        seconds = (points * (self.GENERATE_SECONDS_PER_POINT + self.DRAW_SECONDS_PER_SEGMENT)
+                   + self.size * self.size * ENCODE_SECONDS_PER_PIXEL)
+        return make_estimate(points, "points", {
+            IN_MEMORY: points * self.POINT_BYTES + canvas,
+            STREAMING: canvas,
+            TILED: points * INDEXED_SEGMENT_BYTES + tile_band_bytes(self.size, min(tile_size, self.size), workers),
+        }, seconds)
+    
+    def sample_kernel_inputs(self, count):
+        """Pick the L-system string of a level with about count segments"""
+        depth = min(self.recursion_depth, max(round(math.log(max(count, 1), 3)), 0))
+        return self.generate_lsystem_string(depth)
+    
+    def run_kernel(self, engine, lsystem_string):
+        """Trace a sampled L-system string with one engine and return the flattened points"""
+        interpret = self.interpret_turtle_commands_fast if engine == FAST else self.interpret_turtle_commands
+        return [value for point in interpret(lsystem_string) for value in point]
+    
+    def as_array(self, points):
+        """Flatten the points into an (array.array, shape) pair of x, y coordinates"""
+        values = array('d')
+        for x, y in points:
+            values.append(x)
+            values.append(y)
+        return values, (len(points), 2)
+    
+    def save_image(self, points, filename):
+        """Save the arrowhead curve as an image"""
+        self.render_image(points).save(filename)
+    
+    @classmethod
+    def add_cli_options(cls, command):
+        """Add the recursion depth option to a click command"""
+        return click.option('--recursion-depth', type=int, required=True, help='Recursion depth for fractal generation')(command)
+    
+    @classmethod
+    def create_from_args(cls, **kwargs):
+        """Create an arrowhead from parsed CLI arguments"""
+        return cls(size=kwargs['size'], recursion_depth=kwargs['recursion_depth'], output=kwargs.get('output'),
+                   engine=kwargs.get('engine', REFERENCE), antialias=kwargs.get('antialias', 0))
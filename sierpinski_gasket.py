@@ -2,12 +2,40 @@
 # ABOUTME: Generates triangle subdivision fractals and renders them to image files
 
 import math
+from array import array
+import click
 from PIL import Image, ImageDraw
+from algorithm_base import AlgorithmBase
+from antialias import render_antialiased
+from cost_model import (
+    DEFAULT_TILE_SIZE, IN_MEMORY, STREAMING, TILED, ENCODE_SECONDS_PER_PIXEL, INDEXED_SEGMENT_BYTES,
+    canvas_bytes, coverage_canvas_bytes, make_estimate, tile_band_bytes
+)
+from engines import REFERENCE, FAST
+from strategies import draw_paths
 
 
-class SierpinskiGasket:
-    def __init__(self, size):
-        self.size = size
+# Kernel samples are drawn from a level this deep, which has 3 ** 7 triangles
+SAMPLE_DEPTH = 7
+
+
+class SierpinskiGasket(AlgorithmBase):
+    line_width = 1
+    
+    # Half-scale copies each primitive splits into, for instanced rendering
+    INSTANCE_BRANCHING = 3
+    
+    # Cost model constants measured as resident memory on CPython 3.11;
+    # vertices are partly shared between neighbouring triangles
+    TRIANGLE_BYTES = 400
+    GENERATE_SECONDS_PER_TRIANGLE = 1e-6
+    DRAW_SECONDS_PER_TRIANGLE = 8e-6
+    
+    def __init__(self, size, recursion_depth=0, output=None, engine=REFERENCE, antialias=0):
+        super().__init__(size, output, engine)
+        self.recursion_depth = recursion_depth
+        # Supersampling factor per axis for anti-aliased lines; 0 or 1 draws aliased lines
+        self.antialias = antialias
         
     def get_initial_triangle(self):
         """Generate an equilateral triangle as the base for the Sierpinski Gasket"""
@@ -43,21 +71,107 @@ class SierpinskiGasket:
     
     def generate_gasket(self, depth):
         """Generate Sierpinski Gasket triangles with given recursion depth"""
+        for triangles in self.iter_levels(depth):
+            pass
+        return triangles
+    
+    def iter_levels(self, depth):
+        """Yield the gasket triangles of every depth from 0 to depth, each built from the last"""
         # Start with initial triangle
         triangles = [self.get_initial_triangle()]
+        yield triangles
         
         # Apply subdivision for each depth level
+        next_level = self.next_level_fast if self.engine == FAST else self.next_level
         for _ in range(depth):
-            new_triangles = []
-            for triangle in triangles:
-                subdivided = self.subdivide_triangle(triangle)
-                new_triangles.extend(subdivided)
-            triangles = new_triangles
-            
-        return triangles
+            triangles = next_level(triangles)
+            yield triangles
     
-    def save_image(self, triangles, filename):
-        """Save the gasket triangles as an image"""
+    def next_level(self, triangles):
+        """Subdivide every triangle of a level"""
+        new_triangles = []
+        for triangle in triangles:
+            subdivided = self.subdivide_triangle(triangle)
+            new_triangles.extend(subdivided)
+        return new_triangles
+    
+    def subdivide_triangle_fast(self, triangle):
+        """Subdivide a triangle like subdivide_triangle with the coordinates unpacked once"""
+        p1, p2, p3 = triangle
+        x1, y1 = p1
+        x2, y2 = p2
+        x3, y3 = p3
+        # Halving by multiplication is exact, so this matches the reference bit for bit
+        mid12 = ((x1 + x2) * 0.5, (y1 + y2) * 0.5)
+        mid23 = ((x2 + x3) * 0.5, (y2 + y3) * 0.5)
+        mid31 = ((x3 + x1) * 0.5, (y3 + y1) * 0.5)
+        return [[p1, mid12, mid31], [p2, mid23, mid12], [p3, mid31, mid23]]
+    
+    def next_level_fast(self, triangles):
+        """Subdivide every triangle of a level with subdivide_triangle_fast inlined"""
+        new_triangles = []
+        append = new_triangles.append
+        for p1, p2, p3 in triangles:
+            x1, y1 = p1
+            x2, y2 = p2
+            x3, y3 = p3
+            mid12 = ((x1 + x2) * 0.5, (y1 + y2) * 0.5)
+            mid23 = ((x2 + x3) * 0.5, (y2 + y3) * 0.5)
+            mid31 = ((x3 + x1) * 0.5, (y3 + y1) * 0.5)
+            append([p1, mid12, mid31])
+            append([p2, mid23, mid12])
+            append([p3, mid31, mid23])
+        return new_triangles
+    
+    def iter_gasket(self, depth):
+        """Yield the triangles of generate_gasket lazily, depth first"""
+        yield from self._iter_subdivided(self.get_initial_triangle(), depth)
+    
+    def _iter_subdivided(self, triangle, depth):
+        """Yield the leaf triangles of one triangle subdivided depth times"""
+        if depth == 0:
+            yield triangle
+            return
+        
+        subdivide = self.subdivide_triangle_fast if self.engine == FAST else self.subdivide_triangle
+        for corner in subdivide(triangle):
+            yield from self._iter_subdivided(corner, depth - 1)
+    
+    def iter_paths(self):
+        """Yield (points, closed) polylines for streaming vector output"""
+        for triangle in self.iter_gasket(self.recursion_depth):
+            yield triangle, True
+    
+    def instance_primitives(self):
+        """Return the top-level primitives instanced rendering subdivides"""
+        return [self.get_initial_triangle()]
+    
+    def split_primitive(self, triangle):
+        """Subdivide a primitive one level into half-scale copies"""
+        if self.engine == FAST:
+            return self.subdivide_triangle_fast(triangle)
+        return self.subdivide_triangle(triangle)
+    
+    def instance_key(self, triangle):
+        """Return (shape key, anchor) of a primitive; equal keys at one level are translated copies"""
+        # Corner triangles list their vertices in a different order, so anchor on the bounding box
+        return 0, (min(x for x, _ in triangle), min(y for _, y in triangle))
+    
+    def primitive_paths(self, triangle, depth):
+        """Yield the (points, closed) polylines of a primitive subdivided depth times"""
+        for leaf in self._iter_subdivided(triangle, depth):
+            yield leaf, True
+    
+    def generate(self):
+        """Generate gasket triangles at the configured recursion depth"""
+        return self.generate_gasket(self.recursion_depth)
+    
+    def render_image(self, triangles):
+        """Rasterize the gasket triangles into an image"""
+        if self.antialias > 1:
+            paths = ((triangle, True) for triangle in triangles)
+            return render_antialiased(paths, self.size, self.line_width, self.antialias)
+        
         # Create a white image
         image = Image.new('RGB', (self.size, self.size), 'white')
         draw = ImageDraw.Draw(image)
@@ -73,7 +187,63 @@ class SierpinskiGasket:
                 for i in range(3):
                     start_point = int_points[i]
                     end_point = int_points[(i + 1) % 3]
-                    draw.line([start_point, end_point], fill='black', width=1)
+                    draw.line([start_point, end_point], fill='black', width=self.line_width)
         
-        # Save the image
-        image.save(filename)
\ No newline at end of file
+        return image
+    
+    def render_image_streaming(self):
+        """Draw the triangles as they are generated, without holding them in memory"""
+        if self.antialias > 1:
+            return render_antialiased(self.iter_paths(), self.size, self.line_width, self.antialias)
+        image = Image.new('RGB', (self.size, self.size), 'white')
+        draw_paths(ImageDraw.Draw(image), self.iter_paths(), self.line_width)
+        return image
+    
+    def estimate_cost(self, tile_size=DEFAULT_TILE_SIZE, workers=1):
+        """Predict triangle count, peak memory per strategy and runtime"""
+        triangles = 3 ** self.recursion_depth
+        canvas = canvas_bytes(self.size, self.size)
+        if self.antialias > 1:
+            canvas += coverage_canvas_bytes(self.size, self.antialias)
+        seconds = (triangles * (self.GENERATE_SECONDS_PER_TRIANGLE + self.DRAW_SECONDS_PER_TRIANGLE)
+                   + self.size * self.size * ENCODE_SECONDS_PER_PIXEL)
+        return make_estimate(triangles, "triangles", {
+            IN_MEMORY: triangles * self.TRIANGLE_BYTES + canvas,
+            STREAMING: canvas,
+            TILED: 3 * triangles * INDEXED_SEGMENT_BYTES + tile_band_bytes(self.size, min(tile_size, self.size), workers),
+        }, seconds)
+    
+    def sample_kernel_inputs(self, count):
+        """Pick about count triangles spread over a shallow level of the gasket"""
+        triangles = self.generate_gasket(min(self.recursion_depth, SAMPLE_DEPTH))
+        return triangles[::max(len(triangles) // count, 1)][:count]
+    
+    def run_kernel(self, engine, triangles):
+        """Subdivide sampled triangles with one engine and return the flattened coordinates"""
+        subdivide = self.subdivide_triangle_fast if engine == FAST else self.subdivide_triangle
+        return [value for triangle in triangles for corner in subdivide(triangle)
+                for point in corner for value in point]
+    
+    def as_array(self, triangles):
+        """Flatten the triangles into an (array.array, shape) pair of vertex coordinates"""
+        values = array('d')
+        for triangle in triangles:
+            for x, y in triangle:
+                values.append(x)
+                values.append(y)
+        return values, (len(triangles), 3, 2)
+    
+    def save_image(self, triangles, filename):
+        """Save the gasket triangles as an image"""
+        self.render_image(triangles).save(filename)
+    
+    @classmethod
+    def add_cli_options(cls, command):
+        """Add the recursion depth option to a click command"""
+        return click.option('--recursion-depth', type=int, required=True, help='Recursion depth for fractal generation')(command)
+    
+    @classmethod
+    def create_from_args(cls, **kwargs):
+        """Create a gasket from parsed CLI arguments"""
+        return cls(size=kwargs['size'], recursion_depth=kwargs['recursion_depth'], output=kwargs.get('output'),
+                   engine=kwargs.get('engine', REFERENCE), antialias=kwargs.get('antialias', 0))
@@ -0,0 +1,64 @@
+# ABOUTME: Execution strategies for rendering an algorithm within a memory budget
+# ABOUTME: Runs in-memory, streaming or tiled renders and decides which are possible for an output
+
+import os
+
+from cost_model import IN_MEMORY, STREAMING, TILED, STRATEGIES, DEFAULT_TILE_SIZE
+from encoders import ImageEncoder, ROW_STREAM_EXTENSIONS
+from tiled import build_segment_grid, render_tiled
+
+
+def draw_paths(draw, paths, line_width):
+    """Draw (points, closed) polylines segment by segment exactly as render_image does"""
+    for points, closed in paths:
+        first = previous = None
+        count = 0
+        for x, y in points:
+            point = (int(x), int(y))
+            if previous is not None:
+                draw.line([previous, point], fill='black', width=line_width)
+            else:
+                first = point
+            previous = point
+            count += 1
+
+        if closed and count >= 2:
+            draw.line([previous, first], fill='black', width=line_width)
+
+
+def allowed_strategies(algorithm, output):
+    """List the strategies able to produce the requested output"""
+    encoder = ImageEncoder()
+    if encoder.wants_data(output):
+        # Data outputs need the generated data itself
+        return [IN_MEMORY]
+    if getattr(algorithm, "antialias", 0) > 1:
+        # Anti-aliased lines are drawn on one supersampled canvas
+        return [IN_MEMORY, STREAMING]
+    if os.path.splitext(output)[1].lower() in ROW_STREAM_EXTENSIONS:
+        return list(STRATEGIES)
+    return [IN_MEMORY, STREAMING]
+
+
+def render_with_strategy(algorithm, strategy, output, profiler=None, encoder=None,
+                         tile_size=DEFAULT_TILE_SIZE, workers=None):
+    """Render an algorithm to a file with the given execution strategy"""
+    encoder = encoder or ImageEncoder()
+
+    if strategy == IN_MEMORY:
+        algorithm.render(output, profiler=profiler, encoder=encoder)
+    elif strategy == STREAMING:
+        algorithm.render_streaming(output, profiler=profiler, encoder=encoder)
+    elif strategy == TILED and hasattr(algorithm, "iter_paths"):
+        with algorithm.stage("generate", profiler):
+            grid = build_segment_grid(algorithm, tile_size)
+        # Tiles are encoded as soon as each band is rasterized, so the two share a stage
+        with algorithm.stage("rasterize", profiler):
+            render_tiled(algorithm, output, tile_size, workers=workers,
+                         compress_level=encoder.png_compress_level, encode_threads=encoder.threads, grid=grid)
+    elif strategy == TILED:
+        # Raster algorithms are tiled as full-width bands of rows
+        with algorithm.stage("rasterize", profiler):
+            algorithm.render_banded(output, band_rows=tile_size, encoder=encoder)
+    else:
+        raise ValueError(f"Unknown strategy: {strategy}")
@@ -0,0 +1,71 @@
+# ABOUTME: Depth-sweep rendering that saves an image of every recursion level in one run
+# ABOUTME: Builds each level from the previous one and encodes it while the next level is generated
+
+import os
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from encoders import ImageEncoder
+
+
+DEPTH_PLACEHOLDER = "{depth}"
+
+
+def sweep_filename(output, depth):
+    """Return the output filename for one level of a sweep"""
+    if DEPTH_PLACEHOLDER in output:
+        return output.replace(DEPTH_PLACEHOLDER, str(depth))
+    root, extension = os.path.splitext(output)
+    return f"{root}_depth{depth}{extension}"
+
+
+def render_sweep(algorithm, output=None, profiler=None, encoder=None):
+    """Save every depth from 0 to the algorithm's recursion depth and return the filenames
+
+    Levels are rasterized on the calling thread and encoded on a background
+    thread, so encoding level k overlaps with generating level k + 1. At most
+    one encode is pending, which bounds memory to two levels and one image.
+    """
+    output = output or algorithm.output
+    encoder = encoder or ImageEncoder()
+    wants_data = encoder.wants_data(output)
+    filenames = []
+
+    def encode(level, data, filename):
+        with algorithm.stage(f"encode {level}", profiler):
+            if wants_data:
+                encoder.save_data(algorithm.as_array(data), filename)
+            else:
+                encoder.save(data, filename)
+
+    # Stages overlap across threads, so trace the whole sweep instead of
+    # letting each stage start and stop tracemalloc under the other
+    start_tracing = profiler is not None and profiler.trace_memory and not tracemalloc.is_tracing()
+    if start_tracing:
+        tracemalloc.start()
+
+    pending = None
+    try:
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            levels = algorithm.iter_levels(algorithm.recursion_depth)
+            for level in range(algorithm.recursion_depth + 1):
+                with algorithm.stage(f"generate {level}", profiler):
+                    data = next(levels)
+                if not wants_data:
+                    with algorithm.stage(f"rasterize {level}", profiler):
+                        data = algorithm.render_image(data)
+
+                # Wait for the previous level so its image can be released
+                if pending is not None:
+                    pending.result()
+                filename = sweep_filename(output, level)
+                pending = executor.submit(encode, level, data, filename)
+                filenames.append(filename)
+
+            if pending is not None:
+                pending.result()
+    finally:
+        if start_tracing:
+            tracemalloc.stop()
+
+    return filenames
@@ -0,0 +1,70 @@
+# ABOUTME: Unit tests for the batched anti-aliased line rasterizer
+# ABOUTME: Tests coverage tone-mapping, batching and quality against a finely supersampled render
+
+import pytest
+from PIL import ImageChops
+from antialias import CoverageCanvas, coverage_lut, render_antialiased
+from koch_snowflake import KochSnowflake
+from sierpinski_gasket import SierpinskiGasket
+from sierpinski_arrowhead import SierpinskiArrowhead
+
+
+def mean_error(image, reference):
+    """Mean absolute per-channel difference between two images"""
+    histogram = ImageChops.difference(image, reference).convert('L').histogram()
+    return sum(value * count for value, count in enumerate(histogram)) / (image.width * image.height)
+
+
+class TestAntialias:
+
+    def test_coverage_lut_endpoints(self):
+        """Test that no coverage is white and full coverage is black"""
+        lut = coverage_lut()
+        assert lut[0] == 255
+        assert lut[255] == 0
+        assert lut == sorted(lut, reverse=True)
+
+    def test_partial_coverage_gives_grey_edges(self):
+        """Test that a diagonal line produces intermediate grey levels"""
+        image = render_antialiased([([(2.0, 3.0), (37.5, 21.25)], False)], 40, line_width=1.5)
+
+        levels = set(image.convert('L').tobytes())
+        assert 0 in levels or min(levels) < 100
+        assert len(levels) > 5
+        assert image.getpixel((0, 39)) == (255, 255, 255)
+
+    def test_closed_paths_draw_the_closing_edge(self):
+        """Test that closed paths are joined back to their start"""
+        canvas = CoverageCanvas(20, line_width=1, supersample=4)
+        canvas.add_path([(2, 2), (17, 2), (17, 17)], closed=True)
+
+        # The midpoint of the closing diagonal is covered
+        assert canvas.coverage().getpixel((9, 9)) > 0
+
+    def test_long_paths_are_split_into_connected_runs(self, monkeypatch):
+        """Test that splitting a path across draw calls leaves no gaps"""
+        points = [(5 + i * 0.5, 10.0) for i in range(60)]
+        whole = render_antialiased([(points, False)], 40, line_width=1)
+
+        monkeypatch.setattr("antialias.POINTS_PER_CALL", 7)
+        split = render_antialiased([(points, False)], 40, line_width=1)
+
+        assert split.tobytes() == whole.tobytes()
+
+    @pytest.mark.parametrize("algorithm_class", [KochSnowflake, SierpinskiGasket, SierpinskiArrowhead])
+    def test_in_memory_and_streaming_agree(self, algorithm_class):
+        """Test that both execution paths produce the same anti-aliased image"""
+        algorithm = algorithm_class(size=150, recursion_depth=3, antialias=4)
+
+        assert algorithm.render_image(algorithm.generate()).tobytes() == algorithm.render_image_streaming().tobytes()
+
+    @pytest.mark.parametrize("algorithm_class", [KochSnowflake, SierpinskiArrowhead])
+    def test_quality_beats_aliased_lines(self, algorithm_class):
+        """Test that anti-aliasing is closer to a finely supersampled render than aliased lines"""
+        aliased = algorithm_class(size=200, recursion_depth=4)
+        antialiased = algorithm_class(size=200, recursion_depth=4, antialias=4)
+        truth = algorithm_class(size=200, recursion_depth=4, antialias=12)
+        expected = truth.render_image_streaming()
+
+        assert mean_error(antialiased.render_image_streaming(), expected) < \
+            mean_error(aliased.render_image(aliased.generate()), expected) / 2
@@ -0,0 +1,118 @@
+# ABOUTME: Unit tests for deadline-bounded anytime rendering
+# ABOUTME: Tests that deepening stops at the budget and that unlimited budgets match a normal render
+
+import itertools
+import pytest
+import time
+from PIL import Image
+from anytime import ANYTIME_START_ITERATIONS, check_deadline, deepen_iterations, deepen_levels, render_anytime
+from coloring import SMOOTH
+from engines import FAST
+from koch_snowflake import KochSnowflake
+from mandelbrot_set import MandelbrotSet
+from sierpinski_arrowhead import SierpinskiArrowhead
+from sierpinski_gasket import SierpinskiGasket
+
+
+def ticking_clock():
+    """A clock that advances one second every time it is read"""
+    return itertools.count().__next__
+
+
+class TestAnytime:
+
+    def test_check_deadline(self):
+        """Test that deadlines must be positive"""
+        assert check_deadline(0.5) == 0.5
+        for deadline in (0, -1):
+            with pytest.raises(ValueError):
+                check_deadline(deadline)
+
+    @pytest.mark.parametrize("algorithm_class", [KochSnowflake, SierpinskiGasket, SierpinskiArrowhead])
+    def test_unlimited_levels_match_normal_render(self, algorithm_class):
+        """Test that without a binding deadline every level is rendered"""
+        algorithm = algorithm_class(size=200, recursion_depth=4)
+        expected = algorithm_class(size=200, recursion_depth=4)
+
+        image = deepen_levels(algorithm, float("inf"))
+
+        assert algorithm.recursion_depth == 4
+        assert image.tobytes() == expected.render_image(expected.generate()).tobytes()
+
+    def test_expired_deadline_keeps_first_level(self):
+        """Test that a budget already spent still yields depth 0"""
+        algorithm = SierpinskiGasket(size=100, recursion_depth=6)
+        expected = SierpinskiGasket(size=100, recursion_depth=0)
+
+        image = deepen_levels(algorithm, float("-inf"))
+
+        assert algorithm.recursion_depth == 0
+        assert image.tobytes() == expected.render_image(expected.generate()).tobytes()
+
+    def test_first_level_save_time_is_reserved(self):
+        """Test that depth 0 is saved and twice the time that took is reserved from the deadline"""
+        saved = []
+        # depth 0 reads the clock at 0 and 1 and its save at 2 and 3, reserving 2 seconds; depth 1 is
+        # predicted to end at 5, inside a deadline of 6 but past the 4 left once the reserve is taken
+        unreserved = deepen_levels(SierpinskiGasket(size=100, recursion_depth=3), 6, clock=ticking_clock())
+        algorithm = SierpinskiGasket(size=100, recursion_depth=3)
+        image = deepen_levels(algorithm, 6, clock=ticking_clock(), finish=saved.append)
+
+        assert unreserved.tobytes() != image.tobytes()
+        assert algorithm.recursion_depth == 0
+        assert saved == [image]
+
+    @pytest.mark.parametrize("options", [{}, {"engine": FAST}, {"coloring": SMOOTH}])
+    def test_unlimited_iterations_match_normal_render(self, options):
+        """Test that deepening only unescaped pixels gives the counts of a single pass"""
+        algorithm = MandelbrotSet(size=40, max_iterations=100, **options)
+        expected = MandelbrotSet(size=40, max_iterations=100, **options)
+        expected_rows = expected.generate()
+
+        rows = deepen_iterations(algorithm, float("inf"))
+
+        assert algorithm.max_iterations == 100
+        assert rows == expected_rows
+        assert algorithm.render_image(rows).tobytes() == expected.render_image(expected_rows).tobytes()
+
+    def test_expired_deadline_keeps_first_pass(self):
+        """Test that a budget already spent still yields the starting iteration limit"""
+        algorithm = MandelbrotSet(size=30, max_iterations=500)
+
+        rows = deepen_iterations(algorithm, float("-inf"))
+
+        assert algorithm.max_iterations == ANYTIME_START_ITERATIONS
+        assert rows == MandelbrotSet(size=30, max_iterations=ANYTIME_START_ITERATIONS).generate()
+
+    def test_overrunning_pass_is_abandoned(self):
+        """Test that a pass running past the deadline is dropped for the last complete one"""
+        algorithm = MandelbrotSet(size=30, max_iterations=500)
+        clock = ticking_clock()
+        # The first pass reads the clock twice; the deepening pass runs out after a few rows
+        finish_by = 8
+
+        rows = deepen_iterations(algorithm, finish_by, clock=clock, start_iterations=16)
+
+        assert algorithm.max_iterations == 16
+        assert rows == MandelbrotSet(size=30, max_iterations=16).generate()
+
+    def test_render_anytime_records_reached_depth(self, tmp_path):
+        """Test that the saved PNG carries the depth reached and the deadline"""
+        output = str(tmp_path / "gasket.png")
+        algorithm = SierpinskiGasket(size=100, recursion_depth=3)
+
+        image, reached = render_anytime(algorithm, 60, output)
+
+        assert reached == 3
+        with Image.open(output) as saved:
+            assert saved.text == {"recursion_depth": "3", "deadline": "60"}
+            assert saved.convert("RGB").tobytes() == image.tobytes()
+
+    def test_deadline_counts_from_start(self, tmp_path):
+        """Test that time spent before the call is charged to the budget"""
+        algorithm = MandelbrotSet(size=20, max_iterations=500)
+
+        # The budget ran out before the call, so only the first pass runs
+        _, reached = render_anytime(algorithm, 10, str(tmp_path / "m.png"), start=time.perf_counter() - 100)
+
+        assert reached == ANYTIME_START_ITERATIONS
@@ -0,0 +1,108 @@
+# ABOUTME: Unit tests for the performance benchmark harness
+# ABOUTME: Tests case measurement, baseline recording and regression comparison
+
+import pytest
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+from benchmark import (
+    QUICK_MATRIX, build_case, measure_case, run_case_isolated, compare_results, wait_for_child
+)
+
+
+def make_document(generate_seconds, save_seconds=0.1, peak_rss_kb=50000):
+    """Build a minimal baseline document with one case"""
+    return {
+        "results": {
+            "koch-snowflake/size=100/level=2": {
+                "generate_seconds": generate_seconds,
+                "save_seconds": save_seconds,
+                "peak_rss_kb": peak_rss_kb,
+            }
+        }
+    }
+
+
+class TestBenchmark:
+
+    def test_build_case_unknown_algorithm(self):
+        """Test that unknown algorithms are rejected"""
+        with pytest.raises(ValueError):
+            build_case("unknown", 100, 1)
+
+    def test_measure_case_reports_metrics(self):
+        """Test that measuring a case records timing, throughput and memory"""
+        result = measure_case("koch-snowflake", 100, 2)
+
+        # Depth 2 snowflake has 3 * 4^2 points
+        assert result["units"] == 48
+        assert result["unit"] == "points"
+        assert result["generate_seconds"] >= 0
+        assert result["save_seconds"] > 0
+        assert result["peak_rss_kb"] > 0
+
+    def test_measure_case_mandelbrot_counts_pixels(self):
+        """Test that Mandelbrot cases count pixels"""
+        result = measure_case("mandelbrot-set", 20, 10)
+
+        assert result["units"] == 400
+        assert result["unit"] == "pixels"
+
+    def test_run_case_isolated(self):
+        """Test that a case can be measured in a separate process"""
+        result = run_case_isolated("sierpinski-gasket", 100, 2)
+
+        assert result["units"] == 9
+        assert result["peak_rss_kb"] > 0
+
+    def test_child_that_dies_without_reporting_fails(self):
+        """Test that a child killed before reporting fails instead of hanging the harness"""
+        context = multiprocessing.get_context("spawn")
+        queue = context.Queue()
+        process = context.Process(target=os._exit, args=(3,))
+        process.start()
+
+        status, payload = wait_for_child(process, queue, poll_seconds=0.1)
+        process.join()
+
+        assert status == "error"
+        assert "code 3" in payload
+
+    def test_compare_flags_regression(self):
+        """Test that slowdowns beyond the threshold are flagged"""
+        regressions = compare_results(make_document(0.5), make_document(1.0), threshold=0.2)
+
+        assert len(regressions) == 1
+        assert regressions[0]["metric"] == "generate_seconds"
+        assert regressions[0]["ratio"] == pytest.approx(2.0)
+
+    def test_compare_ignores_small_changes(self):
+        """Test that changes within the threshold or noise floor pass"""
+        assert compare_results(make_document(0.5), make_document(0.55), threshold=0.2) == []
+        assert compare_results(make_document(0.001), make_document(0.004), threshold=0.2) == []
+
+    def test_cli_run_and_compare(self, tmp_path):
+        """Test recording a quick baseline and comparing against it"""
+        baseline = tmp_path / "baseline.json"
+        result = subprocess.run([
+            sys.executable, "benchmark.py", "run",
+            "--quick", "--repeat", "1",
+            "--algorithm", "sierpinski-gasket",
+            "--output", str(baseline)
+        ], capture_output=True, text=True)
+
+        assert result.returncode == 0
+        document = json.loads(baseline.read_text())
+        assert document["matrix"] == QUICK_MATRIX
+        assert list(document["results"]) == ["sierpinski-gasket/size=100/level=2"]
+
+        # A baseline compared against itself has no regressions
+        result = subprocess.run([
+            sys.executable, "benchmark.py", "compare", str(baseline),
+            "--current", str(baseline)
+        ], capture_output=True, text=True)
+
+        assert result.returncode == 0
+        assert "No regressions" in result.stdout
@@ -0,0 +1,98 @@
+# ABOUTME: Unit tests for smooth colouring with histogram equalization
+# ABOUTME: Tests normalized iteration counts, histograms and equalized colouring of streamed and stored renders
+
+import pytest
+from coloring import SMOOTH, LINEAR, Histogram, EqualizedPalette, check_coloring, smooth_iteration
+from mandelbrot_set import MandelbrotSet
+
+
+def grey(ratio):
+    """Gradient from black to white used to read back palette positions"""
+    level = int(255 * ratio)
+    return (level, level, level)
+
+
+class TestSmoothColoring:
+
+    def test_check_coloring_rejects_unknown_names(self):
+        """Test that colouring names are validated"""
+        assert check_coloring(SMOOTH) == SMOOTH
+        with pytest.raises(ValueError):
+            check_coloring("rainbow")
+
+    def test_smooth_iteration_is_continuous_across_escape_iterations(self):
+        """Test that escaping just past the radius one iteration later continues the value"""
+        # Far from the set |z| roughly squares each iteration, so |z| = 4 now is |z| = 16 one iteration later
+        assert smooth_iteration(5, 4.0 ** 2) == pytest.approx(smooth_iteration(6, 16.0 ** 2))
+        assert smooth_iteration(5, 100.0) < smooth_iteration(5, 5.0)
+        assert smooth_iteration(0, 1e300) == 0.0
+
+    def test_histogram_ignores_interior_points(self):
+        """Test that the CDF only counts escaped points and runs from 0 to 1"""
+        histogram = Histogram(4)
+        histogram.add_row([0.5, 1.2, 1.9, 4.0, 4.0])
+        cdf = histogram.cdf()
+
+        assert cdf == [0.0, pytest.approx(1 / 3), 1.0, 1.0, 1.0]
+
+    def test_empty_histogram_falls_back_to_linear(self):
+        """Test that a view with no escaped points still has a usable CDF"""
+        assert Histogram(4).cdf() == [0.0, 0.25, 0.5, 0.75, 1.0]
+
+    def test_equalized_palette_spreads_crowded_counts(self):
+        """Test that values sharing one iteration bin span the whole gradient"""
+        histogram = Histogram(100)
+        histogram.add_row([10.0, 10.25, 10.5, 10.75])
+        palette = EqualizedPalette(histogram.cdf(), grey)
+        pixels = palette.color_row([10.0, 10.5, 10.999, 100.0])
+
+        assert pixels[0] == 0
+        assert pixels[3] in (127, 128)
+        assert pixels[6] >= 254
+        assert pixels[9:] == b"\x00\x00\x00"
+
+    def test_generate_collects_the_histogram(self):
+        """Test that an in-memory render histograms rows while generating them"""
+        mandelbrot = MandelbrotSet(size=40, max_iterations=50, coloring=SMOOTH)
+        data = mandelbrot.generate()
+
+        histogram = Histogram(50)
+        for row in data:
+            histogram.add_row(row)
+        assert mandelbrot.cdf == histogram.cdf()
+        assert isinstance(data[0][0], float)
+
+    def test_streamed_bands_match_in_memory_render_with_the_same_histogram(self):
+        """Test that banded colouring reproduces the in-memory image given its histogram"""
+        mandelbrot = MandelbrotSet(size=40, max_iterations=50, coloring=SMOOTH)
+        expected = mandelbrot.render_image(mandelbrot.generate())
+
+        assert mandelbrot.render_image_streaming(band_rows=7).tobytes() == expected.tobytes()
+
+    def test_sampled_histogram_approximates_the_full_histogram(self):
+        """Test that streamed renders estimate the CDF from a strided sample"""
+        mandelbrot = MandelbrotSet(size=600, max_iterations=40, coloring=SMOOTH)
+        sampled = mandelbrot.sample_histogram().cdf()
+
+        full = MandelbrotSet(size=600, max_iterations=40, coloring=SMOOTH)
+        full.generate()
+        assert max(abs(a - b) for a, b in zip(sampled, full.cdf)) < 0.02
+
+    def test_streaming_render_estimates_histogram_once(self):
+        """Test that colouring without a stored histogram samples one and reuses it"""
+        mandelbrot = MandelbrotSet(size=40, max_iterations=50, coloring=SMOOTH)
+        mandelbrot.render_image_streaming()
+        cdf = mandelbrot.cdf
+
+        assert cdf is not None
+        mandelbrot.color_row([1.5, 50.0])
+        assert mandelbrot.cdf is cdf
+
+    def test_linear_coloring_is_unchanged(self):
+        """Test that linear colouring still produces integer counts and no histogram"""
+        mandelbrot = MandelbrotSet(size=20, max_iterations=30, coloring=LINEAR)
+        data = mandelbrot.generate()
+
+        assert isinstance(data[0][0], int)
+        assert mandelbrot.cdf is None
+        assert mandelbrot.as_array(data)[0].typecode == 'i'
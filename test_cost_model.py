@@ -0,0 +1,117 @@
+# ABOUTME: Unit tests for the cost model and memory budget strategy selection
+# ABOUTME: Tests size parsing, per-algorithm estimates and choosing or refusing strategies
+
+import pytest
+import subprocess
+import sys
+from cost_model import (
+    BASE_OVERHEAD_BYTES, IN_MEMORY, STREAMING, TILED, MemoryBudgetError, parse_memory_size, format_bytes, choose_strategy
+)
+from koch_snowflake import KochSnowflake
+from sierpinski_gasket import SierpinskiGasket
+from sierpinski_arrowhead import SierpinskiArrowhead
+from mandelbrot_set import MandelbrotSet
+
+
+def make_estimate(in_memory, streaming, tiled):
+    """Build an estimate with the given memory per strategy"""
+    return {
+        "units": 10,
+        "unit": "points",
+        "memory_bytes": {IN_MEMORY: in_memory, STREAMING: streaming, TILED: tiled},
+        "seconds": 1.0,
+    }
+
+
+class TestCostModel:
+
+    def test_parse_memory_size(self):
+        """Test parsing memory sizes with binary suffixes"""
+        assert parse_memory_size("1024") == 1024
+        assert parse_memory_size("512M") == 512 * 1024 ** 2
+        assert parse_memory_size("2g") == 2 * 1024 ** 3
+        assert parse_memory_size("1.5KiB") == 1536
+        with pytest.raises(ValueError):
+            parse_memory_size("lots")
+
+    def test_format_bytes(self):
+        """Test formatting byte counts"""
+        assert format_bytes(512) == "512.0 B"
+        assert format_bytes(3 * 1024 ** 3) == "3.0 GiB"
+
+    def test_choose_strategy_prefers_fastest_fit(self):
+        """Test that the fastest strategy within budget is chosen"""
+        estimate = make_estimate(1000, 500, 100)
+
+        assert choose_strategy(estimate) == IN_MEMORY
+        assert choose_strategy(estimate, budget=2000) == IN_MEMORY
+        assert choose_strategy(estimate, budget=600) == STREAMING
+        assert choose_strategy(estimate, budget=100) == TILED
+        assert choose_strategy(estimate, budget=600, allowed=[IN_MEMORY, TILED]) == TILED
+
+    def test_choose_strategy_refuses_with_estimate(self):
+        """Test that an unsatisfiable budget is refused with the estimate"""
+        with pytest.raises(MemoryBudgetError) as error:
+            choose_strategy(make_estimate(1000, 500, 100), budget=50)
+
+        assert "10 points" in str(error.value)
+        assert "streaming" in str(error.value)
+
+    @pytest.mark.parametrize("algorithm,units", [
+        (KochSnowflake(size=100, recursion_depth=5), 3 * 4 ** 5),
+        (SierpinskiGasket(size=100, recursion_depth=5), 3 ** 5),
+        (SierpinskiArrowhead(size=100, recursion_depth=5), 3 ** 5 + 1),
+        (MandelbrotSet(size=40, max_iterations=30), 1600),
+    ])
+    def test_estimates_match_generated_counts(self, algorithm, units):
+        """Test that predicted unit counts match what is generated"""
+        estimate = algorithm.estimate_cost()
+        data = algorithm.generate()
+
+        assert estimate["units"] == units
+        assert estimate["units"] == (len(data) if estimate["unit"] != "pixels" else len(data) * len(data[0]))
+        assert estimate["seconds"] > 0
+        assert estimate["memory_bytes"][STREAMING] < estimate["memory_bytes"][IN_MEMORY]
+
+    def test_estimates_grow_exponentially_with_depth(self):
+        """Test that depth drives the in-memory estimate for line fractals"""
+        shallow = KochSnowflake(size=100, recursion_depth=6).estimate_cost()
+        deep = KochSnowflake(size=100, recursion_depth=12).estimate_cost()
+
+        assert deep["units"] == shallow["units"] * 4 ** 6
+        assert deep["memory_bytes"][IN_MEMORY] > 100 * shallow["memory_bytes"][IN_MEMORY]
+        # Streaming memory does not depend on depth
+        assert deep["memory_bytes"][STREAMING] == shallow["memory_bytes"][STREAMING]
+
+    def test_mandelbrot_estimate_caps_sampled_iterations(self):
+        """Test that samples stop at the cap and count as in the set when they reach it"""
+        limit = 10 ** 7
+        capped = MandelbrotSet(size=40, max_iterations=limit)
+        at_cap = MandelbrotSet(size=40, max_iterations=capped.ESTIMATE_ITERATION_CAP)
+        # The 16 x 16 sample grid at the cap, with interior samples scaled up to the full limit
+        coordinates = sorted({int(i * 40 / 16) for i in range(16)})
+        counts = [at_cap.point_iteration(*at_cap.pixel_to_complex(x, y)) for y in coordinates for x in coordinates]
+        expected = sum(limit if count == at_cap.max_iterations else count for count in counts) / len(counts)
+
+        assert capped.estimate_mean_iterations() == expected
+
+    @pytest.mark.skipif(sys.platform != "linux", reason="ru_maxrss is reported in KiB on Linux")
+    @pytest.mark.parametrize("algorithm_class,depth", [
+        (KochSnowflake, 9), (SierpinskiGasket, 11), (SierpinskiArrowhead, 12),
+    ])
+    def test_in_memory_estimate_covers_measured_render_peak(self, algorithm_class, depth):
+        """Test that the in-memory estimate covers the peak resident memory of generating and rasterizing"""
+        script = (
+            "import resource, main\n"
+            f"from {algorithm_class.__module__} import {algorithm_class.__name__}\n"
+            f"algorithm = {algorithm_class.__name__}(size=500, recursion_depth={depth})\n"
+            "algorithm.render_image(algorithm.generate())\n"
+            "print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024)\n"
+        )
+        result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True)
+        peak = int(result.stdout)
+
+        estimate = algorithm_class(size=500, recursion_depth=depth).estimate_cost()
+        # At this depth the points, not the fixed overhead, dominate the peak
+        assert peak > 2 * BASE_OVERHEAD_BYTES
+        assert peak < estimate["memory_bytes"][IN_MEMORY] < peak * 1.5
@@ -0,0 +1,212 @@
+# ABOUTME: Unit tests for distributed tile rendering over local sockets
+# ABOUTME: Tests the wire protocol, multi-process workers and reassignment of dead or stalled workers' tiles
+
+import io
+import json
+import multiprocessing
+import socket
+import threading
+import zlib
+import pytest
+from PIL import Image
+from distributed import (
+    HEADER_LENGTH, MAX_HEADER_BYTES, MAX_PAYLOAD_BYTES, ProtocolError, DistributedRenderError, parse_address,
+    write_message, read_message, connect, inflate, render_distributed, run_worker
+)
+from koch_snowflake import KochSnowflake
+from sierpinski_gasket import SierpinskiGasket
+from coloring import SMOOTH
+from mandelbrot_set import MandelbrotSet
+
+
+class CoordinatorThread:
+    """Run render_distributed on a background thread and capture its address and outcome"""
+
+    def __init__(self, algorithm, output, **options):
+        self.listening = threading.Event()
+        self.error = None
+        self.thread = threading.Thread(target=self.run, args=(algorithm, output), kwargs=options)
+        self.thread.start()
+        assert self.listening.wait(10)
+
+    def run(self, algorithm, output, **options):
+        try:
+            render_distributed(algorithm, output, "localhost:0", on_listen=self.listen, **options)
+        except Exception as error:
+            self.error = error
+            self.listening.set()
+
+    def listen(self, address):
+        self.address = address
+        self.listening.set()
+
+    def join(self):
+        self.thread.join(30)
+        assert not self.thread.is_alive()
+
+
+def claim_one_tile(address):
+    """Connect as a worker, lease a tile and return the open socket without answering"""
+    sock = connect(address)
+    rfile, wfile = sock.makefile("rb"), sock.makefile("wb")
+    write_message(wfile, {"type": "hello"})
+    assert read_message(rfile)[0]["type"] == "job"
+    assert read_message(rfile)[0]["type"] == "tile"
+    return sock, rfile, wfile
+
+
+def assert_matches_render(algorithm, output):
+    """Check a distributed render against a single-canvas render"""
+    expected = algorithm.render_image(algorithm.generate())
+    with Image.open(output) as rendered:
+        assert rendered.convert('RGB').tobytes() == expected.tobytes()
+
+
+class TestDistributed:
+
+    def test_parse_address(self):
+        """Test parsing TCP and Unix socket addresses"""
+        assert parse_address("render-1:7000")[1] == ("render-1", 7000)
+        assert parse_address(":7000")[1] == ("localhost", 7000)
+        assert parse_address("unix:/tmp/render.sock")[1] == "/tmp/render.sock"
+        with pytest.raises(ValueError):
+            parse_address("render-1")
+
+    def test_message_round_trip(self):
+        """Test framing headers with binary payloads"""
+        stream = io.BytesIO()
+        write_message(stream, {"type": "tile", "box": [0, 0, 4, 4]}, b"\x00\x01\x02")
+        write_message(stream, {"type": "done"})
+        stream.seek(0)
+
+        assert read_message(stream) == ({"type": "tile", "box": [0, 0, 4, 4], "length": 3}, b"\x00\x01\x02")
+        assert read_message(stream) == ({"type": "done", "length": 0}, b"")
+        assert read_message(stream) is None
+
+    def test_truncated_message_is_a_protocol_error(self):
+        """Test that a message cut off mid-payload is rejected"""
+        stream = io.BytesIO()
+        write_message(stream, {"type": "result"}, b"pixels")
+
+        with pytest.raises(ProtocolError):
+            read_message(io.BytesIO(stream.getvalue()[:-2]))
+
+    def test_oversized_lengths_are_protocol_errors(self):
+        """Test that announced header and payload sizes are capped before anything is read"""
+        with pytest.raises(ProtocolError):
+            read_message(io.BytesIO(HEADER_LENGTH.pack(MAX_HEADER_BYTES + 1)))
+
+        header = json.dumps({"type": "result", "length": MAX_PAYLOAD_BYTES + 1}).encode()
+        with pytest.raises(ProtocolError):
+            read_message(io.BytesIO(HEADER_LENGTH.pack(len(header)) + header))
+
+    def test_inflate_limits_output(self):
+        """Test that payloads inflating past the limit or cut short are rejected"""
+        data = zlib.compress(b"\x00" * 10000)
+
+        assert inflate(data, 10000) == b"\x00" * 10000
+        with pytest.raises(ProtocolError):
+            inflate(data, 9999)
+        with pytest.raises(ProtocolError):
+            inflate(data[:-4], 10000)
+
+    def test_worker_rejects_a_first_message_that_is_not_a_job(self):
+        """Test that a worker raises ProtocolError rather than KeyError on an unexpected first message"""
+        server = socket.create_server(("localhost", 0))
+        port = server.getsockname()[1]
+
+        def reply_done():
+            connection, _ = server.accept()
+            with connection, connection.makefile("rb") as rfile, connection.makefile("wb") as wfile:
+                read_message(rfile)
+                write_message(wfile, {"type": "done"})
+
+        thread = threading.Thread(target=reply_done)
+        thread.start()
+        with server:
+            with pytest.raises(ProtocolError):
+                run_worker(f"localhost:{port}")
+            thread.join(10)
+
+    @pytest.mark.parametrize("algorithm", [
+        MandelbrotSet(size=90, max_iterations=40),
+        MandelbrotSet(size=90, max_iterations=40, coloring=SMOOTH),
+        KochSnowflake(size=200, recursion_depth=4),
+        SierpinskiGasket(size=200, recursion_depth=4),
+    ])
+    def test_worker_processes_render_identical_image(self, tmp_path, algorithm):
+        """Test a render spread over several worker processes"""
+        output = tmp_path / "distributed.png"
+        coordinator = CoordinatorThread(algorithm, str(output), tile_size=32)
+
+        workers = [multiprocessing.Process(target=run_worker, args=(coordinator.address,)) for _ in range(3)]
+        for process in workers:
+            process.start()
+        coordinator.join()
+        for process in workers:
+            process.join(10)
+
+        assert coordinator.error is None
+        assert_matches_render(algorithm, output)
+
+    def test_tiles_of_dead_worker_are_reassigned(self, tmp_path):
+        """Test that a worker disconnecting mid-tile loses its lease to another worker"""
+        mandelbrot = MandelbrotSet(size=64, max_iterations=30)
+        output = tmp_path / "distributed.ppm"
+        coordinator = CoordinatorThread(mandelbrot, str(output), tile_size=32)
+
+        sock, rfile, wfile = claim_one_tile(coordinator.address)
+        sock.shutdown(socket.SHUT_RDWR)
+        sock.close()
+        assert run_worker(coordinator.address) == 4
+        coordinator.join()
+
+        assert coordinator.error is None
+        assert_matches_render(mandelbrot, output)
+
+    def test_tiles_of_stalled_worker_are_reassigned(self, tmp_path):
+        """Test that a worker holding a tile past its lease is worked around"""
+        koch = KochSnowflake(size=100, recursion_depth=3)
+        output = tmp_path / "distributed.png"
+        coordinator = CoordinatorThread(koch, str(output), tile_size=50, lease_timeout=0.5)
+
+        sock, rfile, wfile = claim_one_tile(coordinator.address)
+        try:
+            run_worker(coordinator.address)
+            coordinator.join()
+        finally:
+            sock.close()
+
+        assert coordinator.error is None
+        assert_matches_render(koch, output)
+
+    def test_result_inflating_past_the_tile_size_fails_the_tile(self, tmp_path):
+        """Test that a worker cannot make the coordinator inflate more than one tile of pixels"""
+        coordinator = CoordinatorThread(MandelbrotSet(size=32, max_iterations=10), str(tmp_path / "bomb.png"),
+                                        tile_size=32, max_attempts=1)
+
+        sock, rfile, wfile = claim_one_tile(coordinator.address)
+        with sock:
+            write_message(wfile, {"type": "result"}, zlib.compress(b"\x00" * (32 * 32 * 3 * 100)))
+            assert read_message(rfile)[0]["type"] == "done"
+        coordinator.join()
+
+        assert isinstance(coordinator.error, DistributedRenderError)
+        assert "inflates past" in str(coordinator.error)
+
+    def test_tile_failing_everywhere_aborts_render(self, tmp_path):
+        """Test that a tile failing max_attempts times raises instead of retrying forever"""
+        coordinator = CoordinatorThread(MandelbrotSet(size=32, max_iterations=10), str(tmp_path / "failed.png"),
+                                        tile_size=32, max_attempts=2)
+
+        sock, rfile, wfile = claim_one_tile(coordinator.address)
+        with sock:
+            # The retried tile comes straight back to the only worker
+            write_message(wfile, {"type": "error", "message": "out of memory"})
+            assert read_message(rfile)[0]["type"] == "tile"
+            write_message(wfile, {"type": "error", "message": "out of memory"})
+            assert read_message(rfile)[0]["type"] == "done"
+        coordinator.join()
+
+        assert isinstance(coordinator.error, DistributedRenderError)
+        assert "out of memory" in str(coordinator.error)
@@ -0,0 +1,137 @@
+# ABOUTME: Unit tests for the configurable image encoders and raw output formats
+# ABOUTME: Tests parallel PNG strips, JPEG options, PPM/PGM, raw RGB and .npy output
+
+import pytest
+import ast
+import io
+import struct
+from array import array
+from PIL import Image, ImageDraw
+from encoders import ImageEncoder, PNGStreamWriter, write_png_parallel, write_npy
+from mandelbrot_set import MandelbrotSet
+
+
+def sample_image(size=97):
+    """Build a small image with some structure to compress"""
+    image = Image.new('RGB', (size, size), 'white')
+    draw = ImageDraw.Draw(image)
+    draw.ellipse((10, 10, size - 10, size - 10), fill=(200, 30, 90))
+    draw.line((0, 0, size, size), fill='black', width=3)
+    return image
+
+
+def read_npy(filename):
+    """Parse a .npy file's header and return it with the raw payload"""
+    with open(filename, "rb") as handle:
+        content = handle.read()
+    assert content[:8] == b"\x93NUMPY\x01\x00"
+    header_length = struct.unpack("<H", content[8:10])[0]
+    assert (10 + header_length) % 64 == 0
+    header = ast.literal_eval(content[10:10 + header_length].decode("latin1"))
+    return header, content[10 + header_length:]
+
+
+class TestEncoders:
+
+    @pytest.mark.parametrize("threads", [1, 3])
+    def test_parallel_png_is_lossless(self, tmp_path, threads):
+        """Test that strip-parallel PNG output decodes to the same pixels"""
+        image = sample_image()
+        output = tmp_path / "parallel.png"
+        write_png_parallel(image, str(output), compress_level=1, threads=threads, strip_rows=10)
+
+        with Image.open(output) as decoded:
+            assert decoded.format == 'PNG'
+            assert decoded.tobytes() == image.tobytes()
+
+    def test_png_stream_writer_rejects_partial_rows(self):
+        """Test that the streaming writer checks row boundaries and counts"""
+        writer = PNGStreamWriter(io.BytesIO(), 4, 2, "L")
+        with pytest.raises(ValueError):
+            writer.write_rows(b"\x00" * 5)
+        writer.write_rows(b"\x00" * 4)
+        with pytest.raises(ValueError):
+            writer.close()
+
+    def test_png_compress_level(self, tmp_path):
+        """Test that lower compression levels produce larger files"""
+        image = sample_image(200)
+        fast = tmp_path / "fast.png"
+        small = tmp_path / "small.png"
+        ImageEncoder(png_compress_level=0).save(image, str(fast))
+        ImageEncoder(png_compress_level=9).save(image, str(small))
+
+        assert fast.stat().st_size > small.stat().st_size
+
+    @pytest.mark.parametrize("threads", [1, 2])
+    def test_png_text_metadata(self, tmp_path, threads):
+        """Test that text metadata is stored in PNG files written serially or in parallel strips"""
+        output = str(tmp_path / "text.png")
+        ImageEncoder(threads=threads).save(sample_image(), output, text={"recursion_depth": 5, "deadline": 0.5})
+
+        with Image.open(output) as decoded:
+            assert decoded.text == {"recursion_depth": "5", "deadline": "0.5"}
+
+    def test_jpeg_comment_metadata(self, tmp_path):
+        """Test that text metadata becomes the JPEG comment"""
+        output = str(tmp_path / "text.jpg")
+        ImageEncoder().save(sample_image(), output, text={"max_iterations": 64})
+
+        with Image.open(output) as decoded:
+            assert decoded.info["comment"] == b"max_iterations: 64"
+
+    def test_jpeg_quality_and_subsampling(self, tmp_path):
+        """Test that JPEG quality and subsampling options are applied"""
+        image = sample_image(200)
+        low = tmp_path / "low.jpg"
+        high = tmp_path / "high.jpg"
+        ImageEncoder(jpeg_quality=10, jpeg_subsampling="4:2:0").save(image, str(low))
+        ImageEncoder(jpeg_quality=95, jpeg_subsampling="4:4:4").save(image, str(high))
+
+        assert low.stat().st_size < high.stat().st_size
+        with Image.open(low) as decoded:
+            assert decoded.format == 'JPEG'
+
+    def test_raw_formats(self, tmp_path):
+        """Test the zero-encode PPM, PGM and raw RGB outputs"""
+        image = sample_image(20)
+        encoder = ImageEncoder()
+        encoder.save(image, str(tmp_path / "image.ppm"))
+        encoder.save(image, str(tmp_path / "image.pgm"))
+        encoder.save(image, str(tmp_path / "image.raw"))
+
+        with Image.open(tmp_path / "image.ppm") as ppm:
+            assert ppm.mode == 'RGB'
+            assert ppm.tobytes() == image.tobytes()
+        with Image.open(tmp_path / "image.pgm") as pgm:
+            assert pgm.mode == 'L'
+        assert (tmp_path / "image.raw").read_bytes() == image.tobytes()
+
+    def test_write_npy(self, tmp_path):
+        """Test writing an array as .npy with the right header"""
+        output = tmp_path / "data.npy"
+        write_npy(str(output), array('i', range(6)), (2, 3))
+
+        header, payload = read_npy(str(output))
+        assert header["shape"] == (2, 3)
+        assert header["fortran_order"] is False
+        assert header["descr"] == "<i4"
+        assert array('i', payload) == array('i', range(6))
+
+    def test_render_npy_skips_rasterization(self, tmp_path):
+        """Test that .npy output writes the iteration matrix"""
+        mandelbrot = MandelbrotSet(size=12, max_iterations=15)
+        output = tmp_path / "iterations.npy"
+        data = mandelbrot.render(str(output))
+
+        header, payload = read_npy(str(output))
+        assert header["shape"] == (12, 12)
+        assert list(array('i', payload)) == [value for row in data for value in row]
+
+    def test_npy_loads_with_numpy(self, tmp_path):
+        """Test that numpy reads the hand-written .npy files"""
+        numpy = pytest.importorskip("numpy")
+        output = tmp_path / "points.npy"
+        write_npy(str(output), array('d', [0.5, 1.5, 2.5, 3.5]), (2, 2))
+
+        assert numpy.load(output).tolist() == [[0.5, 1.5], [2.5, 3.5]]
@@ -0,0 +1,112 @@
+# ABOUTME: Unit tests for the selectable compute engines and the reference cross-check
+# ABOUTME: Tests that fast engines agree with the reference code and that verification reports divergence
+
+import pytest
+from coloring import SMOOTH
+from engines import REFERENCE, FAST, check_engine, max_divergence, verify_engine, format_verification
+from koch_snowflake import KochSnowflake
+from sierpinski_gasket import SierpinskiGasket
+from sierpinski_arrowhead import SierpinskiArrowhead
+from mandelbrot_set import MandelbrotSet
+
+
+def flatten(data):
+    """Flatten nested points or rows into one list of numbers"""
+    if isinstance(data, (int, float)):
+        return [data]
+    return [value for item in data for value in flatten(item)]
+
+
+def flatten_points(data):
+    """Flatten triangles into their points, leaving point lists unchanged"""
+    if data and isinstance(data[0], list):
+        return [point for triangle in data for point in triangle]
+    return data
+
+
+class TestEngines:
+
+    def test_check_engine(self):
+        """Test that unknown engines are rejected"""
+        assert check_engine(FAST) == FAST
+        with pytest.raises(ValueError):
+            check_engine("gpu")
+        with pytest.raises(ValueError):
+            KochSnowflake(size=10, engine="gpu")
+
+    def test_max_divergence(self):
+        """Test the largest absolute difference between engine outputs"""
+        assert max_divergence([1, 2.5, 3], [1, 2.0, 3.25]) == 0.5
+        assert max_divergence([], []) == 0
+        with pytest.raises(ValueError):
+            max_divergence([1], [1, 2])
+
+    @pytest.mark.parametrize("view", [
+        {"size": 80, "max_iterations": 100},
+        {"size": 64, "center_real": -0.745, "center_imag": 0.11, "zoom": 40, "max_iterations": 400},
+    ])
+    def test_fast_mandelbrot_matches_reference_exactly(self, view):
+        """Test that the inlined loop and bulb checks give identical iteration counts"""
+        assert MandelbrotSet(engine=FAST, **view).generate() == MandelbrotSet(**view).generate()
+
+    def test_fast_gasket_matches_reference_exactly(self):
+        """Test that the fast subdivision gives identical triangles"""
+        assert SierpinskiGasket(size=300, recursion_depth=5, engine=FAST).generate() == \
+            SierpinskiGasket(size=300, recursion_depth=5).generate()
+
+    @pytest.mark.parametrize("algorithm_class", [KochSnowflake, SierpinskiArrowhead])
+    def test_fast_curves_match_reference_closely(self, algorithm_class):
+        """Test that the fast curve engines only differ by rounding"""
+        reference = algorithm_class(size=500, recursion_depth=5).generate()
+        fast = algorithm_class(size=500, recursion_depth=5, engine=FAST).generate()
+
+        assert max_divergence(flatten(reference), flatten(fast)) < 1e-9
+
+    @pytest.mark.parametrize("algorithm_class", [KochSnowflake, SierpinskiGasket])
+    def test_fast_streaming_matches_generate(self, algorithm_class):
+        """Test that the streaming paths use the same fast kernel"""
+        algorithm = algorithm_class(size=200, recursion_depth=3, engine=FAST)
+        streamed = [point for points, closed in algorithm.iter_paths() for point in points]
+
+        assert streamed == flatten_points(algorithm.generate())
+
+    @pytest.mark.parametrize("algorithm", [
+        KochSnowflake(size=300, recursion_depth=7),
+        SierpinskiGasket(size=300, recursion_depth=7),
+        SierpinskiArrowhead(size=300, recursion_depth=7),
+        MandelbrotSet(size=200, max_iterations=80),
+    ])
+    def test_verify_engine_report(self, algorithm):
+        """Test that verification samples the kernel and reports divergence and speedup"""
+        report = verify_engine(algorithm, FAST, samples=500)
+
+        assert report["engine"] == FAST
+        assert 0 < report["samples"] <= 2500
+        assert report["max_divergence"] < 1e-9
+        assert report["unit"] == algorithm.KERNEL_UNIT
+        assert report["speedup"] > 0
+        assert "fast vs reference" in format_verification(report)
+
+    def test_mandelbrot_kernel_samples_whole_rows(self):
+        """Test that sampled pixels are whole rows, computed a row per call like a render"""
+        algorithm = MandelbrotSet(size=50, max_iterations=30)
+        inputs = algorithm.sample_kernel_inputs(200)
+        data = algorithm.generate()
+
+        assert sorted({y for _, y in inputs}) == [0, 12, 25, 37]
+        assert algorithm.run_kernel(FAST, inputs) == [data[y][x] for x, y in inputs]
+        strided = [(x, 20) for x in range(3, 50, 4)]
+        assert algorithm.run_kernel(FAST, strided) == [data[20][x] for x, _ in strided]
+
+    def test_reference_verifies_against_itself(self):
+        """Test that verifying the reference engine finds no divergence"""
+        report = verify_engine(MandelbrotSet(size=50, max_iterations=30), REFERENCE, samples=100)
+
+        assert report["max_divergence"] == 0
+
+    def test_smooth_colouring_rejects_other_engines(self):
+        """Test that smooth colouring neither ignores an engine nor verifies itself against itself"""
+        with pytest.raises(ValueError):
+            MandelbrotSet(size=10, engine=FAST, coloring=SMOOTH)
+        with pytest.raises(ValueError):
+            verify_engine(MandelbrotSet(size=10, coloring=SMOOTH), FAST, samples=10)
@@ -0,0 +1,82 @@
+# ABOUTME: Unit tests for instanced rendering of the self-similar line fractals
+# ABOUTME: Tests that stamped copies reproduce the directly drawn image within a pixel at far lower cost
+
+import pytest
+from PIL import ImageChops, ImageFilter
+from instancing import InstancedRenderer, draw_mask, render_instanced
+from koch_snowflake import KochSnowflake
+from sierpinski_gasket import SierpinskiGasket
+
+
+def ink(image):
+    """Return the set of dark pixel coordinates of an image"""
+    grey = image.convert('L')
+    return {(x, y) for y in range(grey.height) for x in range(grey.width) if grey.getpixel((x, y)) < 128}
+
+
+def count_rasterized_leaves(algorithm):
+    """Wrap primitive_paths to count the leaf primitives actually drawn"""
+    drawn = []
+    primitive_paths = algorithm.primitive_paths
+
+    def counting(primitive, depth):
+        drawn.append(algorithm.INSTANCE_BRANCHING ** depth)
+        return primitive_paths(primitive, depth)
+
+    algorithm.primitive_paths = counting
+    return drawn
+
+
+class TestInstancing:
+
+    def test_draw_mask_matches_direct_drawing(self):
+        """Test that a mask holds the same pixels as drawing on the full canvas"""
+        gasket = SierpinskiGasket(size=120, recursion_depth=3)
+        mask, left, top = draw_mask(gasket.iter_paths(), gasket.line_width)
+
+        shifted = {(x + left, y + top) for x, y in ink(ImageChops.invert(mask))}
+        assert shifted == ink(gasket.render_image_streaming())
+
+    @pytest.mark.parametrize("algorithm", [
+        SierpinskiGasket(size=400, recursion_depth=7),
+        KochSnowflake(size=400, recursion_depth=5),
+    ])
+    def test_instanced_render_is_within_a_pixel_of_direct_render(self, algorithm):
+        """Test that every stamped line pixel lies within a pixel of a drawn one and vice versa"""
+        direct = algorithm.render_image_streaming()
+        instanced = InstancedRenderer(algorithm, direct_leaves=27).render_image()
+
+        # Dilating one image by a pixel must cover the other
+        grown_direct = ink(direct.convert('L').filter(ImageFilter.MinFilter(3)))
+        grown_instanced = ink(instanced.convert('L').filter(ImageFilter.MinFilter(3)))
+        assert ink(instanced) <= grown_direct
+        assert ink(direct) <= grown_instanced
+
+    def test_sub_patterns_are_rasterized_once_per_orientation(self):
+        """Test that the Koch curve draws one motif per edge direction and depth"""
+        snowflake = KochSnowflake(size=400, recursion_depth=8)
+        drawn = count_rasterized_leaves(snowflake)
+        renderer = InstancedRenderer(snowflake, direct_leaves=64)
+        renderer.render_image()
+
+        assert len({key for key, _ in renderer.stamps}) == 6
+        # Far fewer leaves are drawn than the 3 * 4 ** 8 edges of the snowflake
+        assert sum(drawn) <= 6 * 64
+
+    def test_high_depths_stay_cheap(self):
+        """Test that a gasket too deep to draw directly still renders"""
+        gasket = SierpinskiGasket(size=300, recursion_depth=30)
+        drawn = count_rasterized_leaves(gasket)
+        image = InstancedRenderer(gasket).render_image()
+
+        assert image.size == (300, 300)
+        assert sum(drawn) <= 4096
+
+    def test_small_renders_are_drawn_directly(self, tmp_path):
+        """Test that renders below the instancing threshold match the normal render exactly"""
+        gasket = SierpinskiGasket(size=100, recursion_depth=3)
+        output = tmp_path / "gasket.png"
+        image = render_instanced(gasket, str(output))
+
+        assert output.exists()
+        assert image.tobytes() == gasket.render_image(gasket.generate()).tobytes()
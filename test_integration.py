@@ -158,4 +158,28 @@ def test_mandelbrot_set_integration():
                 
         finally:
             if os.path.exists(tmp.name):
-                os.unlink(tmp.name)
\ No newline at end of file
+                os.unlink(tmp.name)
+
+def test_koch_snowflake_svg_integration():
+    """Test streaming a Koch snowflake to SVG from the CLI"""
+    with tempfile.NamedTemporaryFile(suffix='.svg', delete=False) as tmp:
+        try:
+            result = subprocess.run([
+                sys.executable, "main.py", "koch-snowflake",
+                "--recursion-depth", "4",
+                "--size", "300",
+                "--vector-precision", "1",
+                "--output", tmp.name
+            ], capture_output=True, text=True)
+            
+            assert result.returncode == 0
+            assert result.stderr == ""
+            
+            with open(tmp.name) as handle:
+                content = handle.read()
+            assert content.startswith("<svg")
+            assert content.rstrip().endswith("</svg>")
+            
+        finally:
+            if os.path.exists(tmp.name):
+                os.unlink(tmp.name)
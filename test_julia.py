@@ -0,0 +1,83 @@
+# ABOUTME: Unit tests for Julia sets and batched Julia parameter sweeps
+# ABOUTME: Tests the shared escape-time kernel, the c grid and contact sheets against single renders
+
+import pytest
+from PIL import Image
+from coloring import SMOOTH
+from distributed import plan_tiles
+from engines import FAST, verify_engine
+from julia import JuliaSet, c_grid, julia_filename, render_julia_sweep
+
+
+def single_render(c_real, c_imag, **options):
+    """Render one Julia set on its own"""
+    julia = JuliaSet(size=24, c_real=c_real, c_imag=c_imag, max_iterations=30, **options)
+    return Image.frombytes('RGB', (24, 24), julia.render_pixels())
+
+
+class TestJuliaSet:
+
+    def test_pixels_iterate_from_z_with_fixed_c(self):
+        """Test that Julia pixels start z at the pixel and keep c fixed"""
+        julia = JuliaSet(size=40, c_real=-0.8, c_imag=0.156, max_iterations=50)
+        real, imag = julia.pixel_to_complex(5, 7)
+
+        assert julia.compute_row(7, 5, 6) == [julia.escape_iteration(real, imag, -0.8, 0.156)]
+        # The Mandelbrot iteration is the same kernel started from z = 0
+        assert julia.mandelbrot_iteration(real, imag) == julia.escape_iteration(0, 0, real, imag)
+
+    def test_fast_engine_matches_reference(self):
+        """Test that the inlined row loop agrees with the reference kernel for Julia sets"""
+        julia = JuliaSet(size=60, c_real=0.285, c_imag=0.01, max_iterations=60)
+        assert verify_engine(julia, FAST, samples=400)["max_divergence"] == 0
+
+    def test_set_constant_resets_the_histogram(self):
+        """Test that switching c discards the previous c's colouring histogram"""
+        julia = JuliaSet(size=20, max_iterations=30, coloring=SMOOTH)
+        julia.render_pixels()
+        assert julia.cdf is not None
+
+        julia.set_constant(0.3, 0.5)
+        assert julia.julia_constant == (0.3, 0.5)
+        assert julia.cdf is None
+
+    def test_c_grid_samples_cell_centres_top_row_first(self):
+        """Test the c value of every contact sheet cell"""
+        grid = c_grid(2, 2, (-1.0, 1.0), (-1.0, 1.0))
+
+        assert grid == [(0, 0, -0.5, 0.5), (0, 1, 0.5, 0.5), (1, 0, -0.5, -0.5), (1, 1, 0.5, -0.5)]
+
+    def test_julia_filename(self):
+        """Test per-c filenames with and without the placeholder"""
+        assert julia_filename("julia_{index}.png", 3) == "julia_3.png"
+        assert julia_filename("out/julia.png", 12) == "out/julia_12.png"
+
+    @pytest.mark.parametrize("extension, workers", [(".png", 1), (".png", 2), (".jpg", 1)])
+    def test_contact_sheet_matches_single_renders(self, tmp_path, extension, workers):
+        """Test that every cell of the sheet is the Julia set of its c"""
+        output = str(tmp_path / f"sheet{extension}")
+        julia = JuliaSet(size=24, max_iterations=30)
+        render_julia_sweep(julia, 3, 2, (-1.0, 0.5), (-0.5, 0.5), output, workers=workers)
+
+        with Image.open(output) as sheet:
+            assert sheet.size == (72, 48)
+            if extension == ".png":
+                for row, column, c_real, c_imag in c_grid(3, 2, (-1.0, 0.5), (-0.5, 0.5)):
+                    cell = sheet.crop((column * 24, row * 24, column * 24 + 24, row * 24 + 24))
+                    assert cell.tobytes() == single_render(c_real, c_imag).tobytes()
+
+    def test_separate_images_per_c(self, tmp_path):
+        """Test that --separate style sweeps write one image per c with its own histogram"""
+        output = str(tmp_path / "julia_{index}.png")
+        julia = JuliaSet(size=24, max_iterations=30, coloring=SMOOTH)
+        filenames = render_julia_sweep(julia, 2, 1, (-1.0, 0.0), (0.0, 0.5), output, workers=1, separate=True)
+
+        assert filenames == [str(tmp_path / "julia_0.png"), str(tmp_path / "julia_1.png")]
+        for filename, (_, _, c_real, c_imag) in zip(filenames, c_grid(2, 1, (-1.0, 0.0), (0.0, 0.5))):
+            with Image.open(filename) as image:
+                assert image.tobytes() == single_render(c_real, c_imag, coloring=SMOOTH).tobytes()
+
+    def test_distributed_tiles_reject_julia_sets(self):
+        """Test that distributed jobs, which rebuild Mandelbrot views, refuse Julia sets"""
+        with pytest.raises(ValueError):
+            plan_tiles(JuliaSet(size=20), 10)
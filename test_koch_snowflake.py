@@ -54,4 +54,11 @@ class TestKochSnowflake:
         
         # First and last points should be the original endpoints
         assert new_points[0] == p1
-        assert new_points[4] == p2
\ No newline at end of file
+        assert new_points[4] == p2
+    
+    def test_iter_snowflake_matches_generate(self):
+        """Test that lazily streamed points match the generated list"""
+        koch = KochSnowflake(size=300)
+        
+        for depth in range(4):
+            assert list(koch.iter_snowflake(depth)) == koch.generate_snowflake(depth)
@@ -2,11 +2,20 @@
 # ABOUTME: Tests command line argument parsing and integration with art algorithms
 
 import pytest
+import socket
 import subprocess
 import sys
 import os
+import json
 from unittest.mock import patch, MagicMock
 import tempfile
+import threading
+import time
+from PIL import Image
+from cost_model import IN_MEMORY, TILED
+from distributed import read_message, write_message
+from main import select_strategy
+from mandelbrot_set import MandelbrotSet
 
 
 def test_main_cli_koch_snowflake():
@@ -101,4 +110,408 @@ def test_main_cli_invalid_algorithm():
     ], capture_output=True, text=True)
     
     assert result.returncode != 0
-    assert "No such command 'invalid-algorithm'" in result.stderr
\ No newline at end of file
+    assert "No such command 'invalid-algorithm'" in result.stderr
+
+def test_main_cli_profile_json():
+    """Test CLI per-stage profiling report in JSON"""
+    with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as tmp:
+        try:
+            result = subprocess.run([
+                sys.executable, "main.py", "sierpinski-gasket",
+                "--recursion-depth", "3",
+                "--size", "200",
+                "--output", tmp.name,
+                "--profile", "json"
+            ], capture_output=True, text=True)
+            
+            assert result.returncode == 0
+            report = json.loads(result.stdout)
+            stages = [stage["stage"] for stage in report["stages"]]
+            assert stages == ["generate", "rasterize", "encode"]
+        finally:
+            if os.path.exists(tmp.name):
+                os.unlink(tmp.name)
+
+
+def test_main_cli_raw_rgb_to_stdout():
+    """Test zero-encode raw RGB output to stdout"""
+    result = subprocess.run([
+        sys.executable, "main.py", "sierpinski-arrowhead",
+        "--recursion-depth", "2",
+        "--size", "40",
+        "--output", "-"
+    ], capture_output=True)
+    
+    assert result.returncode == 0
+    assert len(result.stdout) == 40 * 40 * 3
+
+
+def test_main_cli_memory_budget_refusal():
+    """Test that an impossible memory budget is refused before generating"""
+    result = subprocess.run([
+        sys.executable, "main.py", "sierpinski-gasket",
+        "--recursion-depth", "14",
+        "--size", "4000",
+        "--output", "never-written.png",
+        "--memory-budget", "1M"
+    ], capture_output=True, text=True)
+    
+    assert result.returncode != 0
+    assert "No execution strategy fits" in result.stderr
+    assert "4,782,969 triangles" in result.stderr
+    assert not os.path.exists("never-written.png")
+
+
+def test_main_cli_estimate_picks_strategy():
+    """Test that --estimate reports the strategy chosen for a budget"""
+    result = subprocess.run([
+        sys.executable, "main.py", "koch-snowflake",
+        "--recursion-depth", "10",
+        "--size", "1000",
+        "--output", "never-written.png",
+        "--memory-budget", "64M",
+        "--estimate"
+    ], capture_output=True, text=True)
+    
+    assert result.returncode == 0
+    assert "Strategy: streaming" in result.stdout
+    assert not os.path.exists("never-written.png")
+
+
+def test_main_cli_vector_output_uses_cost_model():
+    """Test that --estimate and --memory-budget apply to streamed vector output"""
+    estimate = subprocess.run([
+        sys.executable, "main.py", "koch-snowflake",
+        "--recursion-depth", "6",
+        "--size", "200",
+        "--output", "never-written.svg",
+        "--estimate"
+    ], capture_output=True, text=True)
+    refusal = subprocess.run([
+        sys.executable, "main.py", "koch-snowflake",
+        "--recursion-depth", "14",
+        "--size", "200",
+        "--output", "never-written.svg",
+        "--memory-budget", "1M"
+    ], capture_output=True, text=True)
+
+    assert estimate.returncode == 0
+    assert "Strategy: streaming" in estimate.stdout
+    assert refusal.returncode != 0
+    assert "No execution strategy fits" in refusal.stderr
+    assert not os.path.exists("never-written.svg")
+
+
+@pytest.mark.parametrize("flags", [["--tile-size", "32"], ["--distribute", "localhost:0"]])
+def test_main_cli_vector_output_rejects_tiling(flags):
+    """Test that vector output refuses --tile-size and --distribute instead of ignoring them"""
+    result = subprocess.run([
+        sys.executable, "main.py", "koch-snowflake",
+        "--recursion-depth", "2",
+        "--size", "50",
+        "--output", "never-written.svg",
+        *flags
+    ], capture_output=True, text=True, timeout=30)
+
+    assert result.returncode == 2
+    assert "cannot be tiled or distributed" in result.stderr
+    assert not os.path.exists("never-written.svg")
+
+
+def test_main_cli_depth_sweep():
+    """Test that --sweep writes one image per depth"""
+    with tempfile.TemporaryDirectory() as directory:
+        output = os.path.join(directory, "arrowhead-{depth}.png")
+        result = subprocess.run([
+            sys.executable, "main.py", "sierpinski-arrowhead",
+            "--recursion-depth", "3",
+            "--size", "100",
+            "--output", output,
+            "--sweep"
+        ], capture_output=True, text=True)
+        
+        assert result.returncode == 0
+        assert sorted(os.listdir(directory)) == [f"arrowhead-{depth}.png" for depth in range(4)]
+
+
+def test_main_cli_distributed_render():
+    """Test a coordinator and two worker processes on a local Unix socket"""
+    with tempfile.TemporaryDirectory() as directory:
+        output = os.path.join(directory, "mandelbrot.png")
+        address = "unix:" + os.path.join(directory, "coordinator.sock")
+        coordinator = subprocess.Popen([
+            sys.executable, "main.py", "mandelbrot-set",
+            "--num-iterations", "30",
+            "--size", "80",
+            "--tile-size", "32",
+            "--output", output,
+            "--distribute", address
+        ], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        workers = [subprocess.Popen([sys.executable, "main.py", "worker", address],
+                                    stdout=subprocess.PIPE, text=True) for _ in range(2)]
+        
+        assert coordinator.wait(timeout=60) == 0
+        rendered = [int(worker.communicate(timeout=60)[0].split()[1]) for worker in workers]
+        assert sum(rendered) >= 9
+        assert "Coordinating on" in coordinator.stderr.read()
+        coordinator.stderr.close()
+        coordinator.stdout.close()
+        assert os.path.exists(output)
+
+
+def test_main_cli_worker_reports_protocol_errors():
+    """Test that a worker given a malformed first message exits with an error instead of a traceback"""
+    server = socket.create_server(("localhost", 0))
+    port = server.getsockname()[1]
+
+    def reply_done():
+        connection, _ = server.accept()
+        with connection, connection.makefile("rb") as rfile, connection.makefile("wb") as wfile:
+            read_message(rfile)
+            write_message(wfile, {"type": "done"})
+
+    thread = threading.Thread(target=reply_done)
+    thread.start()
+    with server:
+        result = subprocess.run([sys.executable, "main.py", "worker", f"localhost:{port}"],
+                                capture_output=True, text=True, timeout=60)
+        thread.join(10)
+
+    assert result.returncode == 1
+    assert "Error: Expected a job message" in result.stderr
+    assert "Traceback" not in result.stderr
+
+
+def test_main_cli_verify_engine():
+    """Test that --verify reports divergence and speedup without rendering"""
+    result = subprocess.run([
+        sys.executable, "main.py", "mandelbrot-set",
+        "--num-iterations", "50",
+        "--size", "100",
+        "--output", "never-written.png",
+        "--verify"
+    ], capture_output=True, text=True)
+    
+    assert result.returncode == 0
+    assert "fast vs reference" in result.stdout
+    assert "max divergence 0 iterations" in result.stdout
+    assert not os.path.exists("never-written.png")
+
+
+def test_main_cli_pipeline():
+    """Test that --pipeline renders the same pixels as a sequential run"""
+    with tempfile.TemporaryDirectory() as directory:
+        outputs = [os.path.join(directory, name) for name in ["pipelined.png", "sequential.png"]]
+        for output, extra in zip(outputs, [["--pipeline"], []]):
+            result = subprocess.run([
+                sys.executable, "main.py", "mandelbrot-set",
+                "--num-iterations", "40",
+                "--size", "90",
+                "--output", output
+            ] + extra, capture_output=True, text=True)
+            assert result.returncode == 0
+        
+        with Image.open(outputs[0]) as pipelined, Image.open(outputs[1]) as sequential:
+            assert pipelined.tobytes() == sequential.tobytes()
+
+
+def test_main_cli_smooth_coloring_streams_bands():
+    """Test that smooth colouring works when bands are encoded as they are computed"""
+    with tempfile.TemporaryDirectory() as directory:
+        output = os.path.join(directory, "smooth.png")
+        result = subprocess.run([
+            sys.executable, "main.py", "mandelbrot-set",
+            "--num-iterations", "60",
+            "--size", "90",
+            "--coloring", "smooth",
+            "--tile-size", "16",
+            "--output", output
+        ], capture_output=True, text=True)
+        
+        assert result.returncode == 0
+        with Image.open(output) as image:
+            # Equalization spreads the escaped points over many more colours than iterations
+            assert len(image.getcolors(90 * 90)) > 60
+
+
+def test_main_cli_progressive_render():
+    """Test that --progressive reports each pass and ends with the normal render"""
+    with tempfile.TemporaryDirectory() as directory:
+        outputs = [os.path.join(directory, name) for name in ["progressive.png", "normal.png"]]
+        results = [subprocess.run([
+            sys.executable, "main.py", "mandelbrot-set",
+            "--num-iterations", "40",
+            "--size", "50",
+            "--output", output
+        ] + extra, capture_output=True, text=True) for output, extra in zip(outputs, [["--progressive"], []])]
+        
+        assert [result.returncode for result in results] == [0, 0]
+        assert [line.split()[2] for line in results[0].stdout.splitlines()] == ["8", "4", "2", "1"]
+        with Image.open(outputs[0]) as progressive, Image.open(outputs[1]) as normal:
+            assert progressive.tobytes() == normal.tobytes()
+
+
+def test_main_cli_instanced_render():
+    """Test that --instanced renders deep gaskets and rejects the arrowhead"""
+    with tempfile.TemporaryDirectory() as directory:
+        output = os.path.join(directory, "gasket.png")
+        result = subprocess.run([
+            sys.executable, "main.py", "sierpinski-gasket",
+            "--recursion-depth", "18",
+            "--size", "300",
+            "--instanced",
+            "--output", output
+        ], capture_output=True, text=True)
+        
+        assert result.returncode == 0
+        assert os.path.exists(output)
+        
+        result = subprocess.run([
+            sys.executable, "main.py", "sierpinski-arrowhead",
+            "--recursion-depth", "3",
+            "--size", "100",
+            "--instanced",
+            "--output", output
+        ], capture_output=True, text=True)
+        assert result.returncode != 0
+        assert "--instanced" in result.stderr
+
+
+def test_main_cli_julia_sweep():
+    """Test that julia-sweep writes a contact sheet of the whole grid"""
+    with tempfile.TemporaryDirectory() as directory:
+        output = os.path.join(directory, "sheet.png")
+        result = subprocess.run([
+            sys.executable, "main.py", "julia-sweep",
+            "--num-iterations", "30",
+            "--size", "20",
+            "--columns", "3",
+            "--rows", "2",
+            "--output", output
+        ], capture_output=True, text=True)
+        
+        assert result.returncode == 0
+        assert "Rendered 6 Julia sets" in result.stdout
+        with Image.open(output) as sheet:
+            assert sheet.size == (60, 40)
+
+
+def test_main_cli_julia_sweep_profile():
+    """Test that julia-sweep times rendering and encoding each row of cells"""
+    with tempfile.TemporaryDirectory() as directory:
+        result = subprocess.run([
+            sys.executable, "main.py", "julia-sweep",
+            "--num-iterations", "30",
+            "--size", "20",
+            "--columns", "3",
+            "--rows", "2",
+            "--workers", "1",
+            "--output", os.path.join(directory, "sheet.png"),
+            "--profile", "json"
+        ], capture_output=True, text=True)
+
+        assert result.returncode == 0
+        report = json.loads(result.stdout.split("\n", 1)[1])
+        assert [stage["stage"] for stage in report["stages"]] == [
+            "render row 0", "encode row 0", "render row 1", "encode row 1", "encode"]
+
+
+def test_main_cli_precision_needs_numpy_engine():
+    """Test that a precision other than float64 is a usage error without the numpy engine"""
+    with tempfile.TemporaryDirectory() as directory:
+        result = subprocess.run([
+            sys.executable, "main.py", "mandelbrot-set",
+            "--num-iterations", "10",
+            "--size", "20",
+            "--precision", "float32",
+            "--output", os.path.join(directory, "m.png")
+        ], capture_output=True, text=True)
+        assert result.returncode != 0
+        assert "numpy engine" in result.stderr
+
+
+def test_main_cli_deadline():
+    """Test that --deadline reports and records the depth it reached"""
+    with tempfile.TemporaryDirectory() as directory:
+        output = os.path.join(directory, "gasket.png")
+        result = subprocess.run([
+            sys.executable, "main.py", "sierpinski-gasket",
+            "--recursion-depth", "3",
+            "--size", "100",
+            "--deadline", "60",
+            "--output", output
+        ], capture_output=True, text=True)
+
+        assert result.returncode == 0
+        assert "Reached recursion depth 3 of 3" in result.stdout
+        with Image.open(output) as image:
+            assert image.text["recursion_depth"] == "3"
+
+        result = subprocess.run([
+            sys.executable, "main.py", "mandelbrot-set",
+            "--num-iterations", "50",
+            "--size", "50",
+            "--deadline", "1",
+            "--output", "-"
+        ], capture_output=True, text=True)
+        assert result.returncode != 0
+        assert "--deadline" in result.stderr
+
+
+
+def test_select_strategy_skips_estimate_without_budget():
+    """Test that the cost model is only sampled for a memory budget or --estimate"""
+    algorithm = MandelbrotSet(size=10, max_iterations=10 ** 9)
+    with patch.object(MandelbrotSet, "estimate_cost", side_effect=AssertionError("estimate_cost ran")):
+        assert select_strategy(algorithm, "m.png", None, None, 1, False) == IN_MEMORY
+        assert select_strategy(algorithm, "m.png", None, 64, 1, False) == TILED
+
+
+def test_main_cli_deadline_bounds_wall_time():
+    """Test that a high iteration cap does not make --deadline overrun"""
+    deadline = 0.5
+    with tempfile.TemporaryDirectory() as directory:
+        started = time.perf_counter()
+        subprocess.run([sys.executable, "main.py", "--help"], capture_output=True, check=True)
+        startup = time.perf_counter() - started
+
+        started = time.perf_counter()
+        result = subprocess.run([
+            sys.executable, "main.py", "mandelbrot-set",
+            "--num-iterations", "200000",
+            "--size", "100",
+            "--deadline", str(deadline),
+            "--output", os.path.join(directory, "m.png")
+        ], capture_output=True, text=True)
+        elapsed = time.perf_counter() - started
+
+        assert result.returncode == 0
+        # Allow for interpreter startup and some scheduling noise on top of the budget
+        assert elapsed < startup + deadline + 0.5
+
+
+def test_main_cli_verify_rejects_smooth_colouring():
+    """Test that --verify with smooth colouring is a usage error rather than a meaningless report"""
+    result = subprocess.run([
+        sys.executable, "main.py", "mandelbrot-set",
+        "--num-iterations", "20",
+        "--size", "20",
+        "--coloring", "smooth",
+        "--verify",
+        "--output", "unused.png"
+    ], capture_output=True, text=True)
+    assert result.returncode != 0
+    assert "smooth colouring" in result.stderr
+
+
+def test_main_cli_negative_vector_precision():
+    """Test that a negative --vector-precision is a usage error"""
+    result = subprocess.run([
+        sys.executable, "main.py", "koch-snowflake",
+        "--recursion-depth", "2",
+        "--size", "50",
+        "--vector-precision", "-1",
+        "--output", "unused.svg"
+    ], capture_output=True, text=True)
+    assert result.returncode == 2
+    assert "--vector-precision" in result.stderr
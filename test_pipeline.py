@@ -0,0 +1,127 @@
+# ABOUTME: Unit tests for pipelined rendering with overlapped stages
+# ABOUTME: Tests bounded queues and that pipelined output matches a sequential render
+
+import multiprocessing
+import os
+import threading
+import time
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from encoders import ImageEncoder
+from pipeline import ThreadedSink, bounded_map, get_from_process, render_pipelined
+from engines import FAST
+from koch_snowflake import KochSnowflake
+from sierpinski_gasket import SierpinskiGasket
+from sierpinski_arrowhead import SierpinskiArrowhead
+from mandelbrot_set import MandelbrotSet
+
+
+class FailingMandelbrotSet(MandelbrotSet):
+    """A Mandelbrot set whose rows past the first band fail to compute"""
+
+    def compute_row(self, y, left=0, right=None, step=1):
+        if y >= 64:
+            raise ArithmeticError(f"row {y} failed")
+        return super().compute_row(y, left, right, step)
+
+
+class TestPipeline:
+
+    def test_threaded_sink_applies_backpressure(self):
+        """Test that the producer blocks once the bounded queue is full"""
+        release = threading.Event()
+        consumed = []
+        sink = ThreadedSink(lambda item: (release.wait(), consumed.append(item)), maxsize=2)
+
+        producer = threading.Thread(target=lambda: [sink.put(item) for item in range(6)])
+        producer.start()
+        time.sleep(0.2)
+        # One item is being consumed and two are queued; the rest wait
+        assert producer.is_alive()
+
+        release.set()
+        producer.join(5)
+        sink.close()
+        assert consumed == list(range(6))
+
+    def test_threaded_sink_reraises_consumer_errors(self):
+        """Test that a failing consumer surfaces its error to the producer"""
+        sink = ThreadedSink(lambda item: 1 / item)
+        sink.put(0)
+        with pytest.raises(ZeroDivisionError):
+            sink.close()
+
+    def test_threaded_sink_stops_when_producer_dies(self):
+        """Test that the consumer thread does not wait forever for a producer that exited without closing"""
+        sinks = []
+        producer = threading.Thread(target=lambda: sinks.append(ThreadedSink(lambda item: None, poll_seconds=0.05)))
+        producer.start()
+        producer.join()
+
+        sinks[0].thread.join(timeout=5)
+        assert not sinks[0].thread.is_alive()
+        assert isinstance(sinks[0].error, RuntimeError)
+
+    def test_threaded_sink_abandon_skips_queued_items(self):
+        """Test that abandoning stops the consumer without consuming the rest of the queue"""
+        release = threading.Event()
+        consumed = []
+        sink = ThreadedSink(lambda item: (release.wait(), consumed.append(item)), maxsize=4)
+        for item in range(3):
+            sink.put(item)
+
+        # The consumer is still on the first item when the sink is abandoned
+        threading.Timer(0.1, release.set).start()
+        sink.abandon()
+        assert not sink.thread.is_alive()
+        assert consumed == [0]
+
+    def test_failed_band_stops_pipeline_threads(self, tmp_path):
+        """Test that a failing worker leaves neither the sink consumer nor the deflate threads running"""
+        before = set(threading.enumerate())
+        algorithm = FailingMandelbrotSet(size=200, max_iterations=20)
+
+        with pytest.raises(ArithmeticError):
+            render_pipelined(algorithm, str(tmp_path / "failed.png"), encoder=ImageEncoder(threads=2), workers=2)
+
+        assert [thread for thread in threading.enumerate() if thread not in before and thread.is_alive()] == []
+
+    def test_get_from_dead_process_raises(self):
+        """Test that a generator process dying without sending anything raises instead of hanging"""
+        context = multiprocessing.get_context("spawn")
+        items = context.Queue()
+        process = context.Process(target=os._exit, args=(3,))
+        process.start()
+
+        with pytest.raises(RuntimeError, match="code 3"):
+            get_from_process(process, items, poll_seconds=0.1)
+        process.join()
+
+    def test_bounded_map_limits_work_in_flight(self):
+        """Test that only in_flight items are submitted ahead of the consumer"""
+        submitted = []
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            results = bounded_map(executor, lambda value: submitted.append(value) or value * 2,
+                                  [(value,) for value in range(10)], in_flight=3)
+            assert next(results) == 0
+            time.sleep(0.1)
+            assert len(submitted) <= 3
+            assert list(results) == [value * 2 for value in range(1, 10)]
+
+    @pytest.mark.parametrize("algorithm", [
+        MandelbrotSet(size=130, max_iterations=60),
+        MandelbrotSet(size=70, max_iterations=200, engine=FAST),
+        KochSnowflake(size=200, recursion_depth=4),
+        SierpinskiGasket(size=200, recursion_depth=5),
+        SierpinskiArrowhead(size=200, recursion_depth=5),
+    ])
+    @pytest.mark.parametrize("extension", ["png", "ppm", "bmp"])
+    def test_pipelined_output_matches_sequential_render(self, tmp_path, algorithm, extension):
+        """Test that overlapping the stages does not change the image"""
+        output = tmp_path / f"pipelined.{extension}"
+        render_pipelined(algorithm, str(output), workers=2)
+
+        expected = algorithm.render_image(algorithm.generate())
+        with Image.open(output) as rendered:
+            assert rendered.convert('RGB').tobytes() == expected.tobytes()
@@ -0,0 +1,98 @@
+# ABOUTME: Unit tests for precision selection and the numpy escape-time engine
+# ABOUTME: Tests that each view gets the narrowest safe precision and that numpy counts match the reference
+
+import pytest
+from coloring import SMOOTH
+from engines import FAST, NUMPY
+from julia import JuliaSet
+from koch_snowflake import KochSnowflake
+from mandelbrot_set import MandelbrotSet
+from precision import AUTO, EXTENDED, FLOAT32, FLOAT64, check_precision, mantissa_bits, select_precision
+
+
+class TestSelectPrecision:
+
+    def test_check_precision(self):
+        """Test that unknown precisions are rejected"""
+        assert check_precision(AUTO) == AUTO
+        assert check_precision(FLOAT32) == FLOAT32
+        with pytest.raises(ValueError):
+            check_precision("float16")
+
+    def test_mantissa_bits(self):
+        """Test the significant bits of the fixed-width precisions"""
+        assert mantissa_bits(FLOAT32) == 24
+        assert mantissa_bits(FLOAT64) == 53
+        assert mantissa_bits(EXTENDED) >= 53
+
+    def test_shallow_views_with_few_iterations_use_float32(self):
+        """Test that float32 is only chosen while the orbit cannot amplify its rounding past a pixel"""
+        assert select_precision(1, 100, 10) == FLOAT32
+        assert select_precision(1, 1000, 100) == FLOAT64
+
+    def test_deeper_zooms_widen_the_precision(self):
+        """Test that precision widens as the pixel spacing shrinks"""
+        assert select_precision(1, 100, 10) == FLOAT32
+        assert select_precision(1e3, 100, 10) == FLOAT64
+        assert select_precision(1e10, 1000, 100) == FLOAT64
+        assert select_precision(1e14, 1000, 100) == EXTENDED
+
+    def test_precision_needs_the_numpy_engine(self):
+        """Test that Python engines, which compute in doubles, reject other precisions"""
+        assert MandelbrotSet(size=10, engine=FAST, precision=FLOAT64).precision == FLOAT64
+        with pytest.raises(ValueError):
+            MandelbrotSet(size=10, engine=FAST, precision=FLOAT32)
+
+    def test_realistic_iteration_limits_use_float64(self):
+        """Test that float32 is out of reach once a render has more than a handful of iterations"""
+        assert select_precision(1, 800, 16) == FLOAT64
+        assert select_precision(1, 100, 1000) == FLOAT64
+
+    def test_smooth_colouring_rejects_the_numpy_engine(self):
+        """Test that smooth colouring, computed in Python floats, does not silently ignore the numpy engine"""
+        with pytest.raises(ValueError):
+            MandelbrotSet(size=10, engine=NUMPY, coloring=SMOOTH, precision=FLOAT32)
+        with pytest.raises(ValueError):
+            MandelbrotSet(size=10, engine=NUMPY, coloring=SMOOTH)
+
+    def test_line_fractals_reject_the_numpy_engine(self):
+        """Test that only escape-time fractals offer the numpy engine"""
+        with pytest.raises(ValueError):
+            KochSnowflake(size=10, engine=NUMPY)
+
+
+class TestNumpyEngine:
+
+    @pytest.fixture(autouse=True)
+    def require_numpy(self):
+        pytest.importorskip("numpy")
+
+    def test_float64_matches_reference(self):
+        """Test that float64 arrays give exactly the reference counts"""
+        view = dict(size=60, center_real=-0.7, center_imag=0.2, zoom=3.0, max_iterations=80)
+        assert MandelbrotSet(engine=NUMPY, precision=FLOAT64, **view).generate() == MandelbrotSet(**view).generate()
+
+    @pytest.mark.parametrize("zoom,size,max_iterations", [(1, 50, 8), (1, 120, 12), (2, 60, 10), (0.5, 200, 14)])
+    def test_automatic_float32_keeps_counts(self, zoom, size, max_iterations):
+        """Test that views given float32 automatically have the same counts as the reference"""
+        view = dict(size=size, zoom=zoom, max_iterations=max_iterations)
+        algorithm = MandelbrotSet(engine=NUMPY, **view)
+
+        assert algorithm.selected_precision() == FLOAT32
+        assert algorithm.generate() == MandelbrotSet(**view).generate()
+
+    def test_extended_matches_reference_at_shallow_zoom(self):
+        """Test that extended precision agrees with doubles where doubles are accurate"""
+        view = dict(size=40, center_real=-0.75, center_imag=0.1, zoom=4.0, max_iterations=30)
+        assert MandelbrotSet(engine=NUMPY, precision=EXTENDED, **view).generate() == MandelbrotSet(**view).generate()
+
+    def test_julia_matches_reference(self):
+        """Test that the numpy engine iterates Julia sets from each pixel"""
+        view = dict(size=40, c_real=-0.4, c_imag=0.6, max_iterations=50)
+        assert JuliaSet(engine=NUMPY, precision=FLOAT64, **view).generate() == JuliaSet(**view).generate()
+
+    def test_partial_rows_with_step(self):
+        """Test that sampling every step-th column matches the reference"""
+        algorithm = MandelbrotSet(size=50, max_iterations=40, engine=NUMPY, precision=FLOAT64)
+        reference = MandelbrotSet(size=50, max_iterations=40)
+        assert algorithm.compute_row(20, 3, 47, 4) == reference.compute_row(20, 3, 47, 4)
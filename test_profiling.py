@@ -0,0 +1,91 @@
+# ABOUTME: Unit tests for per-stage pipeline instrumentation
+# ABOUTME: Tests stage measurement, report formatting and the AlgorithmBase listener hook
+
+import pytest
+import json
+from profiling import measure_stage, StageProfiler
+from algorithm_base import AlgorithmBase
+from koch_snowflake import KochSnowflake
+from mandelbrot_set import MandelbrotSet
+
+
+class TestProfiling:
+
+    def test_measure_stage_records_times(self):
+        """Test that a measured stage records wall and CPU time"""
+        with measure_stage("work") as timing:
+            sum(range(10000))
+
+        assert timing["stage"] == "work"
+        assert timing["wall_seconds"] >= 0
+        assert timing["cpu_seconds"] >= 0
+        assert timing["heap_peak_bytes"] is None
+        assert timing["peak_rss_kb"] > 0
+
+    def test_measure_stage_traces_memory(self):
+        """Test that the Python heap peak is reported when tracing memory"""
+        with measure_stage("allocate", trace_memory=True) as timing:
+            data = [0] * 100000
+            del data
+
+        # 100000 list slots of 8 bytes each
+        assert timing["heap_peak_bytes"] >= 800000
+
+    def test_profiler_formats(self):
+        """Test text and JSON report formatting"""
+        profiler = StageProfiler()
+        profiler.record({"stage": "generate", "wall_seconds": 1.0, "cpu_seconds": 0.5, "heap_peak_bytes": 2048,
+                         "peak_rss_kb": 40000})
+        profiler.record({"stage": "encode", "wall_seconds": 2.0, "cpu_seconds": 1.5, "heap_peak_bytes": None,
+                         "peak_rss_kb": 50000})
+
+        report = json.loads(profiler.format("json"))
+        assert report["total_wall_seconds"] == 3.0
+        assert report["total_cpu_seconds"] == 2.0
+
+        text = profiler.format("text")
+        assert "generate" in text
+        assert "2.0" in text
+        assert "Python heap peak" in text
+        assert "50000" in text
+        assert "total" in text
+
+    def test_render_reports_all_stages(self, tmp_path):
+        """Test that render profiles generation, rasterization and encoding"""
+        koch = KochSnowflake(size=100, recursion_depth=2)
+        profiler = StageProfiler()
+        points = koch.render(str(tmp_path / "koch.png"), profiler=profiler)
+
+        assert len(points) == 48
+        assert [stage["stage"] for stage in profiler.stages] == ["generate", "rasterize", "encode"]
+        assert all(stage["algorithm"] == "KochSnowflake" for stage in profiler.stages)
+        assert all(stage["heap_peak_bytes"] is not None for stage in profiler.stages)
+        assert (tmp_path / "koch.png").exists()
+
+    def test_stage_listener_hook(self, tmp_path):
+        """Test that subscribed listeners receive every stage of every algorithm"""
+        received = []
+
+        def listener(algorithm, timing):
+            received.append((type(algorithm).__name__, timing["stage"]))
+
+        AlgorithmBase.add_stage_listener(listener)
+        try:
+            MandelbrotSet(size=10, max_iterations=10).render(str(tmp_path / "mandelbrot.png"))
+        finally:
+            AlgorithmBase.remove_stage_listener(listener)
+
+        assert received == [
+            ("MandelbrotSet", "generate"),
+            ("MandelbrotSet", "rasterize"),
+            ("MandelbrotSet", "encode"),
+        ]
+
+    def test_create_from_args(self):
+        """Test building algorithms from parsed CLI arguments"""
+        koch = KochSnowflake.create_from_args(size=200, recursion_depth=3, output="out.png")
+        mandelbrot = MandelbrotSet.create_from_args(size=50, num_iterations=20, output="out.png")
+
+        assert koch.recursion_depth == 3
+        assert koch.output == "out.png"
+        assert mandelbrot.max_iterations == 20
@@ -0,0 +1,92 @@
+# ABOUTME: Unit tests for progressive coarse-to-fine Mandelbrot rendering
+# ABOUTME: Tests that passes never recompute samples and that the final pass matches a normal render
+
+import os
+import pytest
+from coloring import SMOOTH
+from engines import FAST
+from mandelbrot_set import MandelbrotSet
+from progressive import PROGRESSIVE_STEPS, check_steps, iter_progressive, new_columns, render_progressive
+
+
+def count_samples(algorithm):
+    """Wrap compute_row to record every (x, y) it computes"""
+    samples = []
+    compute_row = algorithm.compute_row
+
+    def counting(y, left=0, right=None, step=1):
+        row = compute_row(y, left, right, step)
+        samples.extend((x, y) for x in range(left, algorithm.size if right is None else right, step))
+        return row
+
+    algorithm.compute_row = counting
+    return samples
+
+
+class TestProgressive:
+
+    def test_check_steps(self):
+        """Test that steps must shrink to 1 with each dividing the one before"""
+        assert check_steps([8, 4, 2, 1]) == (8, 4, 2, 1)
+        assert check_steps([9, 3, 1]) == (9, 3, 1)
+        for steps in ([], [8, 4, 2], [8, 3, 1], [4, 4, 1], [1, 2, 1]):
+            with pytest.raises(ValueError):
+                check_steps(steps)
+
+    def test_new_columns_skip_sampled_pixels(self):
+        """Test that rows sampled by the previous pass only get the columns in between"""
+        assert new_columns(0, 8, None) == [(0, 8)]
+        assert new_columns(4, 4, 8) == [(0, 4)]
+        assert new_columns(8, 4, 8) == [(4, 8)]
+        assert new_columns(9, 3, 9) == [(3, 9), (6, 9)]
+
+    @pytest.mark.parametrize("options", [{}, {"engine": FAST}, {"coloring": SMOOTH}])
+    def test_final_pass_matches_normal_render(self, options):
+        """Test that the last pass is identical to rendering the whole matrix at once"""
+        algorithm = MandelbrotSet(size=45, max_iterations=40, **options)
+        expected = MandelbrotSet(size=45, max_iterations=40, **options)
+        expected_image = expected.render_image(expected.generate())
+
+        passes = list(iter_progressive(algorithm))
+
+        assert [step for step, _ in passes] == list(PROGRESSIVE_STEPS)
+        assert all(image.size == (45, 45) for _, image in passes)
+        assert passes[-1][1].tobytes() == expected_image.tobytes()
+
+    def test_every_sample_is_computed_once(self):
+        """Test that refining passes never recompute a pixel"""
+        algorithm = MandelbrotSet(size=45, max_iterations=20)
+        samples = count_samples(algorithm)
+        passes = iter_progressive(algorithm)
+
+        next(passes)
+        # The first pass only computes every 8th pixel in both directions
+        assert len(samples) == 6 * 6
+        for _ in passes:
+            pass
+        assert len(samples) == len(set(samples)) == 45 * 45
+
+    def test_coarse_pass_fills_blocks(self):
+        """Test that each coarse sample is replicated over its block"""
+        algorithm = MandelbrotSet(size=40, max_iterations=20)
+        step, image = next(iter_progressive(algorithm))
+
+        for top in range(0, 40, step):
+            for left in range(0, 40, step):
+                block = image.crop((left, top, left + step, top + step))
+                assert len(block.getcolors()) == 1
+
+    def test_render_progressive_saves_every_pass(self, tmp_path):
+        """Test that each pass replaces the output file and reports its step"""
+        output = str(tmp_path / "progressive.png")
+        algorithm = MandelbrotSet(size=30, max_iterations=20)
+        reported = []
+
+        def on_pass(step, image, seconds):
+            assert os.path.exists(output)
+            reported.append(step)
+
+        render_progressive(algorithm, output, on_pass=on_pass)
+
+        assert reported == list(PROGRESSIVE_STEPS)
+        assert os.listdir(tmp_path) == ["progressive.png"]
@@ -0,0 +1,103 @@
+# ABOUTME: Unit tests for the resident MCP render server
+# ABOUTME: Tests tool calls through an in-process client, deduplication and result caching
+
+import pytest
+import asyncio
+import base64
+import io
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from fastmcp import Client
+from cost_model import MemoryBudgetError
+from render_server import RenderService, create_server, render_to_bytes
+
+
+@pytest.fixture
+def service():
+    """Render service backed by a small process pool"""
+    service = RenderService(max_workers=2, cache_size=2)
+    yield service
+    service.shutdown()
+
+
+class TestRenderServer:
+
+    def test_render_to_bytes(self):
+        """Test rendering an algorithm straight to encoded bytes"""
+        data = render_to_bytes("sierpinski-gasket", {"size": 64, "recursion_depth": 2})
+
+        with Image.open(io.BytesIO(data)) as img:
+            assert img.format == 'PNG'
+            assert img.size == (64, 64)
+
+    def test_tool_call_through_client(self, service):
+        """Test calling a rendering tool with an in-process client"""
+        async def call():
+            async with Client(create_server(service)) as client:
+                tools = {tool.name for tool in await client.list_tools()}
+                result = await client.call_tool("koch_snowflake", {"recursion_depth": 2, "size": 80})
+                return tools, result
+
+        tools, result = asyncio.run(call())
+
+        assert {"koch_snowflake", "sierpinski_gasket", "sierpinski_arrowhead", "mandelbrot_set"} <= tools
+        assert result[0].mimeType == "image/png"
+        with Image.open(io.BytesIO(base64.b64decode(result[0].data))) as img:
+            assert img.size == (80, 80)
+
+    def test_identical_requests_are_deduplicated(self, service):
+        """Test that concurrent identical requests share one render"""
+        params = {"size": 40, "num_iterations": 20}
+
+        async def call():
+            return await asyncio.gather(*[
+                service.render("mandelbrot-set", params) for _ in range(3)
+            ])
+
+        results = asyncio.run(call())
+
+        assert results[0] == results[1] == results[2]
+        assert service.stats["renders"] == 1
+        assert service.stats["deduplicated"] == 2
+
+    def test_results_are_cached_with_lru_eviction(self):
+        """Test that recent results are served from cache and old ones evicted"""
+        service = RenderService(cache_size=2, executor=ThreadPoolExecutor(max_workers=1))
+
+        async def call():
+            for depth in [1, 2, 1, 3, 2]:
+                await service.render("sierpinski-arrowhead", {"size": 32, "recursion_depth": depth})
+
+        try:
+            asyncio.run(call())
+        finally:
+            service.shutdown()
+
+        # Depth 1 is a hit; depth 2 was evicted by depth 3 so it renders again
+        assert service.stats["cache_hits"] == 1
+        assert service.stats["renders"] == 4
+        assert len(service.cache) == 2
+
+    def test_unknown_algorithm_rejected(self, service):
+        """Test that unknown algorithms and formats are rejected"""
+        with pytest.raises(ValueError):
+            asyncio.run(service.render("unknown", {"size": 10}))
+        with pytest.raises(ValueError):
+            asyncio.run(service.render("sierpinski-gasket", {"size": 10, "recursion_depth": 1}, "gif"))
+
+    def test_renders_over_the_memory_budget_are_rejected(self, service):
+        """Test that the cost model turns away renders too large for a worker before they start"""
+        with pytest.raises(MemoryBudgetError):
+            asyncio.run(service.render("koch-snowflake", {"size": 100, "recursion_depth": 20}))
+
+        assert service.stats["rejected"] == 1
+        assert service.stats["renders"] == 0
+
+        small = RenderService(executor=ThreadPoolExecutor(max_workers=1), memory_budget=64 * 1024 * 1024)
+        try:
+            with pytest.raises(MemoryBudgetError):
+                asyncio.run(small.render("mandelbrot-set", {"size": 4000, "num_iterations": 10}))
+            asyncio.run(small.render("mandelbrot-set", {"size": 40, "num_iterations": 10}))
+        finally:
+            small.shutdown()
+        assert small.stats["renders"] == 1
@@ -74,4 +74,12 @@ class TestSierpinskiArrowhead:
         arrowhead.save_image(points, str(output_file))
         
         assert output_file.exists()
-        assert output_file.stat().st_size > 0
\ No newline at end of file
+        assert output_file.stat().st_size > 0
+    
+    def test_iter_arrowhead_matches_generate(self):
+        """Test that lazily streamed points match the generated list"""
+        arrowhead = SierpinskiArrowhead(size=300)
+        
+        for depth in range(5):
+            assert ''.join(arrowhead.iter_lsystem_symbols(depth)) == arrowhead.generate_lsystem_string(depth)
+            assert list(arrowhead.iter_arrowhead(depth)) == arrowhead.generate_arrowhead(depth)
@@ -65,4 +65,11 @@ class TestSierpinskiGasket:
         
         # Each subtriangle should have 3 points
         for subtriangle in subtriangles:
-            assert len(subtriangle) == 3
\ No newline at end of file
+            assert len(subtriangle) == 3
+    
+    def test_iter_gasket_matches_generate(self):
+        """Test that lazily streamed triangles match the generated list"""
+        gasket = SierpinskiGasket(size=300)
+        
+        for depth in range(4):
+            assert list(gasket.iter_gasket(depth)) == gasket.generate_gasket(depth)
@@ -0,0 +1,41 @@
+# ABOUTME: Unit tests for the in-memory, streaming and tiled execution strategies
+# ABOUTME: Tests that every strategy produces the same image as a normal render
+
+import pytest
+from PIL import Image
+from cost_model import IN_MEMORY, STREAMING, TILED
+from strategies import allowed_strategies, render_with_strategy
+from koch_snowflake import KochSnowflake
+from sierpinski_gasket import SierpinskiGasket
+from sierpinski_arrowhead import SierpinskiArrowhead
+from mandelbrot_set import MandelbrotSet
+
+
+class TestStrategies:
+
+    def test_allowed_strategies_depend_on_output(self):
+        """Test which strategies can write each kind of output"""
+        koch = KochSnowflake(size=50, recursion_depth=1)
+
+        assert allowed_strategies(koch, "out.png") == [IN_MEMORY, STREAMING, TILED]
+        assert allowed_strategies(koch, "out.jpg") == [IN_MEMORY, STREAMING]
+        assert allowed_strategies(koch, "out.npy") == [IN_MEMORY]
+        assert allowed_strategies(KochSnowflake(size=50, recursion_depth=1, antialias=4), "out.png") == \
+            [IN_MEMORY, STREAMING]
+
+    @pytest.mark.parametrize("algorithm", [
+        KochSnowflake(size=150, recursion_depth=3),
+        SierpinskiGasket(size=150, recursion_depth=4),
+        SierpinskiArrowhead(size=150, recursion_depth=4),
+        MandelbrotSet(size=60, max_iterations=40),
+    ])
+    @pytest.mark.parametrize("strategy", [STREAMING, TILED])
+    def test_strategies_match_in_memory_render(self, tmp_path, algorithm, strategy):
+        """Test that streaming and tiled renders equal the in-memory render"""
+        expected = algorithm.render_image(algorithm.generate())
+
+        output = tmp_path / "strategy.png"
+        render_with_strategy(algorithm, strategy, str(output), tile_size=32, workers=1)
+
+        with Image.open(output) as rendered:
+            assert rendered.convert('RGB').tobytes() == expected.tobytes()
@@ -0,0 +1,48 @@
+# ABOUTME: Unit tests for depth-sweep rendering of the line fractals
+# ABOUTME: Tests that each level of a sweep matches a separate render at that depth
+
+import pytest
+from PIL import Image
+from sweep import sweep_filename, render_sweep
+from profiling import StageProfiler
+from koch_snowflake import KochSnowflake
+from sierpinski_gasket import SierpinskiGasket
+from sierpinski_arrowhead import SierpinskiArrowhead
+
+
+class TestSweep:
+
+    def test_sweep_filename(self):
+        """Test substituting or appending the depth in output filenames"""
+        assert sweep_filename("koch-{depth}.png", 3) == "koch-3.png"
+        assert sweep_filename("out/koch.png", 12) == "out/koch_depth12.png"
+
+    @pytest.mark.parametrize("algorithm_class", [KochSnowflake, SierpinskiGasket, SierpinskiArrowhead])
+    def test_levels_match_generate(self, algorithm_class):
+        """Test that every level equals generating that depth from scratch"""
+        algorithm = algorithm_class(size=200, recursion_depth=4)
+        levels = list(algorithm.iter_levels(4))
+
+        assert len(levels) == 5
+        for depth, level in enumerate(levels):
+            assert level == algorithm_class(size=200, recursion_depth=depth).generate()
+
+    @pytest.mark.parametrize("algorithm_class", [KochSnowflake, SierpinskiGasket, SierpinskiArrowhead])
+    def test_sweep_matches_separate_renders(self, tmp_path, algorithm_class):
+        """Test that each saved level is identical to a separate render"""
+        algorithm = algorithm_class(size=150, recursion_depth=3)
+        filenames = render_sweep(algorithm, str(tmp_path / "level-{depth}.png"))
+
+        assert filenames == [str(tmp_path / f"level-{depth}.png") for depth in range(4)]
+        for depth, filename in enumerate(filenames):
+            single = algorithm_class(size=150, recursion_depth=depth)
+            with Image.open(filename) as swept:
+                assert swept.tobytes() == single.render_image(single.generate()).tobytes()
+
+    def test_sweep_reports_stages_per_level(self, tmp_path):
+        """Test that the profiler sees generate, rasterize and encode for every level"""
+        profiler = StageProfiler()
+        render_sweep(SierpinskiGasket(size=50, recursion_depth=2), str(tmp_path / "gasket.ppm"), profiler=profiler)
+
+        names = sorted(stage["stage"] for stage in profiler.stages)
+        assert names == sorted(f"{name} {depth}" for name in ["generate", "rasterize", "encode"] for depth in range(3))
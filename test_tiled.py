@@ -0,0 +1,75 @@
+# ABOUTME: Unit tests for tiled poster rasterization of the line fractals
+# ABOUTME: Tests the segment grid index and pixel-identical seams against single-canvas renders
+
+import pytest
+from PIL import Image
+from tiled import SegmentGrid, build_segment_grid, render_tiled
+from koch_snowflake import KochSnowflake
+from sierpinski_gasket import SierpinskiGasket
+from sierpinski_arrowhead import SierpinskiArrowhead
+
+
+class TestTiled:
+
+    def test_segment_grid_buckets_by_bounding_box(self):
+        """Test that segments land in every cell their padded box overlaps"""
+        grid = SegmentGrid(100, 100, cell_size=50, margin=2)
+        grid.add_segment(10, 10, 20, 20)
+        grid.add_segment(40, 10, 60, 10)
+        grid.add_segment(49, 80, 49, 90)
+
+        assert list(grid.segments(0, 0)) == [10, 10, 20, 20, 40, 10, 60, 10]
+        assert list(grid.segments(1, 0)) == [40, 10, 60, 10]
+        # Within the stroke margin of the vertical seam
+        assert list(grid.segments(1, 1)) == [49, 80, 49, 90]
+        assert list(grid.segments(0, 1)) == [49, 80, 49, 90]
+
+    def test_segment_grid_closes_paths(self):
+        """Test that closed paths add the segment back to the start"""
+        grid = SegmentGrid(100, 100, cell_size=100, margin=1)
+        grid.add_path([(1.7, 1.2), (50.9, 1.0), (20.0, 40.0)], closed=True)
+
+        assert list(grid.segments(0, 0)) == [1, 1, 50, 1, 50, 1, 20, 40, 20, 40, 1, 1]
+
+    @pytest.mark.parametrize("algorithm_class,size,tile_size,depth", [
+        (KochSnowflake, 300, 64, 4),
+        (KochSnowflake, 257, 50, 3),
+        (SierpinskiArrowhead, 288, 104, 1),
+        (SierpinskiArrowhead, 300, 37, 5),
+        (SierpinskiGasket, 300, 64, 4),
+    ])
+    def test_tiles_match_single_canvas(self, tmp_path, algorithm_class, size, tile_size, depth):
+        """Test that tiled output is pixel-identical to a single-canvas render"""
+        algorithm = algorithm_class(size=size, recursion_depth=depth)
+        expected = algorithm.render_image(algorithm.generate())
+
+        output = tmp_path / "tiled.png"
+        render_tiled(algorithm, str(output), tile_size=tile_size, workers=1)
+
+        with Image.open(output) as tiled:
+            assert tiled.size == (size, size)
+            assert tiled.convert('RGB').tobytes() == expected.tobytes()
+
+    def test_parallel_tiles_to_ppm(self, tmp_path):
+        """Test rendering tiles on worker processes into a PPM stream"""
+        koch = KochSnowflake(size=200, recursion_depth=3)
+        expected = koch.render_image(koch.generate())
+
+        output = tmp_path / "tiled.ppm"
+        render_tiled(koch, str(output), tile_size=64, workers=2)
+
+        with Image.open(output) as tiled:
+            assert tiled.tobytes() == expected.tobytes()
+
+    def test_grid_only_holds_overlapping_segments(self):
+        """Test that each tile's bucket is much smaller than the whole curve"""
+        arrowhead = SierpinskiArrowhead(size=400, recursion_depth=6)
+        grid = build_segment_grid(arrowhead, tile_size=50)
+        total_segments = len(arrowhead.generate()) - 1
+
+        assert max(len(cell) // 4 for cell in grid.cells.values()) < total_segments / 4
+
+    def test_rejects_unstreamable_formats(self, tmp_path):
+        """Test that tiled rendering refuses formats it cannot stream"""
+        with pytest.raises(ValueError):
+            render_tiled(KochSnowflake(size=50, recursion_depth=1), str(tmp_path / "tiled.jpg"), tile_size=16)
@@ -0,0 +1,127 @@
+# ABOUTME: Unit tests for streaming SVG and PDF output of the line fractals
+# ABOUTME: Tests quantization, collinear merging and well-formed vector files
+
+import pytest
+import io
+import re
+import zlib
+import xml.etree.ElementTree as ET
+from vector_output import PathWriter, SVGPathWriter, PDFPathWriter, save_vector, is_vector_output
+from koch_snowflake import KochSnowflake
+from sierpinski_gasket import SierpinskiGasket
+from sierpinski_arrowhead import SierpinskiArrowhead
+from mandelbrot_set import MandelbrotSet
+
+
+def svg_path_data(paths, precision=2):
+    """Write paths through an SVG writer and return the path data"""
+    stream = io.BytesIO()
+    with SVGPathWriter(stream, 100, precision=precision) as writer:
+        for points, closed in paths:
+            writer.write_path(iter(points), closed)
+    return ET.fromstring(stream.getvalue()).find("{http://www.w3.org/2000/svg}path").get("d")
+
+
+class TestVectorOutput:
+
+    def test_is_vector_output(self):
+        """Test output format detection from the filename"""
+        assert is_vector_output("poster.svg")
+        assert is_vector_output("poster.PDF")
+        assert not is_vector_output("poster.png")
+
+    def test_coordinates_are_quantized(self):
+        """Test that coordinates are rounded to the requested precision"""
+        data = svg_path_data([([(1.23456, 2.0), (3.98765, 4.5)], False)], precision=2)
+
+        assert data == "M1.23 2L3.99 4.5"
+
+    def test_collinear_segments_are_merged(self):
+        """Test that consecutive collinear segments become one"""
+        points = [(0, 0), (1, 0), (2, 0), (3, 0), (3, 1), (3, 2)]
+        data = svg_path_data([(points, False)])
+
+        assert data == "M0 0L3 0L3 2"
+
+    def test_reversal_is_not_merged(self):
+        """Test that doubling back along the same line keeps both segments"""
+        data = svg_path_data([([(0, 0), (2, 0), (1, 0)], False)])
+
+        assert data == "M0 0L2 0L1 0"
+
+    def test_negative_precision_is_rejected(self):
+        """Test that precision must be a non-negative number of decimal places"""
+        with pytest.raises(ValueError):
+            SVGPathWriter(io.BytesIO(), 10, precision=-1)
+
+    def test_path_writer_is_abstract(self):
+        """Test that writers must implement the emit methods"""
+        with pytest.raises(TypeError):
+            PathWriter(io.BytesIO(), 10)
+
+    def test_closed_paths(self):
+        """Test that closed paths are closed and zero-length segments dropped"""
+        data = svg_path_data([([(0, 0), (1, 0), (1.001, 0.001), (1, 1)], True)])
+
+        assert data == "M0 0L1 0L1 1Z"
+
+    def test_long_closed_path_returns_to_start(self, monkeypatch):
+        """Test closing a path that was split into several strokes"""
+        monkeypatch.setattr(PDFPathWriter, "SEGMENTS_PER_STROKE", 2)
+        stream = io.BytesIO()
+        with PDFPathWriter(stream, 10) as writer:
+            writer.write_path(iter([(0, 0), (1, 0), (1, 1), (0, 1)]), True)
+
+        content = zlib.decompress(re.search(rb"stream\n(.*)\nendstream", stream.getvalue(), re.S).group(1))
+        assert content.endswith(b"0 10 l\nS\n")
+        assert b"h\n" not in content
+
+    def test_save_svg_snowflake(self, tmp_path):
+        """Test streaming a snowflake to SVG"""
+        koch = KochSnowflake(size=300, recursion_depth=3)
+        output = tmp_path / "koch.svg"
+        save_vector(koch, str(output))
+
+        root = ET.parse(output).getroot()
+        assert root.get("width") == "300"
+        data = root.find("{http://www.w3.org/2000/svg}path").get("d")
+        # One move, one line per snowflake point except the first, and a close
+        assert data.count("M") == 1
+        assert data.count("L") == len(koch.generate_snowflake(3)) - 1
+        assert data.endswith("Z")
+
+    def test_save_svg_gasket(self, tmp_path):
+        """Test streaming a gasket to SVG with one subpath per triangle"""
+        gasket = SierpinskiGasket(size=300, recursion_depth=2)
+        output = tmp_path / "gasket.svg"
+        save_vector(gasket, str(output))
+
+        data = ET.parse(output).getroot().find("{http://www.w3.org/2000/svg}path").get("d")
+        assert data.count("M") == 9
+        assert data.count("Z") == 9
+
+    def test_save_pdf_arrowhead(self, tmp_path):
+        """Test streaming an arrowhead to a well-formed PDF"""
+        arrowhead = SierpinskiArrowhead(size=300, recursion_depth=4)
+        output = tmp_path / "arrowhead.pdf"
+        save_vector(arrowhead, str(output))
+
+        pdf = output.read_bytes()
+        assert pdf.startswith(b"%PDF-1.4")
+        assert pdf.rstrip().endswith(b"%%EOF")
+
+        # The stream length object and xref offsets must be consistent
+        stream = re.search(rb"stream\n(.*)\nendstream", pdf, re.S).group(1)
+        assert re.search(rb"5 0 obj\n(\d+)\nendobj", pdf).group(1) == str(len(stream)).encode()
+        xref = int(re.search(rb"startxref\n(\d+)", pdf).group(1))
+        assert pdf[xref:].startswith(b"xref")
+        for number, offset in enumerate(re.findall(rb"(\d{10}) 00000 n", pdf), start=1):
+            assert pdf[int(offset):].startswith(f"{number} 0 obj".encode())
+
+        content = zlib.decompress(stream)
+        assert content.count(b" l\n") == len(arrowhead.generate_arrowhead(4)) - 1
+
+    def test_save_vector_rejects_raster_algorithms(self, tmp_path):
+        """Test that algorithms without line geometry are rejected"""
+        with pytest.raises(ValueError):
+            save_vector(MandelbrotSet(size=10), str(tmp_path / "mandelbrot.svg"))
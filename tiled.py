@@ -0,0 +1,134 @@
+# ABOUTME: Tiled poster rasterization for the line fractals using a uniform grid segment index
+# ABOUTME: Renders tiles in parallel and streams them into the output file a band at a time
+
+import math
+import os
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image, ImageDraw
+
+from encoders import ROW_STREAM_EXTENSIONS, open_row_writer
+
+
+TILED_EXTENSIONS = ROW_STREAM_EXTENSIONS
+
+
+class SegmentGrid:
+    """Uniform grid index of line segments bucketed by their stroked bounding box"""
+
+    def __init__(self, width, height, cell_size, margin):
+        self.width = width
+        self.height = height
+        self.cell_size = cell_size
+        self.margin = margin
+        self.columns = math.ceil(width / cell_size)
+        self.rows = math.ceil(height / cell_size)
+        # (column, row) -> packed x1, y1, x2, y2 integer coordinates
+        self.cells = {}
+
+    def add_segment(self, x1, y1, x2, y2):
+        """Add a segment to every cell its stroked bounding box overlaps"""
+        first_column = max((min(x1, x2) - self.margin) // self.cell_size, 0)
+        last_column = min((max(x1, x2) + self.margin) // self.cell_size, self.columns - 1)
+        first_row = max((min(y1, y2) - self.margin) // self.cell_size, 0)
+        last_row = min((max(y1, y2) + self.margin) // self.cell_size, self.rows - 1)
+
+        for row in range(first_row, last_row + 1):
+            for column in range(first_column, last_column + 1):
+                cell = self.cells.get((column, row))
+                if cell is None:
+                    cell = self.cells[(column, row)] = array('i')
+                cell.extend((x1, y1, x2, y2))
+
+    def add_path(self, points, closed=False):
+        """Add the segments of a polyline, truncated to pixels like render_image"""
+        first = previous = None
+        count = 0
+        for x, y in points:
+            point = (int(x), int(y))
+            if previous is not None:
+                self.add_segment(previous[0], previous[1], point[0], point[1])
+            else:
+                first = point
+            previous = point
+            count += 1
+
+        if closed and count >= 2:
+            self.add_segment(previous[0], previous[1], first[0], first[1])
+
+    def segments(self, column, row):
+        """Return the packed segments overlapping one cell"""
+        return self.cells.get((column, row), array('i'))
+
+    def tile_box(self, column, row):
+        """Return the pixel box (left, top, right, bottom) of one cell"""
+        left = column * self.cell_size
+        top = row * self.cell_size
+        return (left, top, min(left + self.cell_size, self.width), min(top + self.cell_size, self.height))
+
+
+def render_tile(box, segments, line_width, padding):
+    """Rasterize the segments overlapping one tile and return its RGB bytes"""
+    left, top, right, bottom = box
+    # PIL's polygon filler rounds scanline intersections at a precision that
+    # depends on the magnitude of x, so shifting strokes sideways can move
+    # seam pixels. Tiles are therefore only shifted vertically (which is exact)
+    # and drawn on a 1-bit canvas anchored at x = 0 to keep memory small.
+    origin_y = top - padding
+    canvas = Image.new('1', (right, bottom - top + 2 * padding), 1)
+    draw = ImageDraw.Draw(canvas)
+    for i in range(0, len(segments), 4):
+        draw.line([(segments[i], segments[i + 1] - origin_y), (segments[i + 2], segments[i + 3] - origin_y)],
+                  fill=0, width=line_width)
+    return canvas.crop((left, padding, right, padding + bottom - top)).convert('RGB').tobytes()
+
+
+def stitch_band(width, boxes, tiles):
+    """Stitch one row of RGB tiles into the packed bytes of a full-width band"""
+    band_height = boxes[0][3] - boxes[0][1]
+    band = Image.new('RGB', (width, band_height))
+    for box, tile in zip(boxes, tiles):
+        band.paste(Image.frombytes('RGB', (box[2] - box[0], band_height), tile), (box[0], 0))
+    return band.tobytes()
+
+
+def build_segment_grid(algorithm, tile_size):
+    """Stream an algorithm's paths into a segment grid sized for its tiles"""
+    # Wide strokes reach past their end points, so pad the bounding boxes
+    grid = SegmentGrid(algorithm.size, algorithm.size, tile_size, margin=algorithm.line_width + 1)
+    for points, closed in algorithm.iter_paths():
+        grid.add_path(points, closed)
+    return grid
+
+
+def render_tiled(algorithm, filename, tile_size=1024, workers=None, compress_level=None, encode_threads=1,
+                 grid=None):
+    """Render a line fractal tile by tile, streaming bands of tiles to a PNG or PPM file"""
+    extension = os.path.splitext(filename)[1].lower()
+    if extension not in TILED_EXTENSIONS:
+        raise ValueError(f"Tiled rendering writes {', '.join(TILED_EXTENSIONS)} files, not {extension}")
+
+    grid = grid or build_segment_grid(algorithm, tile_size)
+    size = algorithm.size
+
+    executor = ProcessPoolExecutor(max_workers=workers) if workers != 1 else None
+    try:
+        with open(filename, "wb") as stream:
+            writer = open_row_writer(stream, filename, size, size, compress_level, encode_threads)
+
+            for row in range(grid.rows):
+                boxes = [grid.tile_box(column, row) for column in range(grid.columns)]
+                jobs = [(box, grid.segments(column, row), algorithm.line_width, grid.margin)
+                        for column, box in enumerate(boxes)]
+                if executor is None:
+                    tiles = [render_tile(*job) for job in jobs]
+                else:
+                    tiles = list(executor.map(render_tile, *zip(*jobs)))
+
+                writer.write_rows(stitch_band(size, boxes, tiles))
+
+            writer.close()
+    finally:
+        if executor is not None:
+            executor.shutdown()
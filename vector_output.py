@@ -0,0 +1,241 @@
+# ABOUTME: Streaming SVG and PDF output for the line fractals
+# ABOUTME: Writes quantized path data as geometry is generated, merging collinear segments
+
+import os
+import zlib
+from abc import ABC, abstractmethod
+
+
+VECTOR_EXTENSIONS = (".svg", ".pdf")
+
+
+def is_vector_output(filename):
+    """Check whether a filename asks for vector output"""
+    return os.path.splitext(filename)[1].lower() in VECTOR_EXTENSIONS
+
+
+class PathWriter(ABC):
+    """Quantizes polylines and merges collinear segments before emitting them"""
+
+    # Strokes are flushed periodically so viewers never face one giant path
+    SEGMENTS_PER_STROKE = 10000
+
+    def __init__(self, stream, size, line_width=1, precision=2):
+        if precision < 0:
+            raise ValueError(f"Vector precision must be at least 0 decimal places, not {precision}")
+        self.stream = stream
+        self.size = size
+        self.line_width = line_width
+        self.precision = precision
+        self.scale = 10 ** precision
+        self.start = None
+        self.current = None
+        self.pending = None
+        self.segments = 0
+        self.broken = False
+
+    def quantize(self, point):
+        """Snap a point onto the integer grid of the output precision"""
+        return (round(point[0] * self.scale), round(point[1] * self.scale))
+
+    def format_number(self, value):
+        """Format a quantized value with as few characters as possible"""
+        if self.precision == 0:
+            return str(value)
+        text = f"{value / self.scale:.{self.precision}f}".rstrip("0").rstrip(".")
+        return "0" if text == "-0" else text
+
+    def write_path(self, points, closed=False):
+        """Stream one polyline, consuming the points iterable lazily"""
+        for point in points:
+            quantized = self.quantize(point)
+            if self.start is None:
+                self.start = self.current = quantized
+                self.emit_move(quantized)
+            else:
+                self.add_point(quantized)
+
+        self.flush_pending()
+        if closed and self.start is not None:
+            if self.broken:
+                # The path was split, so closing must return to the true start
+                self.emit_line(self.start)
+            else:
+                self.emit_close()
+        self.start = self.current = None
+        self.broken = False
+
+    def add_point(self, point):
+        """Extend the pending segment when collinear, otherwise emit it"""
+        if point == (self.pending or self.current):
+            return  # Zero-length after quantization
+
+        if self.pending is not None:
+            dx1 = self.pending[0] - self.current[0]
+            dy1 = self.pending[1] - self.current[1]
+            dx2 = point[0] - self.pending[0]
+            dy2 = point[1] - self.pending[1]
+            # Exact integer test: same direction and no turn
+            if dx1 * dy2 - dy1 * dx2 == 0 and dx1 * dx2 + dy1 * dy2 > 0:
+                self.pending = point
+                return
+            self.flush_pending()
+
+        self.pending = point
+
+    def flush_pending(self):
+        """Emit the pending merged segment"""
+        if self.pending is None:
+            return
+        self.emit_line(self.pending)
+        self.current = self.pending
+        self.pending = None
+
+        self.segments += 1
+        if self.segments % self.SEGMENTS_PER_STROKE == 0:
+            self.emit_break(self.current)
+            self.broken = True
+
+    @abstractmethod
+    def begin(self):
+        """Write the file header"""
+        pass
+
+    @abstractmethod
+    def end(self):
+        """Finish the last path and write the file trailer"""
+        pass
+
+    @abstractmethod
+    def emit_move(self, point):
+        """Start a new subpath at a quantized point"""
+        pass
+
+    @abstractmethod
+    def emit_line(self, point):
+        """Draw a straight segment to a quantized point"""
+        pass
+
+    @abstractmethod
+    def emit_close(self):
+        """Close the current subpath back to its start"""
+        pass
+
+    def emit_break(self, point):
+        """Split a long path so the current point starts a fresh one"""
+
+    def __enter__(self):
+        self.begin()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.end()
+
+
+class SVGPathWriter(PathWriter):
+    """Streams paths into a single SVG path element"""
+
+    def begin(self):
+        self.stream.write(
+            f'<svg xmlns="http://www.w3.org/2000/svg" width="{self.size}" height="{self.size}" '
+            f'viewBox="0 0 {self.size} {self.size}">\n'
+            f'<rect width="100%" height="100%" fill="white"/>\n'
+            f'<path fill="none" stroke="black" stroke-width="{self.line_width}" '
+            f'stroke-linejoin="round" d="'.encode("ascii")
+        )
+
+    def point_text(self, point):
+        return f"{self.format_number(point[0])} {self.format_number(point[1])}"
+
+    def emit_move(self, point):
+        self.stream.write(f"M{self.point_text(point)}".encode("ascii"))
+
+    def emit_line(self, point):
+        self.stream.write(f"L{self.point_text(point)}".encode("ascii"))
+
+    def emit_close(self):
+        self.stream.write(b"Z")
+
+    def end(self):
+        self.stream.write(b'"/>\n</svg>\n')
+
+
+class PDFPathWriter(PathWriter):
+    """Streams paths into a single-page PDF with a deflate-compressed content stream"""
+
+    def begin(self):
+        self.offsets = {}
+        self.position = 0
+        self.compressor = zlib.compressobj(9)
+        self.content_length = 0
+
+        self.write_raw(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        self.write_object(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+        self.write_object(2, b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>")
+        self.write_object(3, (f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {self.size} {self.size}] "
+                              f"/Contents 4 0 R >>").encode("ascii"))
+
+        # The stream length is unknown until the geometry has been streamed,
+        # so it is written afterwards as an indirect object
+        self.offsets[4] = self.position
+        self.write_raw(b"4 0 obj\n<< /Length 5 0 R /Filter /FlateDecode >>\nstream\n")
+        self.write_content(f"{self.line_width} w 1 j 0 G\n".encode("ascii"))
+
+    def write_raw(self, data):
+        self.stream.write(data)
+        self.position += len(data)
+
+    def write_object(self, number, body):
+        self.offsets[number] = self.position
+        self.write_raw(f"{number} 0 obj\n".encode("ascii") + body + b"\nendobj\n")
+
+    def write_content(self, data):
+        compressed = self.compressor.compress(data)
+        self.content_length += len(compressed)
+        self.write_raw(compressed)
+
+    def point_text(self, point):
+        # PDF user space has its origin at the bottom left
+        return f"{self.format_number(point[0])} {self.format_number(self.size * self.scale - point[1])}"
+
+    def emit_move(self, point):
+        self.write_content(f"{self.point_text(point)} m\n".encode("ascii"))
+
+    def emit_line(self, point):
+        self.write_content(f"{self.point_text(point)} l\n".encode("ascii"))
+
+    def emit_close(self):
+        self.write_content(b"h\n")
+
+    def emit_break(self, point):
+        self.write_content(f"S\n{self.point_text(point)} m\n".encode("ascii"))
+
+    def end(self):
+        self.write_content(b"S\n")
+        tail = self.compressor.flush()
+        self.content_length += len(tail)
+        self.write_raw(tail)
+        self.write_raw(b"\nendstream\nendobj\n")
+        self.write_object(5, str(self.content_length).encode("ascii"))
+
+        xref_position = self.position
+        self.write_raw(b"xref\n0 6\n0000000000 65535 f \n")
+        for number in range(1, 6):
+            self.write_raw(f"{self.offsets[number]:010d} 00000 n \n".encode("ascii"))
+        self.write_raw(f"trailer\n<< /Size 6 /Root 1 0 R >>\nstartxref\n{xref_position}\n%%EOF\n".encode("ascii"))
+
+
+def save_vector(algorithm, filename, precision=2):
+    """Stream a line fractal's geometry to an SVG or PDF file"""
+    extension = os.path.splitext(filename)[1].lower()
+    if extension not in VECTOR_EXTENSIONS:
+        raise ValueError(f"Unsupported vector format: {extension}")
+    if not hasattr(algorithm, "iter_paths"):
+        raise ValueError(f"{type(algorithm).__name__} does not produce line geometry")
+
+    writer_class = SVGPathWriter if extension == ".svg" else PDFPathWriter
+    with open(filename, "wb") as stream:
+        with writer_class(stream, algorithm.size, algorithm.line_width, precision) as writer:
+            for points, closed in algorithm.iter_paths():
+                writer.write_path(points, closed)